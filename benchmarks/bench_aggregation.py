@@ -0,0 +1,98 @@
+"""
+Benchmark the vectorized daily rollup against the old per-row dict loop
+that HistoricalDataView used to run on 1-minute candles.
+
+    python -m benchmarks.bench_aggregation [--days 500] [--repeat 3]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from service.aggregation import summarize
+
+MARKET_TZ = 'Asia/Kolkata'
+CANDLE_COLUMNS = ['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def minute_candles(days):
+    """
+    Synthetic NSE session: 375 one-minute candles per weekday from 09:15.
+    """
+    sessions = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, tz=MARKET_TZ)
+    minutes = pd.to_timedelta(np.arange(375), unit='min') + pd.Timedelta(hours=9, minutes=15)
+    index = (sessions.values[:, None] + minutes.values[None, :]).ravel()
+    rng = np.random.default_rng(0)
+    close = 1000 + np.cumsum(rng.normal(0, 0.5, len(index)))
+    df = pd.DataFrame({
+        'DateTime': pd.DatetimeIndex(index).tz_localize('UTC').tz_convert(MARKET_TZ),
+        'Open': close + rng.normal(0, 0.2, len(index)),
+        'High': close + 1,
+        'Low': close - 1,
+        'Close': close,
+        'Volume': rng.integers(100, 10000, len(index)),
+    }, columns=CANDLE_COLUMNS)
+    return df.set_index('DateTime')
+
+
+def legacy(df):
+    """
+    The pre-vectorization code path: to_json, json.loads and a dict loop.
+    """
+    data = json.loads(df.reset_index().to_json(orient='records', date_format='iso'))
+    daily_data = {}
+    for entry in data:
+        date = entry['DateTime'].split('T')[0]
+        if date not in daily_data:
+            daily_data[date] = {
+                'Date': date, 'Open': entry['Open'], 'High': entry['High'], 'Low': entry['Low'],
+                'Close': entry['Close'], 'Volume': entry['Volume'], 'PTD_Close': None, 'Change': None,
+            }
+        else:
+            daily_data[date]['High'] = max(daily_data[date]['High'], entry['High'])
+            daily_data[date]['Low'] = min(daily_data[date]['Low'], entry['Low'])
+            daily_data[date]['Close'] = entry['Close']
+            daily_data[date]['Volume'] += entry['Volume']
+    previous_day_close = None
+    for date in sorted(daily_data.keys()):
+        if previous_day_close is not None:
+            daily_data[date]['PTD_Close'] = previous_day_close
+            if previous_day_close > 0:
+                daily_data[date]['Change'] = ((daily_data[date]['Close'] - previous_day_close) / previous_day_close) * 100
+        previous_day_close = daily_data[date]['Close']
+    return json.dumps(list(daily_data.values()))
+
+
+def vectorized(df):
+    return summarize(df, 'day').to_json(orient='records', double_precision=15)
+
+
+def best_of(fn, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(df)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = minute_candles(args.days)
+    print("{:,} one-minute candles over {} sessions".format(len(df), args.days))
+
+    old = best_of(legacy, df, args.repeat)
+    new = best_of(vectorized, df, args.repeat)
+    print("legacy dict loop : {:8.1f} ms".format(old * 1000))
+    print("vectorized       : {:8.1f} ms".format(new * 1000))
+    print("speedup          : {:8.1f}x".format(old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Backtest throughput in bars per second: one run per strategy on synthetic
+1-minute data, then a parameter sweep across several symbols on a
+process pool.
+
+    python -m benchmarks.bench_backtest [--days 250] [--symbols 8] [--workers 4]
+"""
+import argparse
+import os
+import time
+
+from benchmarks.bench_aggregation import minute_candles
+from service.backtest import STRATEGIES, bars_per_year, get_strategy, run_backtest, sweep, to_arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--symbols', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    data = to_arrays(minute_candles(args.days))
+    bars = len(data['close'])
+    periods = bars_per_year('ONE_MINUTE')
+    print("{:,} one-minute bars per symbol".format(bars))
+
+    for name in STRATEGIES:
+        strategy = get_strategy(name)
+        run_backtest(data, strategy, periods_per_year=periods)  # warm up
+        started = time.perf_counter()
+        run_backtest(data, strategy, slippage_bps=5, brokerage_bps=3, periods_per_year=periods)
+        elapsed = time.perf_counter() - started
+        print("{:<16} {:8.1f} ms  {:>14,.0f} bars/s".format(name, elapsed * 1000, bars / elapsed))
+
+    grid = {'fast': [5, 10, 20, 30], 'slow': [50, 100, 200]}
+    combos = len(grid['fast']) * len(grid['slow'])
+    series = {'SYM{}'.format(i): data for i in range(args.symbols)}
+    for workers in sorted({1, args.workers}):
+        started = time.perf_counter()
+        sweep(series, 'sma_crossover', grid, workers=workers, slippage_bps=5, brokerage_bps=3, periods_per_year=periods)
+        elapsed = time.perf_counter() - started
+        total = bars * combos * args.symbols
+        print("sweep {} symbols x {} params, {} worker(s): {:6.2f} s  {:>14,.0f} bars/s".format(
+            args.symbols, combos, workers, elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    main()
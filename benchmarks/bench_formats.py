@@ -0,0 +1,60 @@
+"""
+Payload size and serialization time of the candle response formats:
+the old list-of-dicts JsonResponse, records JSON written by pandas,
+columnar JSON and Arrow IPC, each raw, gzip and brotli (if installed).
+
+    python -m benchmarks.bench_formats [--days 60] [--period 1min] [--repeat 3]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.bench_aggregation import minute_candles
+from service.aggregation import summarize
+from service.formats import brotli, compress, encode
+
+
+def legacy(df):
+    """
+    What /historical-data/ used to do: build dicts, then json.dumps them.
+    """
+    return json.dumps(df.to_dict(orient='records')).encode()
+
+
+def best_of(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--period', default='1min', help="Rollup passed to summarize(), e.g. 1min, 15min, day")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = summarize(minute_candles(args.days), args.period)
+    print("{:,} rows x {} columns".format(len(df), len(df.columns)))
+
+    encoders = [('dicts (old)', lambda: legacy(df))]
+    encoders += [(name, lambda name=name: encode(df, name)) for name in ('records', 'columnar', 'arrow')]
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+    print("{:<12} {:<9} {:>12} {:>10}".format('format', 'encoding', 'bytes', 'ms'))
+    for name, fn in encoders:
+        try:
+            seconds, body = best_of(fn, args.repeat)
+        except ImportError:
+            print("{:<12} skipped, pyarrow not installed".format(name))
+            continue
+        for encoding in encodings:
+            extra, (payload, _) = best_of(lambda: compress(body, encoding), args.repeat)
+            print("{:<12} {:<9} {:>12,} {:>10.1f}".format(name, encoding, len(payload), (seconds + extra) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Screener latency: compile a filter once, then time screens over a
+synthetic snapshot of a few thousand instruments.
+
+    python -m benchmarks.bench_screener [--instruments 5000] [--repeat 200]
+
+Needs the same environment as manage.py (API_KEY, USERNAME, PWD, TOKEN).
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stocks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from service.screener import FIELDS, Snapshot  # noqa: E402
+
+FILTERS = [
+    "change > 2",
+    "change > 2 and volume > avg_volume_20",
+    "ltp > sma_50 and sma_50 > sma_200 and volume / avg_volume_20 > 1.5",
+    "(ltp >= high_52w * 0.95 or ltp <= low_52w * 1.05) and not change < 0",
+]
+
+
+def synthetic_snapshot(n):
+    rng = np.random.default_rng(0)
+    columns = {field: rng.lognormal(4, 1, n) for field in FIELDS}
+    columns['change'] = rng.normal(0, 2, n)
+    keys = [('NSE', str(i)) for i in range(n)]
+    now = time.time()
+    return Snapshot(keys, ['SYM{}'.format(i) for i in range(n)], columns, now, now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instruments', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    snapshot = synthetic_snapshot(args.instruments)
+    for expression in FILTERS:
+        snapshot.screen(expression)  # compile
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            result = snapshot.screen(expression, sort='change', limit=100)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        print("{:7.3f} ms  {:>5} rows  {}".format(elapsed * 1000, len(result), expression))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Fixtures for the endpoint benchmarks. A BrokerStub replays SmartAPI and
+Yahoo on localhost and Django is pointed at it before it is set up, with a
+throwaway SQLite database and governor and an in-memory cache, so nothing
+here touches the network, db.sqlite3, governor.sqlite3 or cache/.
+
+    pip install -r requirements-dev.txt
+    python -m pytest benchmarks/ --benchmark-group-by=group
+
+BENCH_LATENCY sets the stub's per-call latency in seconds (default 0.02).
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.stub import BrokerStub
+
+LATENCY = float(os.environ.get('BENCH_LATENCY', 0.02))
+
+stub = BrokerStub(latency=LATENCY).start()
+
+# Always the stub, whatever the environment or .env says
+os.environ['SMARTAPI_ROOT'] = stub.url
+os.environ['YAHOO_REPLAY_URL'] = stub.url + '/yahoo'
+os.environ['INSTRUMENTS_URL'] = stub.url + '/OpenAPI_File/files/OpenAPIScripMaster.json'
+os.environ['GOVERNOR_DB'] = os.path.join(tempfile.mkdtemp(), 'governor.sqlite3')
+for key, value in {
+    'API_KEY': 'replay', 'USERNAME': 'R00000', 'PWD': '0000', 'TOKEN': 'JBSWY3DPEHPK3PXP',
+    # Measure the service, not the broker's rate limits
+    'LOGIN_RATE_PER_SECOND': '1000', 'YAHOO_RATE_PER_SECOND': '1000',
+    'BACKFILL_BACKOFF': '0.01', 'BACKFILL_RETRIES': '5',
+    # The stub has no WebSocket feed
+    'LIVE_BARS': 'False',
+    'CANDLE_RATE_PER_SECOND': '1000', 'CANDLE_RATE_PER_MINUTE': '60000',
+    'QUOTE_RATE_PER_SECOND': '1000', 'QUOTE_RATE_PER_MINUTE': '60000',
+}.items():
+    os.environ.setdefault(key, value)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stocks.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')}
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+settings.LOGGING['handlers']['file']['filename'] = os.devnull
+django.setup()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def django_db():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    yield
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+
+
+@pytest.fixture
+def broker():
+    """
+    The running stub, reset to the default latency and no errors.
+    """
+    stub.reset(latency=LATENCY)
+    yield stub
+    stub.reset(latency=LATENCY)
@@ -0,0 +1,166 @@
+"""
+Load test: the same slow upstream served by a sync view through Django's
+WSGI handler (a fixed pool of blocking workers, like gunicorn sync workers)
+and by the async FundamentalView through ASGI (one event loop, upstream
+calls on the upstream executor).
+
+A local stub HTTP server stands in for Yahoo with a fixed latency, and the
+fundamentals fetchers are pointed at it, so every request to
+/fundamental-data/ makes two real blocking HTTP calls. Each request uses a
+new symbol, so nothing is answered from the cache.
+
+The ASGI run is still capped by the upstream executor: at most
+--upstream-workers requests make progress at once whatever --concurrency
+is. Each run reports that effective concurrency (throughput times the
+upstream time of one request).
+
+    python -m benchmarks.loadtest_async [--requests 400] [--latency 0.2]
+                                        [--wsgi-workers 4] [--concurrency 200]
+                                        [--upstream-workers 64]
+
+Needs the same environment as manage.py (API_KEY, USERNAME, PWD, TOKEN).
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stocks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.http import JsonResponse  # noqa: E402
+from django.test import AsyncClient, Client, override_settings  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from service import executor, fundamentals, views  # noqa: E402
+
+
+def sync_fundamental_view(request):
+    """
+    FundamentalView as a plain sync view, the way a WSGI deployment runs it:
+    the worker thread itself blocks on the upstream calls.
+    """
+    ticker = views.yahoo_symbol(request.GET['symbol'])
+    return JsonResponse(fundamentals.fundamental_data(ticker))
+
+
+# URLconf for the WSGI run (ROOT_URLCONF is this module)
+urlpatterns = [path('fundamental-data/', sync_fundamental_view)]
+
+
+def start_stub(latency):
+    """
+    Threaded HTTP server that answers every GET after ``latency`` seconds.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps({
+                'previousClose': 100.0, 'trailingPE': 20.0, 'debtToEquity': 0.5, 'trailingEps': 5.0,
+                'bookValue': 50.0, 'dividendRate': 1.0, 'Net Income': 10.0, 'Total Revenue': 100.0,
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def point_fetchers_at(url):
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=256))
+
+    def fetch_info(symbol):
+        data = http.get(url, params={'symbol': symbol, 'module': 'info'}).json()
+        return {field: data.get(field) for field in fundamentals.INFO_FIELDS}
+
+    def fetch_financials(symbol):
+        data = http.get(url, params={'symbol': symbol, 'module': 'financials'}).json()
+        return {row: data.get(row) for row in fundamentals.FINANCIAL_ROWS}
+
+    fundamentals.fetch_info = fetch_info
+    fundamentals.fetch_financials = fetch_financials
+
+
+def symbols(n):
+    run = uuid.uuid4().hex[:8]
+    return ['LOAD{}{}.NS'.format(run, i) for i in range(n)]
+
+
+def run_wsgi(n, workers):
+    client = Client()
+
+    def hit(symbol):
+        return client.get('/fundamental-data/', {'symbol': symbol}).status_code
+
+    started = time.perf_counter()
+    with override_settings(ROOT_URLCONF=__name__), ThreadPoolExecutor(max_workers=workers) as pool:
+        codes = list(pool.map(hit, symbols(n)))
+    return time.perf_counter() - started, codes
+
+
+async def run_asgi(n, concurrency):
+    client = AsyncClient()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def hit(symbol):
+        async with limit:
+            return (await client.get('/fundamental-data/', {'symbol': symbol})).status_code
+
+    started = time.perf_counter()
+    codes = await asyncio.gather(*(hit(symbol) for symbol in symbols(n)))
+    return time.perf_counter() - started, codes
+
+
+def report(name, upstream_time, elapsed, codes):
+    ok = sum(code == 200 for code in codes)
+    rate = len(codes) / elapsed
+    print("{:<34} {:6.2f} s  {:8.1f} req/s  ~{:4.0f} in progress  ({}/{} ok)".format(
+        name, elapsed, rate, rate * upstream_time, ok, len(codes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.2, help="Stub upstream latency per call (s)")
+    parser.add_argument('--wsgi-workers', type=int, default=4, help="Blocking workers in the WSGI run")
+    parser.add_argument('--concurrency', type=int, default=200, help="In-flight requests in the ASGI run")
+    parser.add_argument('--upstream-workers', type=int, default=settings.UPSTREAM_WORKERS,
+                        help="Upstream executor threads in the ASGI run (UPSTREAM_WORKERS)")
+    args = parser.parse_args()
+
+    server = start_stub(args.latency)
+    point_fetchers_at('http://127.0.0.1:{}/'.format(server.server_address[1]))
+    executor.upstream_executor = ThreadPoolExecutor(max_workers=args.upstream_workers, thread_name_prefix='upstream')
+    upstream_time = 2 * args.latency
+    print("{} requests, 2 upstream calls each at {:.0f} ms".format(args.requests, args.latency * 1000))
+
+    report("WSGI sync view, {} workers".format(args.wsgi_workers), upstream_time,
+           *run_wsgi(args.requests, args.wsgi_workers))
+    report("ASGI, {} in flight, {} upstream".format(args.concurrency, args.upstream_workers), upstream_time,
+           *asyncio.run(run_asgi(args.requests, args.concurrency)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
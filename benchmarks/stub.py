@@ -0,0 +1,317 @@
+"""
+Local stand-in for the SmartAPI REST host and Yahoo fundamentals, for
+running and benchmarking the service without the network.
+
+Responses are replayed from benchmarks/recordings/ (drop captured
+responses there to replay them instead of the samples). Candles are
+served from recordings/candles/<EXCHANGE>_<TOKEN>_<INTERVAL>.json when
+present, else synthesized deterministically for the requested window, so
+overlapping requests always agree. Latency and error injection can be set
+per route.
+
+    python -m benchmarks.stub [--port 8765] [--latency 0.05] [--error-rate 0.01]
+
+then run the service against it:
+
+    SMARTAPI_ROOT=http://127.0.0.1:8765 YAHOO_REPLAY_URL=http://127.0.0.1:8765/yahoo \\
+        python manage.py runserver
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+RECORDINGS = Path(__file__).resolve().parent / 'recordings'
+
+MARKET_TZ = 'Asia/Kolkata'
+
+# Path -> route name used for latency, error injection and call counts
+ROUTES = {
+    ('POST', '/rest/auth/angelbroking/user/v1/loginByPassword'): 'login',
+    ('GET', '/rest/secure/angelbroking/user/v1/getProfile'): 'profile',
+    ('POST', '/rest/auth/angelbroking/jwt/v1/generateTokens'): 'token',
+    ('POST', '/rest/secure/angelbroking/historical/v1/getCandleData'): 'candles',
+    ('POST', '/rest/secure/angelbroking/market/v1/quote'): 'quote',
+    ('GET', '/OpenAPI_File/files/OpenAPIScripMaster.json'): 'scrip_master',
+}
+
+INTERVAL_MINUTES = {
+    'ONE_MINUTE': 1, 'THREE_MINUTE': 3, 'FIVE_MINUTE': 5, 'TEN_MINUTE': 10,
+    'FIFTEEN_MINUTE': 15, 'THIRTY_MINUTE': 30, 'ONE_HOUR': 60, 'ONE_DAY': None,
+}
+
+# What SmartAPI sends back when a client goes over its rate limit
+RATE_LIMITED = {'status': False, 'message': 'Access denied because of exceeding access rate',
+                'errorcode': 'AB1019', 'data': None}
+
+
+def make_jwt(ttl):
+    """
+    Unsigned JWT whose ``exp`` claim is ``ttl`` seconds from now.
+    """
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b'=').decode()
+    return '{}.{}.replay'.format(part({'alg': 'HS512'}), part({'sub': 'R00000', 'exp': int(time.time() + ttl)}))
+
+
+def price(token, epochs):
+    """
+    Deterministic price path per token: the same timestamp always gets the
+    same price whatever window it is requested in.
+    """
+    base = 100 + (int(token) % 900 if str(token).isdigit() else 500)
+    t = np.asarray(epochs, dtype='float64')
+    return base * (1 + 0.08 * np.sin(t / (86400 * 23)) + 0.02 * np.sin(t / 5400) + 0.004 * np.sin(t / 420))
+
+
+def synth_candles(token, interval, start, end):
+    """
+    SmartAPI-shaped candle rows for weekdays in [start, end].
+    """
+    start, end = pd.Timestamp(start, tz=MARKET_TZ), pd.Timestamp(end, tz=MARKET_TZ)
+    days = pd.bdate_range(start.normalize(), end.normalize(), tz=MARKET_TZ)
+    step = INTERVAL_MINUTES[interval]
+    if step is None:
+        index = days
+    else:
+        offsets = pd.to_timedelta(np.arange(0, 375, step), unit='min') + pd.Timedelta(hours=9, minutes=15)
+        index = pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).ravel()).tz_localize('UTC').tz_convert(MARKET_TZ)
+        index = index[(index >= start) & (index <= end)]
+    if not len(index):
+        return []
+
+    epochs = index.asi8 // 10**9
+    span = 86400 if step is None else step * 60
+    close = price(token, epochs + span)
+    open_ = price(token, epochs)
+    swing = np.abs(np.sin(epochs / 977.0)) * 0.003 * close
+    high = np.maximum(open_, close) + swing
+    low = np.minimum(open_, close) - swing
+    volume = 1000 + (epochs // 60 % 97) * 137
+    stamps = index.strftime('%Y-%m-%dT%H:%M:%S%z')
+    stamps = [s[:-2] + ':' + s[-2:] for s in stamps]
+    return [[s, round(o, 2), round(h, 2), round(lo, 2), round(c, 2), int(v)]
+            for s, o, h, lo, c, v in zip(stamps, open_, high, low, close, volume)]
+
+
+class BrokerStub:
+    """
+    Threaded HTTP server replaying SmartAPI and Yahoo responses.
+
+    ``latency`` and ``error_rate`` are either one number for every route or
+    a dict by route name ('login', 'profile', 'token', 'candles', 'quote',
+    'yahoo.info', 'yahoo.financials', 'scrip_master'); ``jitter`` adds up to
+    that fraction of the latency at random. Both can be changed while the
+    server runs. ``calls`` counts requests by route.
+    """
+
+    def __init__(self, recordings=RECORDINGS, latency=0.0, jitter=0.0, error_rate=0.0, seed=0,
+                 host='127.0.0.1', port=0, jwt_ttl=6 * 60 * 60):
+        self.recordings = Path(recordings)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.jwt_ttl = jwt_ttl
+        self.calls = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name='broker-stub').start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+
+    def recording(self, name):
+        if name not in self._cache:
+            path = self.recordings / name
+            self._cache[name] = json.loads(path.read_text()) if path.exists() else None
+        return self._cache[name]
+
+    def _setting(self, value, route):
+        return value.get(route, 0.0) if isinstance(value, dict) else value
+
+    def _delay_and_fail(self, route):
+        """
+        Sleep for the route's latency and decide whether to inject an error.
+        """
+        with self._lock:
+            self.calls[route] += 1
+            roll = self._random.random()
+            spread = self._random.random()
+        latency = self._setting(self.latency, route)
+        if latency:
+            time.sleep(latency * (1 + self.jitter * spread))
+        if roll < self._setting(self.error_rate, route):
+            with self._lock:
+                self.errors[route] += 1
+            return True
+        return False
+
+    # Responses
+
+    def login(self, body):
+        response = json.loads(json.dumps(self.recording('login.json')))
+        response['data']['jwtToken'] = make_jwt(self.jwt_ttl)
+        return 200, response
+
+    def profile(self, body):
+        return 200, self.recording('profile.json')
+
+    def token(self, body):
+        response = json.loads(json.dumps(self.recording('token.json')))
+        response['data']['jwtToken'] = make_jwt(self.jwt_ttl)
+        return 200, response
+
+    def candles(self, body):
+        exchange, token, interval = body.get('exchange'), body.get('symboltoken'), body.get('interval')
+        if interval not in INTERVAL_MINUTES:
+            return 200, {'status': False, 'message': 'Invalid interval', 'errorcode': 'AB1004', 'data': None}
+        start = datetime.strptime(body['fromdate'], '%Y-%m-%d %H:%M')
+        end = datetime.strptime(body['todate'], '%Y-%m-%d %H:%M')
+        recorded = self.recording('candles/{}_{}_{}.json'.format(exchange, token, interval))
+        if recorded is not None:
+            rows = [row for row in recorded['data']
+                    if pd.Timestamp(start, tz=MARKET_TZ) <= pd.Timestamp(row[0]) <= pd.Timestamp(end, tz=MARKET_TZ)]
+        else:
+            rows = synth_candles(token, interval, start, end)
+        return 200, {'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': rows}
+
+    def quote(self, body):
+        template = self.recording('quote.json')
+        now = int(time.time())
+        today = int(pd.Timestamp.now(tz=MARKET_TZ).normalize().timestamp())
+        fetched = []
+        for exchange, tokens in (body.get('exchangeTokens') or {}).items():
+            for token in tokens:
+                ltp, close = (round(float(p), 2) for p in price(token, [now, today]))
+                quote = dict(template, exchange=exchange, symbolToken=str(token),
+                             tradingSymbol='SYM{}-EQ'.format(token), ltp=ltp, open=close, close=close,
+                             high=round(max(ltp, close) * 1.01, 2), low=round(min(ltp, close) * 0.99, 2),
+                             netChange=round(ltp - close, 2), percentChange=round((ltp / close - 1) * 100, 2),
+                             avgPrice=round((ltp + close) / 2, 2), tradeVolume=1000 * (int(token) % 997 + 1),
+                             exchFeedTime=time.strftime('%d-%b-%Y %H:%M:%S'))
+                fetched.append(quote)
+        return 200, {'status': True, 'message': 'SUCCESS', 'errorcode': '',
+                     'data': {'fetched': fetched, 'unfetched': []}}
+
+    def yahoo(self, module, symbol):
+        recorded = self.recording('yahoo/{}_{}.json'.format(module, symbol)) or self.recording('{}.json'.format(module))
+        return 200, recorded
+
+    def scrip_master(self, body):
+        return 200, self.recording('OpenAPIScripMaster.json') or []
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def _dispatch(self, method):
+                path = urlparse(self.path).path
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+
+                if path.startswith('/yahoo/'):
+                    _, _, module, symbol = path.split('/', 3)
+                    route = 'yahoo.{}'.format(module)
+                    handler = lambda body: stub.yahoo(module, symbol)  # noqa: E731
+                else:
+                    route = ROUTES.get((method, path.rstrip('/')))
+                    handler = getattr(stub, route) if route else None
+                if handler is None:
+                    return self._send(404, {'status': False, 'message': 'Not found', 'errorcode': 'AB404'})
+
+                if route not in ('login', 'profile', 'token', 'scrip_master') and not route.startswith('yahoo.'):
+                    if not self.headers.get('Authorization', '').startswith('Bearer '):
+                        return self._send(403, {'status': False, 'message': 'Invalid Token', 'errorcode': 'AG8001'})
+
+                if stub._delay_and_fail(route):
+                    if route.startswith('yahoo.'):
+                        return self._send(500, {'error': 'injected'})
+                    # Alternate between a server error and SmartAPI's rate limit reply
+                    if stub._random.random() < 0.5:
+                        return self._send(500, {'status': False, 'message': 'Internal error', 'errorcode': 'AB2001'})
+                    return self._send(200, RATE_LIMITED)
+
+                status, payload = handler(body)
+                if payload is None:
+                    return self._send(404, {'error': 'no recording'})
+                self._send(status, payload)
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.5, help="Up to this fraction of extra latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument('--recordings', default=str(RECORDINGS))
+    args = parser.parse_args()
+
+    stub = BrokerStub(args.recordings, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      host=args.host, port=args.port)
+    print("Replaying {} on {}".format(args.recordings, stub.url))
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(stub.calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Throughput and latency of each endpoint under concurrency, against the
+broker stub (see conftest.py). Each benchmark round fires ``REQUESTS``
+requests with at most ``CONCURRENCY`` in flight through the ASGI stack;
+requests per second and p50/p95/p99 latency go into extra_info.
+"""
+import asyncio
+import itertools
+import time
+
+import numpy as np
+import pytest
+from django.test import AsyncClient, override_settings
+
+REQUESTS = 50
+CONCURRENCY = 10
+ROUNDS = 3
+
+_unique = itertools.count(100000)
+
+
+def hammer(path, params, requests=REQUESTS, concurrency=CONCURRENCY):
+    """
+    Send ``requests`` GETs (``params`` is a dict or a function of the
+    request number) and return (elapsed seconds, status codes, latencies).
+    """
+    async def run():
+        client = AsyncClient()
+        limit = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def hit(i):
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(path, params(i) if callable(params) else params)
+                latencies.append(time.perf_counter() - started)
+                return response.status_code
+
+        started = time.perf_counter()
+        codes = await asyncio.gather(*(hit(i) for i in range(requests)))
+        return time.perf_counter() - started, codes, latencies
+
+    return asyncio.run(run())
+
+
+def measure(benchmark, path, params, expect=200, warmup=True, **options):
+    """
+    Benchmark ``hammer`` and record throughput and latency percentiles.
+    """
+    if warmup:
+        hammer(path, params if not callable(params) else params(0), requests=1, concurrency=1)
+    results = []
+
+    def round_():
+        results.append(hammer(path, params, **options))
+
+    benchmark.pedantic(round_, rounds=ROUNDS, iterations=1)
+    elapsed = sum(r[0] for r in results)
+    codes = [code for r in results for code in r[1]]
+    latencies = np.array([latency for r in results for latency in r[2]])
+    benchmark.extra_info.update({
+        'requests': len(codes),
+        'req_per_s': round(len(codes) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 2),
+    })
+    assert all(code == expect for code in codes), codes
+    return codes
+
+
+@pytest.mark.benchmark(group='historical-data')
+def test_historical_data_cold(benchmark, broker):
+    # A new token per request: every request goes to getCandleData
+    codes = measure(benchmark, '/historical-data/', lambda i: {'token': next(_unique)}, warmup=False)
+    assert broker.calls['candles'] >= len(codes)
+
+
+@pytest.mark.benchmark(group='historical-data')
+def test_historical_data_warm(benchmark, broker):
+    measure(benchmark, '/historical-data/', {'token': '1333'})
+
+
+@pytest.mark.benchmark(group='historical-data')
+@pytest.mark.parametrize('output', ['records', 'columnar', 'arrow'])
+def test_historical_data_intraday(benchmark, broker, output):
+    params = {'token': '2885', 'timeperiod': 'FIVE_MINUTE', 'period': '15min', 'format': output}
+    measure(benchmark, '/historical-data/', params, requests=20)
+
+
+@pytest.mark.benchmark(group='historical-data')
+def test_historical_data_with_upstream_errors(benchmark, broker):
+    # Injected 500s and rate limit replies are retried by the backfill layer;
+    # at 10% a request only fails if every one of its attempts does
+    broker.error_rate = {'candles': 0.1}
+    measure(benchmark, '/historical-data/', lambda i: {'token': next(_unique)}, warmup=False)
+    assert broker.errors['candles'] > 0
+
+
+@pytest.mark.benchmark(group='indicators')
+@pytest.mark.parametrize('indicator', ['sma', 'rsi', 'macd', 'vwap'])
+def test_indicators(benchmark, broker, indicator):
+    measure(benchmark, '/indicators/', {'token': '1333', 'indicator': indicator, 'limit': 100})
+
+
+@pytest.mark.benchmark(group='backtest')
+def test_backtest(benchmark, broker):
+    measure(benchmark, '/backtest/', {'token': '1333', 'strategy': 'sma_crossover', 'fast': 10, 'slow': 50})
+
+
+@pytest.mark.benchmark(group='market-data')
+def test_market_data(benchmark, broker):
+    measure(benchmark, '/market-data/', {})
+
+
+@pytest.mark.benchmark(group='market-data')
+def test_market_data_watchlist_500(benchmark, broker):
+    from service.models import Watchlist, WatchlistItem
+
+    watchlist, _ = Watchlist.objects.get_or_create(name='bench-500')
+    WatchlistItem.objects.bulk_create(
+        [WatchlistItem(watchlist=watchlist, symboltoken=str(token)) for token in range(1, 501)],
+        ignore_conflicts=True,
+    )
+    # 500 tokens are 10 quote batches per request, over however many rounds ran
+    codes = measure(benchmark, '/market-data/', {'watchlist': 'bench-500'}, requests=20)
+    assert broker.calls['quote'] >= 10 * len(codes)
+
+
+@pytest.mark.benchmark(group='market-data')
+def test_screener(benchmark, broker):
+    measure(benchmark, '/screener/', {'q': 'change > 0 and volume > 10000', 'sort': 'change', 'limit': 20})
+
+
+@pytest.mark.benchmark(group='fundamentals')
+def test_fundamentals_cold(benchmark, broker):
+    measure(benchmark, '/fundamental-data/', lambda i: {'symbol': 'BENCH{}.NS'.format(next(_unique))}, warmup=False)
+
+
+@pytest.mark.benchmark(group='fundamentals')
+def test_fundamentals_warm(benchmark, broker):
+    measure(benchmark, '/fundamental-data/', {'symbol': 'HDFCBANK.NS'})
+
+
+@pytest.mark.benchmark(group='fundamentals')
+def test_bulk_fundamentals(benchmark, broker):
+    symbols = ','.join('BULK{}.NS'.format(i) for i in range(200))
+    measure(benchmark, '/fundamental-data/bulk/', {'symbols': symbols}, requests=5, concurrency=5)
+
+
+@pytest.mark.benchmark(group='fundamentals')
+def test_bulk_fundamentals_default_limits(benchmark, broker):
+    """
+    One cold bulk request under the Yahoo limit and interactive wait cap of
+    stocks/settings.py, which conftest.py lifts for the other benchmarks:
+    slower, but every symbol must be fetched.
+    """
+    async def bulk():
+        symbols = ','.join('COLD{}.NS'.format(next(_unique)) for _ in range(40))
+        return await AsyncClient().get('/fundamental-data/bulk/', {'symbols': symbols})
+
+    responses = []
+    with override_settings(YAHOO_RATE_PER_SECOND=10, GOVERNOR_MAX_WAIT=10):
+        benchmark.pedantic(lambda: responses.append(asyncio.run(bulk())), rounds=ROUNDS, iterations=1)
+    for response in responses:
+        assert response.status_code == 200
+        errors = [error for error in response.json()['error'] if error]
+        assert not errors, errors
+
+
+@pytest.mark.benchmark(group='metrics')
+def test_metrics(benchmark, broker):
+    measure(benchmark, '/metrics', {})
@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Instrument, Watchlist, WatchlistItem
+
+
+class WatchlistItemInline(admin.TabularInline):
+    model = WatchlistItem
+    extra = 1
+
+
+@admin.register(Watchlist)
+class WatchlistAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+    inlines = [WatchlistItemInline]
+
+
+@admin.register(Instrument)
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ('exchange', 'token', 'symbol', 'name', 'instrumenttype', 'yahoo')
+    list_filter = ('exchange', 'instrumenttype')
+    search_fields = ('symbol', 'name', 'token', 'yahoo')
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# NSE cash session opens at 09:15, intraday bars are anchored there
+SESSION_OFFSET = '9h15min'
+
+# Calendar rollups; weeks are labelled by their Monday, months by the 1st
+RULES = {
+    'day': {'rule': '1D'},
+    'week': {'rule': 'W-MON', 'label': 'left', 'closed': 'left'},
+    'month': {'rule': 'MS'},
+}
+
+OHLCV_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+}
+
+
+def _resample_kwargs(period):
+    """
+    Map 'day' / 'week' / 'month' / '<N>min' to DataFrame.resample arguments.
+    """
+    if period in RULES:
+        return dict(RULES[period])
+    match = re.fullmatch(r'(\d+)\s*(?:m|min|minute|minutes)', str(period).strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError("Unsupported period: {}".format(period))
+    return {'rule': '{}min'.format(match.group(1)), 'origin': 'start_day', 'offset': SESSION_OFFSET}
+
+
+def resample_candles(df, period):
+    """
+    Roll candles indexed by DateTime up into OHLCV bars for ``period``
+    ('day', 'week', 'month' or 'N' minutes such as '15min'). Bins without
+    any candle (nights, weekends, holidays) are dropped.
+    """
+    kwargs = _resample_kwargs(period)
+    rule = kwargs.pop('rule')
+    bars = df[list(OHLCV_AGG)].resample(rule, **kwargs).agg(OHLCV_AGG)
+    return bars[bars['Open'].notna()]
+
+
+def add_previous_close(bars):
+    """
+    Add PTD_Close (previous bar close) and Change (% move from it) with a
+    vectorized shift. Change is left empty when the previous close is not
+    positive.
+    """
+    bars = bars.copy()
+    previous_close = bars['Close'].shift(1)
+    bars['PTD_Close'] = previous_close
+    valid = previous_close > 0
+    bars['Change'] = np.where(valid, (bars['Close'] - previous_close) / previous_close.where(valid) * 100, np.nan)
+    return bars
+
+
+def stitch_bars(history, bars):
+    """
+    Append freshly resampled ``bars`` to precomputed ``history``. History
+    bars from the first new bar on (the period still being filled) are
+    replaced.
+    """
+    if bars.empty:
+        return history
+    return pd.concat([history[history.index < bars.index[0]], bars])
+
+
+def summarize(df, period='day', history=None):
+    """
+    Resample candles and add previous-close/change columns. The result has a
+    'Date' column (YYYY-MM-DD, or full timestamp for intraday bars) first,
+    matching the /historical-data/ payload. With ``history`` (bars from
+    resample_candles, e.g. precomputed at the close) ``df`` only needs to
+    cover the last history bar onwards.
+    """
+    bars = resample_candles(df, period)
+    if history is not None:
+        bars = stitch_bars(history, bars)
+    bars = add_previous_close(bars)
+    if period in RULES:
+        dates = bars.index.strftime('%Y-%m-%d')
+    else:
+        dates = bars.index.strftime('%Y-%m-%dT%H:%M:%S%z')
+    bars.insert(0, 'Date', dates)
+    return bars.reset_index(drop=True)
@@ -0,0 +1,140 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+
+from .executor import in_context
+from .governor import UpstreamUnavailable, is_rejection
+
+logger = logging.getLogger(__name__)
+
+# Largest date span getCandleData accepts in one call, per interval
+MAX_DAYS_PER_REQUEST = {
+    'ONE_MINUTE': 30,
+    'THREE_MINUTE': 60,
+    'FIVE_MINUTE': 100,
+    'TEN_MINUTE': 100,
+    'FIFTEEN_MINUTE': 200,
+    'THIRTY_MINUTE': 200,
+    'ONE_HOUR': 400,
+    'ONE_DAY': 2000,
+}
+
+
+def plan_windows(start, end, interval):
+    """
+    Split [start, end] into consecutive windows no longer than the API
+    accepts for ``interval``.
+    """
+    if interval not in MAX_DAYS_PER_REQUEST:
+        raise ValueError("Unsupported interval: {}".format(interval))
+    step = timedelta(days=MAX_DAYS_PER_REQUEST[interval])
+    windows = []
+    window_from = start
+    while window_from < end:
+        window_to = min(window_from + step, end)
+        windows.append((window_from, window_to))
+        window_from = window_to
+    return windows or [(start, end)]
+
+
+def _fetch_with_retry(fetch, exchange, token, window_from, window_to, interval, retries, backoff):
+    attempt = 0
+    while True:
+        try:
+            return fetch(exchange, token, window_from, window_to, interval)
+        except UpstreamUnavailable:
+            # The governor already waited or the circuit is open, retrying won't help
+            raise
+        except Exception as e:
+            # A refused request (bad token or interval) gets the same answer again
+            if attempt >= retries or is_rejection(e):
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            logger.warning("Candle window %s - %s failed (%s), retrying in %.1fs", window_from, window_to, e, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class PartialFetchError(Exception):
+    """
+    Raised by fetch_range when some windows failed and others did not.
+    ``windows`` is [(window_from, window_to, frame or None)] in date order,
+    ``error`` the first failure.
+    """
+
+    def __init__(self, windows, error):
+        failed = sum(frame is None for _, _, frame in windows)
+        super().__init__("{} of {} candle windows failed: {}".format(failed, len(windows), error))
+        self.windows = windows
+        self.error = error
+
+    def fetched(self):
+        """
+        Candles of every window that succeeded.
+        """
+        return stitch([frame for _, _, frame in self.windows if frame is not None])
+
+    def leading(self):
+        """
+        (from, to) of the unbroken run of successful windows at the start of
+        the range, or None.
+        """
+        failed = next(i for i, window in enumerate(self.windows) if window[2] is None)
+        return (self.windows[0][0], self.windows[failed - 1][1]) if failed else None
+
+    def trailing(self):
+        """
+        (from, to) of the unbroken run of successful windows at the end of
+        the range, or None.
+        """
+        failed = max(i for i, window in enumerate(self.windows) if window[2] is None)
+        return (self.windows[failed + 1][0], self.windows[-1][1]) if failed < len(self.windows) - 1 else None
+
+
+def stitch(frames):
+    """
+    Concatenate window results in order, dropping the duplicate candles at
+    window boundaries.
+    """
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    df = pd.concat(frames)
+    df = df[~df.index.duplicated(keep='last')]
+    return df.sort_index()
+
+
+def fetch_range(fetch, exchange, token, start, end, interval, workers=None, retries=None, backoff=None):
+    """
+    Fetch [start, end] through ``fetch`` (one getCandleData window per call)
+    using a bounded worker pool. Windows are retried with exponential backoff
+    and the results are stitched in order with duplicate candles at window
+    boundaries removed. If every window fails the first error is raised;
+    if only some do, PartialFetchError carries the ones that succeeded.
+    """
+    workers = workers or settings.BACKFILL_WORKERS
+    retries = settings.BACKFILL_RETRIES if retries is None else retries
+    backoff = settings.BACKFILL_BACKOFF if backoff is None else backoff
+
+    windows = plan_windows(start, end, interval)
+    if len(windows) == 1:
+        return stitch([_fetch_with_retry(fetch, exchange, token, *windows[0], interval, retries, backoff)])
+
+    def attempt(window):
+        try:
+            return _fetch_with_retry(fetch, exchange, token, *window, interval, retries, backoff), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(windows))) as pool:
+        results = list(pool.map(in_context(attempt), windows))
+
+    errors = [error for _, error in results if error is not None]
+    if len(errors) == len(windows):
+        raise errors[0]
+    if errors:
+        raise PartialFetchError([(*window, frame) for window, (frame, _) in zip(windows, results)], errors[0])
+    return stitch([frame for frame, _ in results])
@@ -0,0 +1,250 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Bars per trading year for annualising Sharpe (NSE: ~252 sessions of 375 minutes)
+SESSIONS_PER_YEAR = 252
+SESSION_MINUTES = 375
+INTERVAL_MINUTES = {
+    'ONE_MINUTE': 1,
+    'THREE_MINUTE': 3,
+    'FIVE_MINUTE': 5,
+    'TEN_MINUTE': 10,
+    'FIFTEEN_MINUTE': 15,
+    'THIRTY_MINUTE': 30,
+    'ONE_HOUR': 60,
+}
+
+
+def bars_per_year(interval):
+    if interval in INTERVAL_MINUTES:
+        return SESSIONS_PER_YEAR * int(np.ceil(SESSION_MINUTES / INTERVAL_MINUTES[interval]))
+    return SESSIONS_PER_YEAR
+
+
+def to_arrays(candles):
+    """
+    Candle DataFrame (Open/High/Low/Close/Volume) -> dict of float64 arrays.
+    """
+    return {
+        'open': candles['Open'].to_numpy(dtype='float64'),
+        'high': candles['High'].to_numpy(dtype='float64'),
+        'low': candles['Low'].to_numpy(dtype='float64'),
+        'close': candles['Close'].to_numpy(dtype='float64'),
+        'volume': candles['Volume'].to_numpy(dtype='float64'),
+    }
+
+
+def _hold(enter, exit):
+    """
+    Turn entry/exit masks into a 0/1 position that stays on from an entry
+    until the next exit, without a per-bar loop.
+    """
+    signal = np.where(enter, 1.0, np.where(exit, 0.0, np.nan))
+    return pd.Series(signal).ffill().fillna(0.0).to_numpy()
+
+
+class Strategy:
+    """
+    A strategy maps OHLCV arrays to the target position (-1 short, 0 flat,
+    1 long) decided at each bar's close. Subclasses set ``name`` and
+    ``defaults`` (plus ``flags``, the 0/1 switches among them) and implement
+    positions() with array operations.
+    """
+    name = None
+    defaults = {}
+    flags = ()
+
+    def params(self, **overrides):
+        """
+        The defaults updated with ``overrides``, cast to the default's type.
+        Raises ValueError on bad input: every parameter but a flag is a
+        window or threshold and must be positive.
+        """
+        params = dict(self.defaults)
+        for key, value in overrides.items():
+            if key not in params:
+                raise ValueError("{} has no parameter {}".format(self.name, key))
+            params[key] = type(params[key])(value)
+        for key, value in params.items():
+            if key in self.flags:
+                if value not in (0, 1):
+                    raise ValueError("{} must be 0 or 1".format(key))
+            elif value <= 0:
+                raise ValueError("{} must be positive".format(key))
+        return params
+
+    def positions(self, data, **params):
+        raise NotImplementedError
+
+
+class SmaCrossover(Strategy):
+    """
+    Long while the fast SMA is above the slow SMA (short instead of flat
+    when ``short`` is 1).
+    """
+    name = 'sma_crossover'
+    defaults = {'fast': 10, 'slow': 30, 'short': 0}
+    flags = ('short',)
+
+    def positions(self, data, fast, slow, short):
+        close = pd.Series(data['close'])
+        above = (close.rolling(fast).mean() > close.rolling(slow).mean()).to_numpy()
+        ready = np.arange(len(close)) >= max(fast, slow) - 1
+        return np.where(ready, np.where(above, 1.0, -1.0 if short else 0.0), 0.0)
+
+
+class RsiReversion(Strategy):
+    """
+    Buy when RSI drops below ``lower``, sell when it rises above ``upper``.
+    """
+    name = 'rsi_reversion'
+    defaults = {'period': 14, 'lower': 30.0, 'upper': 70.0}
+
+    def params(self, **overrides):
+        params = super().params(**overrides)
+        if not params['lower'] < params['upper'] < 100:
+            raise ValueError("lower and upper must satisfy 0 < lower < upper < 100")
+        return params
+
+    def positions(self, data, period, lower, upper):
+        delta = pd.Series(data['close']).diff()
+        avg_gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
+        avg_loss = (-delta.clip(upper=0)).ewm(alpha=1 / period, adjust=False).mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = (100 - 100 / (1 + avg_gain / avg_loss)).to_numpy()
+        return _hold(rsi < lower, rsi > upper)
+
+
+class Breakout(Strategy):
+    """
+    Donchian breakout: buy a close above the prior ``period``-bar high, exit
+    on a close below the prior ``exit_period``-bar low.
+    """
+    name = 'breakout'
+    defaults = {'period': 20, 'exit_period': 10}
+
+    def positions(self, data, period, exit_period):
+        close = data['close']
+        prior_high = pd.Series(data['high']).rolling(period).max().shift(1).to_numpy()
+        prior_low = pd.Series(data['low']).rolling(exit_period).min().shift(1).to_numpy()
+        return _hold(close > prior_high, close < prior_low)
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (SmaCrossover, RsiReversion, Breakout)}
+
+
+def get_strategy(name):
+    if name not in STRATEGIES:
+        raise ValueError("Unknown strategy: {}. Choose from {}".format(name, ', '.join(STRATEGIES)))
+    return STRATEGIES[name]()
+
+
+def simulate(data, target, slippage_bps=0.0, brokerage_bps=0.0, capital=100000.0):
+    """
+    Fill target positions at the next bar's open and return per-bar net
+    returns and the equity curve. The gap from the previous close to the
+    open is earned by the old position, the open-to-close move by the new
+    one. Slippage and brokerage are charged on turnover in basis points.
+    """
+    open_, close = data['open'], data['close']
+    held = np.concatenate([[0.0], target[:-1]])          # position during bar t
+    before = np.concatenate([[0.0], held[:-1]])          # position over the gap into bar t
+    previous_close = np.concatenate([[open_[0]], close[:-1]])
+
+    gap = before * (open_ / previous_close - 1)
+    intrabar = held * (close / open_ - 1)
+    turnover = np.abs(held - before)
+    cost = turnover * (slippage_bps + brokerage_bps) / 1e4
+
+    returns = (1 + gap) * (1 + intrabar) - 1 - cost
+    equity = capital * np.cumprod(1 + returns)
+    return returns, equity, held, turnover
+
+
+def metrics(returns, equity, held, turnover, periods_per_year, capital=100000.0):
+    """
+    Summary statistics of a simulated run.
+    """
+    n = len(returns)
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity / peak - 1
+    std = returns.std(ddof=1) if n > 1 else 0.0
+    years = n / periods_per_year if periods_per_year else 0
+
+    # Per-trade returns: consecutive bars holding the same non-zero position
+    in_trade = held != 0
+    trade_id = np.cumsum(np.concatenate([[True], held[1:] != held[:-1]]))
+    if in_trade.any():
+        trade_returns = pd.Series(np.log1p(returns[in_trade])).groupby(trade_id[in_trade]).sum()
+        trades, win_rate = len(trade_returns), float((trade_returns > 0).mean())
+    else:
+        trades, win_rate = 0, None
+
+    final = float(equity[-1]) if n else capital
+    return {
+        'bars': n,
+        'trades': trades,
+        'win_rate': win_rate,
+        'exposure': float(in_trade.mean()) if n else 0.0,
+        'turnover': float(turnover.sum()),
+        'final_equity': final,
+        'total_return': final / capital - 1,
+        'cagr': (final / capital) ** (1 / years) - 1 if years > 0 and final > 0 else None,
+        'sharpe': float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else None,
+        'max_drawdown': float(drawdown.min()) if n else 0.0,
+    }
+
+
+def run_backtest(data, strategy, params=None, slippage_bps=0.0, brokerage_bps=0.0,
+                 capital=100000.0, periods_per_year=SESSIONS_PER_YEAR):
+    """
+    Run one strategy over OHLCV arrays. Returns (metrics dict, equity curve,
+    drawdown curve).
+    """
+    params = strategy.params(**(params or {}))
+    target = np.asarray(strategy.positions(data, **params), dtype='float64')
+    returns, equity, held, turnover = simulate(data, target, slippage_bps, brokerage_bps, capital)
+    summary = metrics(returns, equity, held, turnover, periods_per_year, capital)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return summary, equity, drawdown
+
+
+def expand_grid(grid):
+    """
+    {'fast': [5, 10], 'slow': [50]} -> [{'fast': 5, 'slow': 50}, {'fast': 10, 'slow': 50}]
+    """
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _sweep_symbol(symbol, data, strategy_name, combos, options):
+    strategy = get_strategy(strategy_name)
+    rows = []
+    for params in combos:
+        params = strategy.params(**params)
+        summary, _, _ = run_backtest(data, strategy, params, **options)
+        rows.append(dict(symbol=symbol, **params, **summary))
+    return rows
+
+
+def sweep(series, strategy_name, grid, workers=None, **options):
+    """
+    Run every parameter combination in ``grid`` over every symbol in
+    ``series`` ({symbol: OHLCV arrays}) on a process pool, one task per
+    symbol. Returns a DataFrame with one row per (symbol, params).
+    """
+    strategy = get_strategy(strategy_name)  # fail fast on a bad name
+    combos = expand_grid(grid) or [{}]
+    for params in combos:
+        strategy.params(**params)  # and on bad parameters, before any work starts
+    if workers == 1 or len(series) == 1:
+        results = [_sweep_symbol(symbol, data, strategy_name, combos, options) for symbol, data in series.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_sweep_symbol, symbol, data, strategy_name, combos, options)
+                       for symbol, data in series.items()]
+            results = [future.result() for future in futures]
+    return pd.DataFrame([row for rows in results for row in rows])
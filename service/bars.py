@@ -0,0 +1,170 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .aggregation import SESSION_OFFSET
+from .candles import CANDLE_COLUMNS, MARKET_TZ
+
+# getCandleData interval -> bar length in seconds; ONE_DAY bars start at midnight,
+# the others are anchored at the session open like the broker's candles
+TIMEFRAMES = {
+    'ONE_MINUTE': 60,
+    'THREE_MINUTE': 3 * 60,
+    'FIVE_MINUTE': 5 * 60,
+    'TEN_MINUTE': 10 * 60,
+    'FIFTEEN_MINUTE': 15 * 60,
+    'THIRTY_MINUTE': 30 * 60,
+    'ONE_HOUR': 60 * 60,
+    'ONE_DAY': 24 * 60 * 60,
+}
+ROWS = {interval: row for row, interval in enumerate(TIMEFRAMES)}
+DAY_ROW = ROWS['ONE_DAY']
+
+# Asia/Kolkata has no DST, so bins can be worked out on epoch seconds
+UTC_OFFSET = 5 * 60 * 60 + 30 * 60
+DAY = 24 * 60 * 60
+SESSION_START = int(pd.Timedelta(SESSION_OFFSET).total_seconds())
+
+_sizes = np.array(list(TIMEFRAMES.values()), dtype='int64')
+_intraday = _sizes < DAY
+_rows = np.arange(len(_sizes))
+
+
+def bin_starts(ts):
+    """
+    Start (epoch seconds) of the bar containing ``ts`` for every timeframe.
+    """
+    local = int(ts) + UTC_OFFSET
+    day_start = local - local % DAY
+    anchor = np.where(_intraday, day_start + SESSION_START, day_start)
+    return anchor + (local - anchor) // _sizes * _sizes - UTC_OFFSET
+
+
+class InstrumentBars:
+    """
+    Ring buffers of OHLCV bars for one instrument, one row per timeframe,
+    all updated together from each tick.
+    """
+
+    def __init__(self, capacity):
+        self.starts = np.full((len(_sizes), capacity), -1, dtype='int64')
+        self.ohlcv = np.zeros((len(_sizes), capacity, 5))
+        self.heads = np.zeros(len(_sizes), dtype='int64')
+        self.day = None
+        self.first_tick = None
+        self.day_volume = None
+        self.day_fields = False
+
+    def add(self, ts, price, day_volume=None, day_bar=None):
+        bins = bin_starts(ts)
+        day = bins[DAY_ROW]
+        if day != self.day:
+            self.day, self.first_tick, self.day_volume, self.day_fields = day, ts, None, False
+
+        # Traded volume since the previous tick, from the day's running total
+        volume = 0.0
+        if day_volume is not None:
+            if self.day_volume is not None and day_volume >= self.day_volume:
+                volume = day_volume - self.day_volume
+            self.day_volume = day_volume
+
+        current = self.starts[_rows, self.heads]
+        # A late tick is counted in the bar being built
+        bins = np.maximum(bins, current)
+        new = bins > current
+        self.heads = np.where(new, (self.heads + 1) % self.starts.shape[1], self.heads)
+
+        bars = self.ohlcv[_rows, self.heads]
+        bars[new] = (price, price, price, price, 0.0)
+        bars[:, 1] = np.maximum(bars[:, 1], price)
+        bars[:, 2] = np.minimum(bars[:, 2], price)
+        bars[:, 3] = price
+        bars[:, 4] += volume
+        if day_bar is not None:
+            # The feed carries the day's own open/high/low/volume, exact even
+            # when the feed started after the open
+            bars[DAY_ROW] = day_bar
+            self.day_fields = True
+        self.ohlcv[_rows, self.heads] = bars
+        self.starts[_rows, self.heads] = bins
+
+    def covered_from(self, row, connected_at):
+        """
+        Earliest bar start of today whose every tick was seen.
+        """
+        if row == DAY_ROW:
+            return self.day if self.day_fields else max(self.first_tick, connected_at or 0)
+        # Pre-open ticks never make an intraday bar
+        return max(self.first_tick, connected_at or 0, self.day + SESSION_START)
+
+
+class BarBuilder:
+    """
+    Rolling intraday bars for every instrument on the live feed, kept in
+    NumPy ring buffers of BAR_CAPACITY bars per timeframe. Written by the
+    feed thread, read by request handlers.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.connected_at = None
+        self._lock = threading.Lock()
+        self._instruments = {}
+
+    def reconnected(self):
+        """
+        Called when the feed (re)connects: ticks may have been missed, so bars
+        that started before now are not served as complete, and the volume
+        traded during the outage is not counted in the next tick's bar.
+        """
+        with self._lock:
+            self.connected_at = time.time()
+            for bars in self._instruments.values():
+                bars.day_volume = None
+
+    def add_quote(self, quote):
+        """
+        Fold one tick (as produced by feed.tick_to_quote) into the bars.
+        """
+        ts = quote.get('exchFeedTime')
+        ts = ts / 1000 if ts else time.time()
+        day_bar = None
+        if quote.get('open'):
+            day_bar = (quote['open'], quote['high'], quote['low'], quote['ltp'], quote.get('tradeVolume') or 0)
+        key = (quote['exchange'], str(quote['symbolToken']))
+        with self._lock:
+            bars = self._instruments.get(key)
+            if bars is None:
+                bars = self._instruments[key] = InstrumentBars(self.capacity or settings.BAR_CAPACITY)
+            bars.add(ts, quote['ltp'], quote.get('tradeVolume'), day_bar)
+
+    def today(self, exchange, token, interval):
+        """
+        Today's bars for ``interval`` that were built from the first tick,
+        as a candle DataFrame indexed by DateTime (the last bar still
+        forming), or None when there are none.
+        """
+        row = ROWS.get(interval)
+        with self._lock:
+            bars = self._instruments.get((exchange, str(token)))
+            if row is None or bars is None:
+                return None
+            starts = bars.starts[row].copy()
+            ohlcv = bars.ohlcv[row].copy()
+            covered_from = bars.covered_from(row, self.connected_at)
+
+        keep = starts >= covered_from
+        if not keep.any():
+            return None
+        order = np.argsort(starts[keep])
+        index = pd.to_datetime(starts[keep][order], unit='s', utc=True).tz_convert(MARKET_TZ)
+        df = pd.DataFrame(ohlcv[keep][order], index=index, columns=CANDLE_COLUMNS[1:])
+        df['Volume'] = df['Volume'].astype('int64')
+        df.index.name = 'DateTime'
+        return df
+
+    def __len__(self):
+        return len(self._instruments)
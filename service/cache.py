@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SWRCache:
+    """
+    TTL cache with stale-while-revalidate on top of a Django cache backend.
+
+    Entries younger than ``ttl`` are served as is. Older entries are still
+    served for up to ``stale_ttl`` more seconds while one background refresh
+    runs. Concurrent misses for the same key share a single fetch
+    (single-flight) instead of each going upstream.
+    """
+
+    def __init__(self, alias='default', workers=None):
+        self.alias = alias
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers or settings.CACHE_REFRESH_WORKERS,
+                                            thread_name_prefix='cache-refresh')
+        self._counters = {'hits': 0, 'stale': 0, 'misses': 0, 'fetches': 0, 'errors': 0}
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, key, fetch, ttl, stale_ttl=0):
+        """
+        Return the cached value for ``key``, calling ``fetch()`` when it is
+        missing (blocking) or older than ``ttl`` (in the background).
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age < ttl:
+                self._count('hits')
+                return entry['value']
+            if age < ttl + stale_ttl:
+                self._count('stale')
+                self._start(key, fetch, ttl, stale_ttl, background=True)
+                return entry['value']
+
+        self._count('misses')
+        return self._start(key, fetch, ttl, stale_ttl, background=False).result()
+
+    def refresh(self, key, fetch, ttl, stale_ttl=0):
+        """
+        Fetch ``key`` now regardless of its age and return the new value.
+        """
+        return self._start(key, fetch, ttl, stale_ttl, background=False).result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['inflight'] = len(self._inflight)
+            return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _start(self, key, fetch, ttl, stale_ttl, background):
+        """
+        Join the in-flight fetch for ``key`` or start one. Foreground fetches
+        run in the calling thread, background ones on the refresh pool.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = Future()
+            self._counters['fetches'] += 1
+
+        if background:
+            self._executor.submit(self._run, key, fetch, ttl, stale_ttl, future)
+        else:
+            self._run(key, fetch, ttl, stale_ttl, future)
+        return future
+
+    def _run(self, key, fetch, ttl, stale_ttl, future):
+        try:
+            value = fetch()
+            self.backend.set(key, {'value': value, 'fetched_at': time.time()}, timeout=ttl + stale_ttl)
+            future.set_result(value)
+        except Exception as e:
+            self._count('errors')
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+cache = SWRCache()
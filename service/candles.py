@@ -0,0 +1,215 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .backfill import PartialFetchError, fetch_range
+from .governor import UpstreamReplyError, UpstreamUnavailable, governor
+from .models import Candle, CandleSeries
+from .session import obj
+
+logger = logging.getLogger(__name__)
+
+CANDLE_COLUMNS = ['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# getCandleData takes and returns exchange local time
+MARKET_TZ = 'Asia/Kolkata'
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class CandleFetchError(UpstreamReplyError):
+    """
+    Raised when getCandleData does not return usable data.
+    """
+
+
+def to_market_time(value):
+    """
+    Accept a "%Y-%m-%d %H:%M" string or a datetime and return an aware
+    timestamp in exchange local time.
+    """
+    value = pd.Timestamp(datetime.strptime(value, DATE_FORMAT) if isinstance(value, str) else value)
+    if value.tzinfo is None:
+        return value.tz_localize(MARKET_TZ)
+    return value.tz_convert(MARKET_TZ)
+
+
+def market_now():
+    """
+    The current time in exchange local time. datetime.now() is the process
+    time zone (UTC under Django's TIME_ZONE), so it must not be passed to
+    to_market_time.
+    """
+    return pd.Timestamp.now(tz=MARKET_TZ)
+
+
+def empty_frame():
+    df = pd.DataFrame(columns=CANDLE_COLUMNS)
+    df['DateTime'] = pd.to_datetime(df['DateTime']).dt.tz_localize(MARKET_TZ)
+    return df.set_index('DateTime')
+
+
+def fetch_candles(exchange, token, from_date, to_date, timeperiod):
+    """
+    Fetch one window of candles straight from getCandleData and return it as
+    a DataFrame indexed by DateTime.
+    """
+    historicParam = {
+        "exchange": exchange,
+        "symboltoken": str(token),
+        "interval": timeperiod,
+        "fromdate": to_market_time(from_date).strftime(DATE_FORMAT),
+        "todate": to_market_time(to_date).strftime(DATE_FORMAT)
+    }
+    with governor.call('getCandleData'):
+        api_response = obj.getCandleData(historicParam)
+        if not api_response or not api_response.get('status'):
+            raise CandleFetchError((api_response or {}).get('message', 'empty response'),
+                                   (api_response or {}).get('errorcode', ''))
+
+    df = pd.DataFrame(api_response['data'] or [], columns=CANDLE_COLUMNS)
+    df['DateTime'] = pd.to_datetime(df['DateTime'])
+    if df['DateTime'].dt.tz is None:
+        df['DateTime'] = df['DateTime'].dt.tz_localize(MARKET_TZ)
+    df.set_index('DateTime', inplace=True)
+    return df
+
+
+def load_candles(exchange, token, timeperiod, start=None, end=None):
+    """
+    Read stored candles for a series, optionally limited to [start, end].
+    """
+    qs = Candle.objects.filter(exchange=exchange, symboltoken=str(token), interval=timeperiod)
+    if start is not None:
+        qs = qs.filter(timestamp__gte=int(to_market_time(start).timestamp()))
+    if end is not None:
+        qs = qs.filter(timestamp__lte=int(to_market_time(end).timestamp()))
+    rows = list(qs.order_by('timestamp').values_list('timestamp', 'open', 'high', 'low', 'close', 'volume'))
+    if not rows:
+        return empty_frame()
+
+    arr = np.array(rows, dtype='float64')
+    index = pd.to_datetime(arr[:, 0].astype('int64'), unit='s', utc=True).tz_convert(MARKET_TZ)
+    df = pd.DataFrame(arr[:, 1:], index=index, columns=CANDLE_COLUMNS[1:])
+    df['Volume'] = df['Volume'].astype('int64')
+    df.index.name = 'DateTime'
+    return df
+
+
+def save_candles(exchange, token, timeperiod, df):
+    """
+    Upsert candles into the store. The last candle of a fetch is usually
+    still forming, so existing rows are overwritten rather than skipped.
+    """
+    if df.empty:
+        return
+    timestamps = df.index.asi8 // 10**9
+    values = df[CANDLE_COLUMNS[1:]].to_numpy()
+    Candle.objects.bulk_create(
+        [
+            Candle(exchange=exchange, symboltoken=str(token), interval=timeperiod, timestamp=int(ts),
+                   open=o, high=h, low=l, close=c, volume=int(v))
+            for ts, (o, h, l, c, v) in zip(timestamps, values)
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['exchange', 'symboltoken', 'interval', 'timestamp'],
+        update_fields=['open', 'high', 'low', 'close', 'volume'],
+    )
+
+
+def last_candle_time(exchange, token, timeperiod):
+    ts = (Candle.objects.filter(exchange=exchange, symboltoken=str(token), interval=timeperiod)
+          .order_by('-timestamp').values_list('timestamp', flat=True).first())
+    if ts is None:
+        return None
+    return pd.Timestamp(ts, unit='s', tz='UTC').tz_convert(MARKET_TZ)
+
+
+def missing_ranges(series, start, end, last_candle):
+    """
+    Work out which [from, to] windows still have to come from upstream for
+    a request covering [start, end].
+    """
+    if series.fetched_from is None:
+        return [(start, end)]
+
+    fetched_from = to_market_time(series.fetched_from)
+    fetched_to = to_market_time(series.fetched_to)
+    ranges = []
+    if start < fetched_from:
+        ranges.append((start, fetched_from))
+    if end - fetched_to > timedelta(seconds=settings.CANDLE_REFRESH_SECONDS):
+        # Re-read from the last stored candle, it may have been incomplete
+        tail_from = min(last_candle, fetched_to) if last_candle is not None else fetched_to
+        ranges.append((tail_from, end))
+    return ranges
+
+
+def get_candles(exchange, token, from_date, to_date, timeperiod):
+    """
+    Return candles for [from_date, to_date], serving what is already stored
+    and only fetching the missing head/tail from getCandleData. Long ranges
+    are split into windows the API accepts and fetched concurrently.
+    """
+    start = to_market_time(from_date)
+    end = to_market_time(to_date)
+    token = str(token)
+
+    series, _ = CandleSeries.objects.get_or_create(exchange=exchange, symboltoken=token, interval=timeperiod)
+    last_candle = last_candle_time(exchange, token, timeperiod)
+
+    for window_from, window_to in missing_ranges(series, start, end, last_candle):
+        try:
+            df = fetch_range(fetch_candles, exchange, token, window_from, window_to, timeperiod)
+        except UpstreamUnavailable as e:
+            if last_candle is None:
+                raise
+            # Serve what is stored until upstream is back
+            logger.warning("Serving stored %s:%s %s candles: %s", exchange, token, timeperiod, e)
+            break
+        except PartialFetchError as e:
+            # Keep the windows that came back so a retry only fetches the gap
+            store_partial(series, exchange, token, timeperiod, e)
+            raise e.error
+        store_range(series, exchange, token, timeperiod, df, window_from, window_to)
+
+    return load_candles(exchange, token, timeperiod, start, end)
+
+
+def store_range(series, exchange, token, timeperiod, df, window_from, window_to):
+    """
+    Save fetched candles and extend the series' fetched range over
+    [window_from, window_to], which must touch the range already fetched.
+    """
+    with transaction.atomic():
+        save_candles(exchange, token, timeperiod, df)
+        series.refresh_from_db()
+        if series.fetched_from is not None:
+            window_from = min(window_from, to_market_time(series.fetched_from))
+            window_to = max(window_to, to_market_time(series.fetched_to))
+        series.fetched_from = window_from.to_pydatetime()
+        series.fetched_to = window_to.to_pydatetime()
+        series.save(update_fields=['fetched_from', 'fetched_to'])
+
+
+def store_partial(series, exchange, token, timeperiod, error):
+    """
+    Save every window of a partly failed fetch. The fetched range only grows
+    over the unbroken run of windows next to it (the newest run for a new
+    series), since it has to stay one contiguous span.
+    """
+    windows = error.windows
+    if series.fetched_from is None:
+        run = error.trailing() or error.leading()
+    elif windows[-1][1] >= to_market_time(series.fetched_from) > windows[0][0]:
+        run = error.trailing()  # head range, ends at the fetched range
+    else:
+        run = error.leading()   # tail range, starts inside it
+    with transaction.atomic():
+        save_candles(exchange, token, timeperiod, error.fetched())
+        if run is not None:
+            store_range(series, exchange, token, timeperiod, empty_frame(), *run)
@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+# Dedicated pool for blocking upstream calls (SmartAPI SDK, requests, yfinance)
+# made from async views, so they never run on the event loop thread. The pool
+# is the concurrency cap: a process has at most UPSTREAM_WORKERS upstream calls
+# in progress (counting ones waiting on the governor for a token) and every
+# other request queues here, so throughput tops out near UPSTREAM_WORKERS
+# divided by a request's upstream time. The event loop only keeps the queued
+# requests cheap, it does not run more of them at once.
+upstream_executor = ThreadPoolExecutor(max_workers=settings.UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+
+def _call(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Worker threads outlive requests, don't let them hold DB connections
+        close_old_connections()
+
+
+def in_context(fn):
+    """
+    Wrap ``fn`` so every call, from any thread, runs in a copy of the
+    caller's current context (request tracing, upstream priority). For
+    handing work to plain thread pools.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+async def run_blocking(fn, *args, timeout=None, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` on the upstream executor and await it.
+
+    Raises asyncio.TimeoutError after ``timeout`` seconds (default
+    UPSTREAM_TIMEOUT), counting time spent queued for a worker. On timeout or when the awaiting request is cancelled
+    (client went away) a call that has not started yet is dropped; one that
+    is already running finishes in the background and its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so request-scoped tracing follows the call
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(upstream_executor, functools.partial(context.run, _call, fn, args, kwargs))
+    return await asyncio.wait_for(future, timeout or settings.UPSTREAM_TIMEOUT)
@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+
+from .bars import BarBuilder
+from .metrics import metrics
+from .quotes import DEFAULT_EXCHANGE_TOKENS
+from .session import apikey, session
+
+logger = logging.getLogger(__name__)
+
+# Exchange segment codes used by the SmartAPI WebSocket
+EXCHANGE_TYPES = {
+    'NSE': SmartWebSocketV2.NSE_CM,
+    'NFO': SmartWebSocketV2.NSE_FO,
+    'BSE': SmartWebSocketV2.BSE_CM,
+    'BFO': SmartWebSocketV2.BSE_FO,
+    'MCX': SmartWebSocketV2.MCX_FO,
+    'NCDEX': SmartWebSocketV2.NCX_FO,
+    'CDS': SmartWebSocketV2.CDE_FO,
+}
+EXCHANGE_NAMES = {code: name for name, code in EXCHANGE_TYPES.items()}
+
+metrics.describe('live_bars_total', "Historical requests by whether today's bars came from the live feed.")
+
+
+def tick_to_quote(tick):
+    """
+    Convert a parsed WebSocket QUOTE packet (prices in paise) into the
+    field names the REST quote endpoint uses.
+    """
+    quote = {
+        'exchange': EXCHANGE_NAMES.get(tick['exchange_type']),
+        'symbolToken': tick['token'],
+        'ltp': tick['last_traded_price'] / 100,
+        'exchFeedTime': tick.get('exchange_timestamp'),
+    }
+    if 'closed_price' in tick:
+        close = tick['closed_price'] / 100
+        quote.update({
+            'open': tick['open_price_of_the_day'] / 100,
+            'high': tick['high_price_of_the_day'] / 100,
+            'low': tick['low_price_of_the_day'] / 100,
+            'close': close,
+            'lastTradeQty': tick['last_traded_quantity'],
+            'avgPrice': tick['average_traded_price'] / 100,
+            'tradeVolume': tick['volume_trade_for_the_day'],
+            'totBuyQuan': tick['total_buy_quantity'],
+            'totSellQuan': tick['total_sell_quantity'],
+            'netChange': round(quote['ltp'] - close, 2),
+            'percentChange': round((quote['ltp'] - close) / close * 100, 2) if close else None,
+        })
+    return quote
+
+
+class QuoteTable:
+    """
+    Latest quote per (exchange, token), updated from the feed thread and
+    read from request handlers. Every update bumps a version number so
+    readers can ask for just the quotes that changed since they last looked.
+    Async subscribers register an asyncio.Event that is set on each update.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._quotes = {}
+        self._versions = {}
+        self._version = 0
+        self._subscribers = set()
+
+    @property
+    def version(self):
+        return self._version
+
+    def update(self, quote):
+        key = (quote['exchange'], quote['symbolToken'])
+        with self._lock:
+            self._version += 1
+            self._quotes[key] = quote
+            self._versions[key] = self._version
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            loop.call_soon_threadsafe(event.set)
+
+    def get(self, exchange, token):
+        return self._quotes.get((exchange, str(token)))
+
+    def snapshot(self):
+        with self._lock:
+            return self._version, list(self._quotes.values())
+
+    def changes_since(self, version):
+        """
+        Return ``(current_version, quotes updated after version)``.
+        """
+        with self._lock:
+            changed = [self._quotes[key] for key, v in self._versions.items() if v > version]
+            return self._version, changed
+
+    def subscribe(self, loop, event):
+        with self._lock:
+            self._subscribers.add((loop, event))
+
+    def unsubscribe(self, loop, event):
+        with self._lock:
+            self._subscribers.discard((loop, event))
+
+
+class LiveFeed:
+    """
+    Long-lived SmartAPI WebSocket connection running in a daemon thread.
+    Ticks are written into ``table`` and folded into ``bars``; the connection
+    is re-opened with backoff (and a fresh session if needed) whenever it
+    drops. Instruments added with track() stay subscribed across reconnects.
+    """
+
+    def __init__(self, table, exchange_tokens, bars=None):
+        self.table = table
+        self.exchange_tokens = {exchange: list(map(str, tokens)) for exchange, tokens in exchange_tokens.items()}
+        self.bars = bars
+        self.connected = False
+        self.last_tick = None
+        self._socket = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='smartapi-feed', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._socket is not None:
+            self._socket.close_connection()
+
+    def track(self, exchange, token):
+        """
+        Add an instrument to the subscription, at once if the socket is up.
+        Returns False when it cannot be streamed (unknown exchange or
+        FEED_MAX_TOKENS reached).
+        """
+        token = str(token)
+        with self._lock:
+            tokens = self.exchange_tokens.get(exchange, ())
+            if token in tokens:
+                return True
+            if exchange not in EXCHANGE_TYPES or len(self) >= settings.FEED_MAX_TOKENS:
+                return False
+            self.exchange_tokens.setdefault(exchange, []).append(token)
+            # Before on_open has subscribed, _token_list() picks the token up
+            socket = self._socket
+        if socket is not None:
+            try:
+                socket.subscribe('algotrader', SmartWebSocketV2.QUOTE,
+                                 [{'exchangeType': EXCHANGE_TYPES[exchange], 'tokens': [token]}])
+            except Exception as e:
+                # Still in exchange_tokens, so subscribed on the next connect
+                logger.warning("Could not subscribe %s:%s: %s", exchange, token, e)
+        return True
+
+    def __len__(self):
+        return sum(len(tokens) for tokens in self.exchange_tokens.values())
+
+    def _token_list(self):
+        with self._lock:
+            return [
+                {'exchangeType': EXCHANGE_TYPES[exchange], 'tokens': list(tokens)}
+                for exchange, tokens in self.exchange_tokens.items()
+            ]
+
+    def _run(self):
+        delay, failures = 1, 0
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                auth_token, feed_token = session.tokens()
+                sws = SmartWebSocketV2(auth_token, apikey, session.client_code(), feed_token, max_retry_attempt=0)
+                # input_request_dict is a class attribute in the SDK, keep ours separate
+                sws.input_request_dict = {}
+                sws.on_open = lambda wsapp: self._on_open(sws)
+                sws.on_data = self._on_data
+                sws.on_error = lambda *args: None
+                sws.on_close = lambda wsapp: setattr(self, 'connected', False)
+                # websocket-client passes the close code and reason, which the SDK's handler doesn't take
+                sws._on_close = lambda wsapp, *args: sws.on_close(wsapp)
+                self._socket = sws
+                sws.connect()  # blocks until the socket closes
+            except Exception as e:
+                # The traceback once per outage, then a line per attempt
+                if failures:
+                    logger.warning("Market feed failed again (%d attempts): %s", failures + 1, e)
+                else:
+                    logger.exception("Market feed failed: %s", e)
+                failures += 1
+            finally:
+                self.connected = False
+                self._socket = None
+
+            if time.monotonic() - started > 60:
+                delay, failures = 1, 0  # it was up for a while, reconnect quickly
+            self._stop.wait(delay)
+            delay = min(delay * 2, settings.FEED_MAX_BACKOFF)
+
+    def _on_open(self, sws):
+        # Bars starting before now may miss ticks; the SDK delivers ticks on
+        # this same thread, so none arrive before the subscription is sent
+        if self.bars is not None:
+            self.bars.reconnected()
+        sws.subscribe('algotrader', SmartWebSocketV2.QUOTE, self._token_list())
+        self.connected = True
+
+    def _on_data(self, wsapp, tick):
+        self.last_tick = time.time()
+        quote = tick_to_quote(tick)
+        self.table.update(quote)
+        if self.bars is not None:
+            self.bars.add_quote(quote)
+
+
+quotes = QuoteTable()
+bars = BarBuilder()
+feed = LiveFeed(quotes, DEFAULT_EXCHANGE_TOKENS, bars)
@@ -0,0 +1,141 @@
+import gzip
+import json
+
+from django.http import HttpResponse
+
+from .tracing import span
+
+try:
+    import brotli
+except ImportError:  # brotli is optional (pip install -r requirements.txt), gzip is always available
+    brotli = None
+
+# ?format= value -> Content-Type
+CONTENT_TYPES = {
+    'records': 'application/json',
+    'columnar': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Accept header media types that select a format when ?format= is absent
+ACCEPT_TYPES = {
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/vnd.apache.parquet': 'parquet',
+}
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+# Level 1 is several times faster than the default 6 on candle payloads for
+# roughly 10% larger output (see benchmarks/bench_formats.py)
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 4
+
+
+class FormatError(ValueError):
+    pass
+
+
+def negotiate(request, default='records', allowed=('records', 'columnar', 'arrow')):
+    """
+    Pick the response format from ?format= (``json`` meaning the endpoint's
+    default JSON layout) or else from the Accept header.
+    """
+    requested = request.GET.get('format')
+    if requested is None:
+        accept = request.headers.get('Accept', '')
+        requested = next((fmt for media, fmt in ACCEPT_TYPES.items() if media in accept), default)
+    if requested == 'json':
+        requested = default
+    if requested not in allowed:
+        raise FormatError("Unsupported format: {}. Choose from json, {}".format(requested, ', '.join(allowed)))
+    return requested
+
+
+def to_columnar_json(df):
+    """
+    {"column": [values], ...} encoded column by column by pandas' JSON
+    writer, without building Python lists or dicts. NaN becomes null.
+    """
+    parts = [
+        '{}:{}'.format(json.dumps(str(column)), df[column].to_json(orient='values', double_precision=15))
+        for column in df.columns
+    ]
+    return '{' + ','.join(parts) + '}'
+
+
+def columnar_envelope(fields, df):
+    """
+    JSON object of ``fields`` plus ``df`` in the columnar layout under "data".
+    """
+    head = json.dumps(fields)
+    return '{}{}"data": {}}}'.format(head[:-1], ', ' if fields else '', to_columnar_json(df))
+
+
+def to_arrow(df, output='arrow'):
+    """
+    Arrow IPC stream (or Parquet) bytes for ``df``. Raises ImportError
+    without pyarrow.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if output == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(df, output):
+    """
+    Serialize ``df`` (index not included) in one of CONTENT_TYPES.
+    """
+    if output == 'records':
+        return df.to_json(orient='records', double_precision=15).encode()
+    if output == 'columnar':
+        return to_columnar_json(df).encode()
+    return to_arrow(df, output)
+
+
+def compress(body, accept_encoding):
+    """
+    Return (body, content_encoding), using brotli when the client accepts it
+    and the module is installed, else gzip, else the body unchanged.
+    """
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    accepted = {value.split(';')[0].strip() for value in accept_encoding.split(',')}
+    if brotli is not None and 'br' in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if 'gzip' in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    return body, None
+
+
+def frame_response(request, df, output):
+    """
+    HttpResponse for ``df`` in the format chosen by negotiate(), compressed
+    as the client allows. Binary formats without pyarrow get a 406.
+    """
+    try:
+        with span('encode', format=output):
+            body = encode(df, output)
+    except ImportError:
+        return HttpResponse(json.dumps({'error': 'pyarrow is required for format={}'.format(output)}),
+                            status=406, content_type='application/json')
+    return bytes_response(request, body, CONTENT_TYPES[output])
+
+
+def bytes_response(request, body, content_type):
+    with span('compress'):
+        body, encoding = compress(body, request.headers.get('Accept-Encoding', ''))
+    response = HttpResponse(body, content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept, Accept-Encoding'
+    return response
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+import yfinance as yf
+from django.conf import settings
+
+from .cache import cache
+from .executor import in_context
+from .governor import BATCH, governor, priority
+
+# Fields read from Ticker.info
+INFO_FIELDS = ['previousClose', 'trailingPE', 'debtToEquity', 'trailingEps', 'bookValue', 'dividendRate']
+
+# Rows read from the most recent column of Ticker.financials
+FINANCIAL_ROWS = ['Net Income', 'Total Revenue']
+
+# Keys of the payload built by fundamental_data(), in response order
+FUNDAMENTAL_FIELDS = ['LTP', 'PE', 'Debt to Equity', 'EPS', 'BVPS', 'Net Profit', 'DPS', 'NPM']
+
+
+def _replay(module, symbol):
+    """
+    Read a recorded Yahoo payload from YAHOO_REPLAY_URL (benchmarks/stub.py).
+    """
+    res = requests.get('{}/{}/{}'.format(settings.YAHOO_REPLAY_URL.rstrip('/'), module, symbol), timeout=30)
+    res.raise_for_status()
+    return res.json()
+
+
+def fetch_info(symbol):
+    """
+    Scrape Ticker.info and keep only the fields we serve.
+    """
+    with governor.call('yfinance.info'):
+        info = _replay('info', symbol) if settings.YAHOO_REPLAY_URL else yf.Ticker(symbol).info
+    return {field: info.get(field) for field in INFO_FIELDS}
+
+
+def fetch_financials(symbol):
+    """
+    Scrape the income statement and keep the most recent value of each row we use.
+    """
+    with governor.call('yfinance.financials'):
+        if settings.YAHOO_REPLAY_URL:
+            financials = pd.DataFrame(_replay('financials', symbol))
+        else:
+            financials = yf.Ticker(symbol).financials
+    return {
+        row: (float(financials.loc[row].iloc[0]) if row in financials.index else None)
+        for row in FINANCIAL_ROWS
+    }
+
+
+def fundamental_data(symbol):
+    """
+    Function to build the fundamentals payload for a Yahoo symbol.
+    Ticker.info and Ticker.financials are cached separately since they change
+    at very different rates; stale values are served while a refresh runs.
+    """
+    info = cache.get(
+        'fundamentals:info:{}'.format(symbol), lambda: fetch_info(symbol),
+        ttl=settings.FUNDAMENTALS_INFO_TTL, stale_ttl=settings.FUNDAMENTALS_STALE_TTL,
+    )
+    financials = cache.get(
+        'fundamentals:financials:{}'.format(symbol), lambda: fetch_financials(symbol),
+        ttl=settings.FUNDAMENTALS_FINANCIALS_TTL, stale_ttl=settings.FUNDAMENTALS_STALE_TTL,
+    )
+
+    # Extract data and store in a dictionary
+    stock_data = {}
+    stock_data['LTP'] = info.get('previousClose')
+    stock_data['PE'] = info.get('trailingPE')  # Trailing PE
+    stock_data['Debt to Equity'] = info.get('debtToEquity')
+    stock_data['EPS'] = info.get('trailingEps')  # Trailing EPS
+    stock_data['BVPS'] = info.get('bookValue')  # Book Value per share
+
+    # Net Profit (most recent)
+    net_income = financials.get('Net Income')
+    stock_data['Net Profit'] = net_income
+
+    stock_data['DPS'] = info.get('dividendRate')  # DPS based on annual dividend
+
+    # Net Profit Margin (NPM)
+    total_revenue = financials.get('Total Revenue')
+    stock_data['NPM'] = (net_income / total_revenue) * 100 if net_income and total_revenue else None
+
+    return stock_data
+
+
+def bulk_fundamental_data(symbols, workers=None):
+    """
+    Build fundamentals for many symbols on a bounded thread pool. Cached
+    symbols return immediately, the rest are fetched concurrently at batch
+    priority: they wait their turn for Yahoo tokens (the caller bounds the
+    whole call) rather than failing after GOVERNOR_MAX_WAIT, and leave room
+    for single-symbol requests.
+    Returns a DataFrame indexed by symbol (input order, de-duplicated) with
+    one column per field plus an 'error' column for symbols that failed.
+    """
+    symbols = list(dict.fromkeys(symbols))
+
+    def run(symbol):
+        try:
+            return dict(fundamental_data(symbol), error=None)
+        except Exception as e:
+            return {'error': "{}: {}".format(type(e).__name__, e)}
+
+    workers = min(workers or settings.FUNDAMENTALS_BULK_WORKERS, max(len(symbols), 1))
+    with priority(BATCH), ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(in_context(run), symbols))
+
+    df = pd.DataFrame(rows, index=pd.Index(symbols, name='symbol'), columns=FUNDAMENTAL_FIELDS + ['error'])
+    return df
@@ -0,0 +1,310 @@
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import metrics
+from .tracing import upstream
+
+logger = logging.getLogger(__name__)
+
+# Priority classes: interactive requests go first, batch work (backfills,
+# pre-warm) only keeps its reserved share while interactive callers wait
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# Priority of upstream calls made from the current context
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+# Upstream endpoint (as named in tracing.upstream) -> shared bucket
+BUCKETS = {
+    'generateSession': 'login',
+    'generateToken': 'token',
+    'getCandleData': 'candles',
+    'quote': 'quote',
+    'yfinance.info': 'yahoo',
+    'yfinance.financials': 'yahoo',
+}
+
+# Replies that mean the broker is throttling us
+THROTTLE_MARKERS = ('exceeding access rate', '429', 'too many requests')
+
+# Angel One error codes for failures on the broker's side ("Error not
+# specified", "Internal Error"); other coded replies refuse the request itself
+SERVER_ERROR_CODES = ('AB2000', 'AB2001')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    reserve REAL NOT NULL,
+    updated REAL NOT NULL,
+    contended_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS breakers (
+    name TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL DEFAULT 0,
+    open_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+metrics.describe('governor_wait_seconds', 'Time upstream calls waited for a rate limit token, by bucket and priority.')
+metrics.describe('governor_throttled_total', 'Throttling replies from upstream, by bucket.')
+metrics.describe('governor_rejected_total', 'Calls refused without going upstream, by bucket and reason.')
+metrics.describe('circuit_opened_total', 'Times a circuit breaker opened, by bucket.')
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised instead of calling upstream when the bucket's circuit breaker is
+    open or no token became available within GOVERNOR_MAX_WAIT.
+    """
+
+    def __init__(self, bucket, reason, retry_after):
+        super().__init__("{} unavailable ({}), retry in {:.0f}s".format(bucket, reason, retry_after))
+        self.bucket = bucket
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class UpstreamReplyError(Exception):
+    """
+    Base for errors raised on a reply without status, keeping its error code
+    so the governor can tell a refused request from a failing broker.
+    """
+
+    def __init__(self, message, errorcode=''):
+        super().__init__(message)
+        self.errorcode = errorcode
+
+
+def limits():
+    """
+    {bucket: (rate per second, burst)} from settings, following Angel One's
+    published per-second and per-minute limits.
+    """
+    return {
+        'login': (settings.LOGIN_RATE_PER_SECOND, settings.LOGIN_RATE_PER_SECOND),
+        'token': (settings.LOGIN_RATE_PER_SECOND, settings.LOGIN_RATE_PER_SECOND),
+        'candles': (min(settings.CANDLE_RATE_PER_SECOND, settings.CANDLE_RATE_PER_MINUTE / 60),
+                    settings.CANDLE_RATE_PER_SECOND),
+        'quote': (min(settings.QUOTE_RATE_PER_SECOND, settings.QUOTE_RATE_PER_MINUTE / 60),
+                  settings.QUOTE_RATE_PER_SECOND),
+        'yahoo': (settings.YAHOO_RATE_PER_SECOND, settings.YAHOO_RATE_PER_SECOND),
+    }
+
+
+def is_throttle(error):
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+def is_rejection(error):
+    """
+    True when upstream answered and refused this particular request (a 4xx,
+    or a coded reply that is neither a throttle nor a server error, such as
+    an invalid symbol token). The broker is healthy, so it is no breaker
+    failure, and asking again gets the same answer.
+    """
+    if is_throttle(error):
+        return False
+    if isinstance(error, UpstreamReplyError):
+        return bool(error.errorcode) and error.errorcode not in SERVER_ERROR_CODES
+    # requests.HTTPError carries the response, SmartApi exceptions the status code
+    status = getattr(getattr(error, 'response', None), 'status_code', getattr(error, 'code', None))
+    return isinstance(status, int) and 400 <= status < 500
+
+
+@contextmanager
+def priority(level):
+    """
+    Run the block's upstream calls (including those it hands to worker
+    threads through executor.in_context) at ``level``.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Governor:
+    """
+    Token buckets and circuit breakers kept in a small SQLite database so
+    every worker process on the host shares the same limits. Each decision
+    is one short IMMEDIATE transaction.
+
+    Batch calls may always use a bucket's spare capacity; while an
+    interactive caller is waiting they only get the GOVERNOR_BATCH_RESERVE
+    share of the rate. After GOVERNOR_FAILURES consecutive failures the
+    bucket's breaker opens for GOVERNOR_COOLDOWN seconds, then lets a single
+    probe call through.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self):
+        # One connection per thread, and never one inherited across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            path = self.path or settings.GOVERNOR_DB or settings.BASE_DIR / 'governor.sqlite3'
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _take(self, bucket, level):
+        """
+        Try to take a token: returns 0 when taken, else the seconds to wait.
+        Raises UpstreamUnavailable while the breaker is open.
+        """
+        rate, burst = limits()[bucket]
+        share = settings.GOVERNOR_BATCH_RESERVE
+        with self._transaction() as db:
+            now = time.time()
+            row = db.execute('SELECT open_until FROM breakers WHERE name = ?', (bucket,)).fetchone()
+            if row and row[0] > now:
+                raise UpstreamUnavailable(bucket, 'circuit open', row[0] - now)
+            if row and row[0]:
+                # Cool-down over: this call is the probe, the others keep waiting
+                db.execute('UPDATE breakers SET open_until = ? WHERE name = ?',
+                           (now + settings.GOVERNOR_COOLDOWN, bucket))
+
+            row = db.execute('SELECT tokens, reserve, updated, contended_until FROM buckets WHERE name = ?',
+                             (bucket,)).fetchone()
+            tokens, reserve, updated, contended_until = row or (burst, max(burst * share, 1), now, 0.0)
+            elapsed = max(now - updated, 0.0)
+            tokens = min(burst, tokens + elapsed * rate)
+            reserve = min(max(burst * share, 1), reserve + elapsed * rate * share)
+
+            wait = 0.0
+            if level == INTERACTIVE:
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+                    contended_until = max(contended_until, now + wait + settings.GOVERNOR_POLL)
+            else:
+                contended = now < contended_until
+                if tokens < 1:
+                    wait = (1 - tokens) / rate
+                elif contended and reserve < 1:
+                    wait = (1 - reserve) / (rate * share) if share else contended_until - now
+                else:
+                    tokens -= 1
+                    if contended:
+                        reserve -= 1
+
+            db.execute('INSERT OR REPLACE INTO buckets (name, tokens, reserve, updated, contended_until) '
+                       'VALUES (?, ?, ?, ?, ?)', (bucket, tokens, reserve, now, contended_until))
+        return wait
+
+    def acquire(self, bucket, level=None):
+        """
+        Block until a token for ``bucket`` is available. Interactive callers
+        give up with UpstreamUnavailable after GOVERNOR_MAX_WAIT seconds.
+        """
+        level = level or _priority.get()
+        started = time.monotonic()
+        while True:
+            try:
+                wait = self._take(bucket, level)
+            except UpstreamUnavailable as e:
+                metrics.inc('governor_rejected_total', bucket=bucket, reason='circuit_open')
+                if level == INTERACTIVE:
+                    raise
+                # Batch work waits the breaker out instead of failing
+                time.sleep(min(e.retry_after, settings.GOVERNOR_COOLDOWN))
+                continue
+            waited = time.monotonic() - started
+            if not wait:
+                metrics.observe('governor_wait_seconds', waited, bucket=bucket, priority=level)
+                return
+            if level == INTERACTIVE and waited + wait > settings.GOVERNOR_MAX_WAIT:
+                metrics.inc('governor_rejected_total', bucket=bucket, reason='rate_limited')
+                raise UpstreamUnavailable(bucket, 'rate limited', wait)
+            time.sleep(min(wait, settings.GOVERNOR_POLL))
+
+    def record(self, bucket, ok, throttled=False):
+        """
+        Feed the outcome of a call to the bucket's breaker. A throttling
+        reply also empties the bucket for a second so every process backs off.
+        """
+        if ok:
+            # Single statement, no need for an explicit transaction
+            self._db().execute('UPDATE breakers SET failures = 0, open_until = 0 '
+                               'WHERE name = ? AND (failures > 0 OR open_until > 0)', (bucket,))
+            return
+        now = time.time()
+        rate, burst = limits()[bucket]
+        with self._transaction() as db:
+            db.execute('INSERT OR IGNORE INTO breakers (name) VALUES (?)', (bucket,))
+            failures, open_until = db.execute('SELECT failures + 1, open_until FROM breakers WHERE name = ?',
+                                              (bucket,)).fetchone()
+            # A failed probe re-opens at once
+            if failures >= settings.GOVERNOR_FAILURES or open_until:
+                open_until = now + settings.GOVERNOR_COOLDOWN
+                metrics.inc('circuit_opened_total', bucket=bucket)
+                logger.warning("Circuit for %s open for %ss after %d failure(s)", bucket,
+                               settings.GOVERNOR_COOLDOWN, failures)
+            db.execute('UPDATE breakers SET failures = ?, open_until = ? WHERE name = ?',
+                       (failures, open_until, bucket))
+            if throttled:
+                metrics.inc('governor_throttled_total', bucket=bucket)
+                db.execute('UPDATE buckets SET tokens = MIN(tokens, 0) - ?, updated = ? WHERE name = ?',
+                           (rate, now, bucket))
+
+    @contextmanager
+    def call(self, endpoint):
+        """
+        Wrap one upstream call: wait for a token, trace it, and report the
+        outcome to the breaker. Transport errors, 5xx and throttling count as
+        failures; a rejected request counts as a healthy reply.
+        """
+        bucket = BUCKETS[endpoint]
+        self.acquire(bucket)
+        try:
+            with upstream(endpoint):
+                yield
+        except Exception as e:
+            if is_rejection(e):
+                self.record(bucket, ok=True)
+            else:
+                self.record(bucket, ok=False, throttled=is_throttle(e))
+            raise
+        self.record(bucket, ok=True)
+
+    def state(self):
+        """
+        {bucket: (tokens, failures, seconds until the breaker closes)} for
+        the buckets used so far, read at scrape time.
+        """
+        now = time.time()
+        db = self._db()
+        tokens = dict(db.execute('SELECT name, tokens FROM buckets').fetchall())
+        breakers = {name: (failures, max(open_until - now, 0.0))
+                    for name, failures, open_until in db.execute('SELECT name, failures, open_until FROM breakers')}
+        return {name: (tokens.get(name), *breakers.get(name, (0, 0.0))) for name in set(tokens) | set(breakers)}
+
+
+governor = Governor()
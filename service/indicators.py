@@ -0,0 +1,198 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+def _ewm(values, alpha, seed=None):
+    """
+    Recursive exponential average y[t] = (1 - alpha) * y[t-1] + alpha * x[t].
+    With ``seed`` (the previous y) the recursion continues from it, which is
+    what lets EMA-style indicators be extended without recomputing history.
+    """
+    if seed is None or pd.isna(seed):
+        return values.ewm(alpha=alpha, adjust=False).mean()
+    seeded = pd.concat([pd.Series([seed]), values], ignore_index=True)
+    out = seeded.ewm(alpha=alpha, adjust=False).mean().iloc[1:]
+    out.index = values.index
+    return out
+
+
+def _state(state, column):
+    return None if state is None else state[column]
+
+
+# Each indicator takes the candles for the rows to compute, preceded by
+# ``warmup`` extra rows of raw history, plus the previous output row
+# (``state``, or None for a full computation). It returns one row per
+# candle after the warmup. Columns starting with '_' carry recursion state
+# and are not served.
+
+def sma(df, warmup, state, period=20):
+    return pd.DataFrame({'sma': df['Close'].rolling(period).mean()}).iloc[warmup:]
+
+
+def ema(df, warmup, state, period=20):
+    close = df['Close'].iloc[warmup:]
+    return pd.DataFrame({'ema': _ewm(close, 2 / (period + 1), _state(state, 'ema'))})
+
+
+def rsi(df, warmup, state, period=14):
+    delta = df['Close'].diff().iloc[warmup:]
+    avg_gain = _ewm(delta.clip(lower=0), 1 / period, _state(state, '_avg_gain'))
+    avg_loss = _ewm(-delta.clip(upper=0), 1 / period, _state(state, '_avg_loss'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100 - 100 / (1 + avg_gain / avg_loss)
+    value = value.where(avg_loss != 0, 100.0).where(avg_gain.notna())
+    return pd.DataFrame({'rsi': value, '_avg_gain': avg_gain, '_avg_loss': avg_loss})
+
+
+def macd(df, warmup, state, fast=12, slow=26, signal=9):
+    close = df['Close'].iloc[warmup:]
+    ema_fast = _ewm(close, 2 / (fast + 1), _state(state, '_ema_fast'))
+    ema_slow = _ewm(close, 2 / (slow + 1), _state(state, '_ema_slow'))
+    line = ema_fast - ema_slow
+    signal_line = _ewm(line, 2 / (signal + 1), _state(state, 'signal'))
+    return pd.DataFrame({
+        'macd': line, 'signal': signal_line, 'histogram': line - signal_line,
+        '_ema_fast': ema_fast, '_ema_slow': ema_slow,
+    })
+
+
+def bollinger(df, warmup, state, period=20, width=2.0):
+    rolling = df['Close'].rolling(period)
+    middle, std = rolling.mean(), rolling.std(ddof=0)
+    return pd.DataFrame({
+        'middle': middle, 'upper': middle + width * std, 'lower': middle - width * std,
+    }).iloc[warmup:]
+
+
+def atr(df, warmup, state, period=14):
+    previous_close = df['Close'].shift(1)
+    true_range = pd.concat([
+        df['High'] - df['Low'],
+        (df['High'] - previous_close).abs(),
+        (df['Low'] - previous_close).abs(),
+    ], axis=1).max(axis=1).iloc[warmup:]
+    return pd.DataFrame({'atr': _ewm(true_range, 1 / period, _state(state, 'atr'))})
+
+
+def vwap(df, warmup, state):
+    df = df.iloc[warmup:]
+    typical = (df['High'] + df['Low'] + df['Close']) / 3
+    sessions = df.index.normalize()
+    cum_pv = (typical * df['Volume']).groupby(sessions).cumsum()
+    cum_volume = df['Volume'].astype('float64').groupby(sessions).cumsum()
+    if state is not None and len(df) and state['_session'] == sessions[0].value // 10**9:
+        # The first rows continue the session the previous row belonged to
+        same = sessions == sessions[0]
+        cum_pv[same] += state['_cum_pv']
+        cum_volume[same] += state['_cum_volume']
+    return pd.DataFrame({
+        'vwap': cum_pv / cum_volume.replace(0, np.nan),
+        '_cum_pv': cum_pv, '_cum_volume': cum_volume, '_session': sessions.asi8 // 10**9,
+    }, index=df.index)
+
+
+# name -> (function, default params, raw rows needed before the first computed row)
+INDICATORS = {
+    'sma': (sma, {'period': 20}, lambda p: p['period'] - 1),
+    'ema': (ema, {'period': 20}, lambda p: 0),
+    'rsi': (rsi, {'period': 14}, lambda p: 1),
+    'macd': (macd, {'fast': 12, 'slow': 26, 'signal': 9}, lambda p: 0),
+    'bollinger': (bollinger, {'period': 20, 'width': 2.0}, lambda p: p['period'] - 1),
+    'atr': (atr, {'period': 14}, lambda p: 1),
+    'vwap': (vwap, {}, lambda p: 0),
+}
+
+
+def parse_params(name, query):
+    """
+    Read an indicator's parameters from a QueryDict/dict, falling back to
+    defaults and casting to the default's type. Raises ValueError on bad input.
+    """
+    if name not in INDICATORS:
+        raise ValueError("Unknown indicator: {}. Choose from {}".format(name, ', '.join(INDICATORS)))
+    params = {}
+    for key, default in INDICATORS[name][1].items():
+        value = type(default)(query.get(key, default))
+        if value <= 0:
+            raise ValueError("{} must be positive".format(key))
+        params[key] = value
+    return params
+
+
+def compute(name, candles, params, state=None, start=0):
+    """
+    Compute indicator rows for candles[start:], continuing from ``state``
+    (the output row for candles[start - 1]) when given.
+    """
+    fn, _, lookback = INDICATORS[name]
+    first = max(start - lookback(params), 0)
+    return fn(candles.iloc[first:], start - first, state, **params)
+
+
+class IndicatorMemo:
+    """
+    LRU memo of computed indicator frames per (exchange, token, interval,
+    indicator, params). When the candle series grows only the rows from the
+    last memoized candle onwards (it may have still been forming) are
+    recomputed, seeded from the row before it.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or settings.INDICATOR_MEMO_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'partial': 0, 'full': 0}
+
+    def get(self, key, name, candles, params):
+        with self._lock:
+            memo = self._entries.get(key)
+            if memo is not None:
+                self._entries.move_to_end(key)
+
+        if len(candles) < 2:
+            return compute(name, candles, params)
+
+        if (memo is None or len(memo) < 2 or memo.index[0] > candles.index[0]
+                or memo.index[-1] not in candles.index):
+            result = compute(name, candles, params)
+            outcome = 'full'
+        else:
+            k = candles.index.get_loc(memo.index[-1])
+            if k == len(candles) - 1 and self._same_last_candle(memo, candles):
+                result = memo
+                outcome = 'hits'
+            else:
+                tail = compute(name, candles, params, state=memo.iloc[-2], start=k)
+                result = pd.concat([memo.iloc[:-1], tail])
+                outcome = 'partial'
+            result = result.loc[candles.index[0]:]
+
+        with self._lock:
+            self.counters[outcome] += 1
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        result.attrs['last_candle'] = tuple(candles.iloc[-1])
+        return result
+
+    @staticmethod
+    def _same_last_candle(memo, candles):
+        return memo.attrs.get('last_candle') == tuple(candles.iloc[-1])
+
+
+memo = IndicatorMemo()
+
+
+def indicator_frame(exchange, token, interval, name, candles, params):
+    """
+    Indicator values for every candle (internal columns dropped), memoized.
+    """
+    key = (exchange, str(token), interval, name, tuple(sorted(params.items())))
+    result = memo.get(key, name, candles, params)
+    return result[[column for column in result.columns if not column.startswith('_')]]
@@ -0,0 +1,282 @@
+import bisect
+import codecs
+import json
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from itertools import islice
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Instrument
+
+# Bumped by every refresh so other processes know to reload their index
+VERSION_KEY = 'instruments:version'
+
+# NSE series traded in the cash segment; "RELIANCE-EQ" -> "RELIANCE.NS"
+NSE_EQUITY_SERIES = {'EQ', 'BE', 'BZ', 'SM', 'ST'}
+
+# Characters that may follow an array element
+_DELIMITERS = frozenset(' \t\r\n,]')
+
+Row = namedtuple('Row', ['exchange', 'token', 'symbol', 'name', 'instrumenttype', 'yahoo'])
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array from an iterable of text
+    chunks, decoding one element at a time with JSONDecoder.raw_decode so the
+    whole document is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, started = '', 0, False
+    chunks = iter(chunks)
+    exhausted = False
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and not started:
+            if buffer[pos] != '[':
+                raise ValueError("Expected a JSON array")
+            started, pos = True, pos + 1
+            continue
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # Only complete once a delimiter follows: "12" may be the start
+                # of "12.5" and "1" of "1e3" in the next chunk
+                complete = exhausted or end < len(buffer) and buffer[end] in _DELIMITERS
+            except json.JSONDecodeError:
+                complete = False  # element cut at the end of the buffer
+            if complete:
+                yield item
+                pos = end
+                continue
+        if exhausted:
+            if started:
+                raise ValueError("Truncated or invalid JSON array")
+            return
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def download_chunks(url, chunk_size=1 << 20):
+    """
+    Stream a UTF-8 document as text chunks.
+    """
+    response = requests.get(url, stream=True, timeout=settings.INSTRUMENTS_TIMEOUT)
+    response.raise_for_status()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for data in response.iter_content(chunk_size=chunk_size):
+        yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
+
+
+def file_chunks(path, chunk_size=1 << 20):
+    with open(path, encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def yahoo_ticker(exchange, symbol, instrumenttype=''):
+    """
+    Yahoo Finance ticker for a cash-segment equity, '' for anything else.
+    """
+    if instrumenttype:
+        return ''
+    if exchange == 'NSE':
+        base, _, series = symbol.rpartition('-')
+        return '{}.NS'.format(base) if base and series in NSE_EQUITY_SERIES else ''
+    if exchange == 'BSE':
+        return '{}.BO'.format(symbol)
+    return ''
+
+
+def _number(value, cast, default=0):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def to_instrument(record):
+    exchange = record.get('exch_seg', '')
+    symbol = record.get('symbol', '')
+    instrumenttype = record.get('instrumenttype', '')
+    return Instrument(
+        exchange=exchange,
+        token=str(record.get('token', '')),
+        symbol=symbol,
+        name=record.get('name', ''),
+        instrumenttype=instrumenttype,
+        expiry=record.get('expiry', ''),
+        strike=_number(record.get('strike'), float),
+        lotsize=_number(record.get('lotsize'), int, 1),
+        tick_size=_number(record.get('tick_size'), float),
+        yahoo=yahoo_ticker(exchange, symbol, instrumenttype),
+    )
+
+
+def load_instruments(records, exchanges=None, batch_size=5000):
+    """
+    Replace the Instrument table with ``records`` (scrip master dicts),
+    keeping only ``exchanges`` if given. Rows are staged in a temporary
+    file as they stream in, so the table is only locked for the delete and
+    re-insert, not for the download. Returns the number of rows stored.
+    """
+    fields = [field.attname for field in Instrument._meta.concrete_fields if not field.primary_key]
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as staged:
+        for record in records:
+            if exchanges and record.get('exch_seg') not in exchanges:
+                continue
+            instrument = to_instrument(record)
+            staged.write(json.dumps([getattr(instrument, name) for name in fields]) + '\n')
+        staged.seek(0)
+
+        count = 0
+        with transaction.atomic():
+            Instrument.objects.all().delete()
+            while True:
+                batch = [Instrument(**dict(zip(fields, json.loads(line)))) for line in islice(staged, batch_size)]
+                if not batch:
+                    break
+                Instrument.objects.bulk_create(batch, ignore_conflicts=True)
+                count += len(batch)
+    cache.set(VERSION_KEY, time.time(), None)
+    return count
+
+
+class InstrumentIndex:
+    """
+    In-memory lookup over the Instrument table: dicts for token, symbol and
+    Yahoo ticker, and a sorted key list for prefix search. Built lazily and
+    rebuilt when another process has refreshed the table (checked at most
+    every INSTRUMENTS_CHECK_SECONDS).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._by_token = {}
+        self._by_symbol = {}
+        self._by_yahoo = {}
+        self._keys = []
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < settings.INSTRUMENTS_CHECK_SECONDS:
+            return
+        with self._lock:
+            if self._version is not None and now - self._checked_at < settings.INSTRUMENTS_CHECK_SECONDS:
+                return
+            version = cache.get(VERSION_KEY, 0)
+            if version != self._version:
+                self._build()
+                self._version = version
+            self._checked_at = now
+
+    def _build(self):
+        by_token, by_symbol, by_yahoo, keys = {}, {}, {}, []
+        fields = ('exchange', 'token', 'symbol', 'name', 'instrumenttype', 'yahoo')
+        for values in Instrument.objects.values_list(*fields).iterator(chunk_size=10000):
+            row = Row(*values)
+            by_token[(row.exchange, row.token)] = row
+            by_symbol.setdefault((row.exchange, row.symbol.upper()), row)
+            if row.yahoo:
+                by_yahoo[row.yahoo.upper()] = row
+                # Bare "RELIANCE" for "RELIANCE-EQ"
+                by_symbol.setdefault((row.exchange, row.yahoo.rsplit('.', 1)[0].upper()), row)
+            keys.append((row.symbol.upper(), row.exchange, row.token))
+            if row.name and row.name.upper() != row.symbol.upper():
+                keys.append((row.name.upper(), row.exchange, row.token))
+        keys.sort()
+        self._by_token, self._by_symbol, self._by_yahoo, self._keys = by_token, by_symbol, by_yahoo, keys
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._by_token)
+
+    def by_token(self, exchange, token):
+        self._ensure_loaded()
+        return self._by_token.get((exchange, str(token)))
+
+    def by_symbol(self, exchange, symbol):
+        self._ensure_loaded()
+        return self._by_symbol.get((exchange, symbol.upper()))
+
+    def by_yahoo(self, ticker):
+        self._ensure_loaded()
+        return self._by_yahoo.get(ticker.upper())
+
+    def resolve(self, value, exchange='NSE'):
+        """
+        Find an instrument from a token ("1333"), a trading symbol
+        ("HDFCBANK-EQ" or "HDFCBANK"), an "EXCHANGE:SYMBOL" pair or a Yahoo
+        ticker ("HDFCBANK.NS"). Returns a Row or None.
+        """
+        value = str(value).strip()
+        if ':' in value:
+            exchange, value = value.split(':', 1)
+            exchange = exchange.upper()
+        if value.isdigit():
+            row = self.by_token(exchange, value)
+            if row is not None:
+                return row
+        return self.by_symbol(exchange, value) or self.by_yahoo(value)
+
+    def search(self, prefix, limit=20, exchange=None):
+        """
+        Instruments whose symbol or name starts with ``prefix``, in symbol order.
+        """
+        self._ensure_loaded()
+        prefix = prefix.strip().upper()
+        if not prefix:
+            return []
+        results, seen = [], set()
+        i = bisect.bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(results) < limit:
+            key, row_exchange, token = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            i += 1
+            if (exchange and row_exchange != exchange) or (row_exchange, token) in seen:
+                continue
+            seen.add((row_exchange, token))
+            results.append(self._by_token[(row_exchange, token)])
+        return results
+
+
+index = InstrumentIndex()
+
+
+def refresh_instruments(source=None, exchanges=None):
+    """
+    Stream the scrip master from ``source`` (a URL or a local path, default
+    INSTRUMENTS_URL) into the Instrument table and reload the index.
+    """
+    source = source or settings.INSTRUMENTS_URL
+    if exchanges is None:
+        exchanges = settings.INSTRUMENTS_EXCHANGES
+    chunks = download_chunks(source) if source.startswith(('http://', 'https://')) else file_chunks(source)
+    count = load_instruments(iter_json_array(chunks), exchanges=set(exchanges) if exchanges else None)
+    index.invalidate()
+    return count
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from service.backfill import MAX_DAYS_PER_REQUEST, plan_windows
+from service.candles import DATE_FORMAT, get_candles, market_now, to_market_time
+from service.executor import in_context
+from service.governor import BATCH, priority
+from service.session import session
+
+
+class Command(BaseCommand):
+    help = "Backfill the candle store for one or more symbol tokens over a long date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tokens', nargs='+', help="Symbol tokens, e.g. 1333 2885")
+        parser.add_argument('--exchange', default='NSE')
+        parser.add_argument('--interval', default='ONE_MINUTE', choices=sorted(MAX_DAYS_PER_REQUEST))
+        parser.add_argument('--days', type=int, default=365, help="Lookback from --to (ignored with --from)")
+        parser.add_argument('--from', dest='from_date', help="Start, \"%%Y-%%m-%%d %%H:%%M\"")
+        parser.add_argument('--to', dest='to_date', help="End, \"%%Y-%%m-%%d %%H:%%M\" (default now)")
+        parser.add_argument('--jobs', type=int, default=2, help="Tokens backfilled at the same time")
+
+    def handle(self, *args, **options):
+        try:
+            end = to_market_time(options['to_date']) if options['to_date'] else market_now()
+            start = to_market_time(options['from_date']) if options['from_date'] else end - timedelta(days=options['days'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        exchange, interval = options['exchange'], options['interval']
+        windows = len(plan_windows(start, end, interval))
+        self.stdout.write("Backfilling {} token(s) {} from {} to {} ({} window(s) each)".format(
+            len(options['tokens']), interval, start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT), windows))
+
+        # Backfills yield to interactive requests for upstream capacity
+        with priority(BATCH):
+            failed = self.backfill(options['tokens'], exchange, start, end, interval, options['jobs'])
+        if failed:
+            raise CommandError("{} token(s) failed".format(failed))
+
+    def backfill(self, tokens, exchange, start, end, interval, jobs):
+        # Log in once up front so the workers share the session
+        session.tokens()
+
+        def run(token):
+            try:
+                return len(get_candles(exchange, token, start, end, interval))
+            finally:
+                close_old_connections()
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            futures = {pool.submit(in_context(run), token): token for token in tokens}
+            for future in as_completed(futures):
+                token = futures[future]
+                try:
+                    self.stdout.write(self.style.SUCCESS("{}:{} {} candles".format(exchange, token, future.result())))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write("{}:{} failed: {}".format(exchange, token, e))
+        return failed
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service.backtest import STRATEGIES, bars_per_year, sweep, to_arrays
+from service.candles import get_candles, load_candles, market_now, to_market_time
+
+
+class Command(BaseCommand):
+    help = ("Backtest a strategy over stored candles, sweeping a parameter grid across symbols in parallel. "
+            "Example: backtest sma_crossover 1333 2885 --grid fast=5,10,20 --grid slow=50,100")
+
+    def add_arguments(self, parser):
+        parser.add_argument('strategy', choices=sorted(STRATEGIES))
+        parser.add_argument('tokens', nargs='+', help="Symbol tokens, e.g. 1333 2885")
+        parser.add_argument('--exchange', default='NSE')
+        parser.add_argument('--interval', default='ONE_DAY')
+        parser.add_argument('--days', type=int, default=900, help="Lookback from --to (ignored with --from)")
+        parser.add_argument('--from', dest='from_date', help="Start, \"%%Y-%%m-%%d %%H:%%M\"")
+        parser.add_argument('--to', dest='to_date', help="End, \"%%Y-%%m-%%d %%H:%%M\" (default now)")
+        parser.add_argument('--grid', action='append', default=[], metavar='PARAM=V1,V2',
+                            help="Parameter values to sweep; repeat for each parameter")
+        parser.add_argument('--slippage-bps', type=float, default=5.0)
+        parser.add_argument('--brokerage-bps', type=float, default=3.0)
+        parser.add_argument('--capital', type=float, default=100000.0)
+        parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+        parser.add_argument('--fetch', action='store_true', help="Fetch missing candles from upstream first")
+        parser.add_argument('--top', type=int, default=20, help="Rows to print, best Sharpe first")
+
+    def handle(self, *args, **options):
+        try:
+            end = to_market_time(options['to_date']) if options['to_date'] else market_now()
+            start = to_market_time(options['from_date']) if options['from_date'] else end - timedelta(days=options['days'])
+            grid = {}
+            for item in options['grid']:
+                key, _, values = item.partition('=')
+                if not values:
+                    raise ValueError("--grid expects PARAM=V1,V2, got {}".format(item))
+                grid[key.strip()] = [value.strip() for value in values.split(',')]
+        except ValueError as e:
+            raise CommandError(e)
+
+        exchange, interval = options['exchange'], options['interval']
+        series = {}
+        for token in options['tokens']:
+            if options['fetch']:
+                candles = get_candles(exchange, token, start, end, interval)
+            else:
+                candles = load_candles(exchange, token, interval, start, end)
+            if candles.empty:
+                self.stderr.write("{}:{} has no stored {} candles, skipping (use --fetch)".format(exchange, token, interval))
+                continue
+            series[token] = to_arrays(candles)
+
+        if not series:
+            raise CommandError("No candles to backtest")
+
+        try:
+            results = sweep(
+                series, options['strategy'], grid, workers=options['workers'],
+                slippage_bps=options['slippage_bps'], brokerage_bps=options['brokerage_bps'],
+                capital=options['capital'], periods_per_year=bars_per_year(interval),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        results = results.sort_values('sharpe', ascending=False, na_position='last')
+        self.stdout.write(results.head(options['top']).to_string(index=False))
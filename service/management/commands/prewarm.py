@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from service.candles import market_now
+from service.prewarm import next_run, prewarm
+
+
+class Command(BaseCommand):
+    help = ("Pre-warm the candle store, precomputed /historical-data/ bars and fundamentals for the default "
+            "quote list and every watchlist. Run after the close, from cron or with --daemon.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('tokens', nargs='*', help="Symbol tokens (default: every tracked instrument)")
+        parser.add_argument('--exchange', default='NSE', help="Exchange of the given tokens")
+        parser.add_argument('--skip-fundamentals', action='store_true')
+        parser.add_argument('--jobs', type=int, default=None, help="Instruments pre-warmed at once (default PREWARM_WORKERS)")
+        parser.add_argument('--daemon', action='store_true', help="Stay running and pre-warm every weekday at --at")
+        parser.add_argument('--at', default=None, help="Run time for --daemon, HH:MM exchange local time (default PREWARM_AT)")
+
+    def handle(self, *args, **options):
+        exchange_tokens = {options['exchange']: options['tokens']} if options['tokens'] else None
+        try:
+            next_run(at=options['at'])
+        except ValueError as e:
+            raise CommandError("Invalid --at: {}".format(e))
+
+        if not options['daemon']:
+            failed = self.run_once(exchange_tokens, options)
+            if failed:
+                raise CommandError("{} task(s) failed".format(failed))
+            return
+
+        while True:
+            run_at = next_run(at=options['at'])
+            self.stdout.write("Next pre-warm at {}".format(run_at.strftime('%Y-%m-%d %H:%M %Z')))
+            time.sleep(max((run_at - market_now()).total_seconds(), 0))
+            self.run_once(exchange_tokens, options)
+
+    def run_once(self, exchange_tokens, options):
+        started = time.monotonic()
+        try:
+            failed = prewarm(exchange_tokens, fundamentals=not options['skip_fundamentals'], workers=options['jobs'])
+        except Exception as e:
+            self.stderr.write("Pre-warm failed: {}".format(e))
+            return 1
+        for name, error in failed:
+            self.stderr.write("{} failed: {}".format(name, error))
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style("Pre-warm finished in {:.1f}s, {} task(s) failed (bars kept for {}s)".format(
+            time.monotonic() - started, len(failed), settings.PREWARM_BARS_TTL)))
+        return len(failed)
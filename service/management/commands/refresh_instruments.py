@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from service.instruments import refresh_instruments
+
+
+class Command(BaseCommand):
+    help = ("Reload the instrument master from Angel One's scrip master (streamed, not loaded whole). "
+            "Run once a day before the market opens, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None, help="URL or local file (default INSTRUMENTS_URL)")
+        parser.add_argument('--exchanges', default=None,
+                            help="Comma separated exch_seg values to keep, 'all' for every row "
+                                 "(default INSTRUMENTS_EXCHANGES)")
+
+    def handle(self, *args, **options):
+        exchanges = None
+        if options['exchanges']:
+            exchanges = [] if options['exchanges'] == 'all' else options['exchanges'].split(',')
+
+        started = time.monotonic()
+        try:
+            count = refresh_instruments(options['source'], exchanges)
+        except (OSError, ValueError) as e:
+            raise CommandError("Instrument refresh failed: {}".format(e))
+
+        self.stdout.write(self.style.SUCCESS("Loaded {:,} instruments from {} in {:.1f}s".format(
+            count, options['source'] or settings.INSTRUMENTS_URL, time.monotonic() - started)))
@@ -0,0 +1,145 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+# Quantiles reported for every timing summary
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Observations kept per timing series for the quantiles (a sliding window)
+WINDOW = 2048
+
+
+class Summary:
+    """
+    Latency summary: total count and sum since start, quantiles over the
+    last WINDOW observations.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def quantiles(self):
+        if not self._recent:
+            return {q: float('nan') for q in QUANTILES}
+        values = np.quantile(np.fromiter(self._recent, dtype='float64'), QUANTILES)
+        return dict(zip(QUANTILES, values))
+
+
+class Registry:
+    """
+    In-process counters and timing summaries keyed by (name, labels),
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = Summary()
+            summary.observe(seconds)
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self, name, **labels):
+        return self._summaries.get((name, tuple(sorted(labels.items()))))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def render(self, gauges=()):
+        """
+        Prometheus text format. ``gauges`` is an iterable of
+        (name, labels dict, value) read at scrape time, in any order: each
+        name's samples are written together under one TYPE line, as the
+        format requires.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+            summaries = [(key, s.count, s.sum, s.quantiles()) for key, s in summaries]
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append('# HELP {} {}'.format(name, self._help[name]))
+                lines.append('# TYPE {} {}'.format(name, kind))
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append('{}{} {}'.format(name, _labels(labels), _number(value)))
+        for (name, labels), count, total, quantiles in summaries:
+            header(name, 'summary')
+            for q, value in quantiles.items():
+                lines.append('{}{} {}'.format(name, _labels(labels + (('quantile', str(q)),)), _number(value)))
+            lines.append('{}_sum{} {}'.format(name, _labels(labels), _number(total)))
+            lines.append('{}_count{} {}'.format(name, _labels(labels), count))
+        grouped = {}
+        for name, labels, value in gauges:
+            grouped.setdefault(name, []).append((labels, value))
+        for name, samples in grouped.items():
+            header(name, 'gauge')
+            for labels, value in samples:
+                lines.append('{}{} {}'.format(name, _labels(tuple(sorted(labels.items()))), _number(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+metrics = Registry()
+metrics.describe('http_request_duration_seconds', 'Request latency by view, method and status.')
+metrics.describe('http_requests_total', 'Requests by view, method and status.')
+metrics.describe('span_duration_seconds', 'Time spent in a named processing stage or upstream call.')
+metrics.describe('span_errors_total', 'Stages that raised, by span.')
+metrics.describe('upstream_calls_total', 'Calls to SmartAPI and Yahoo by endpoint and outcome.')
+metrics.describe('errors_total', 'Errors logged by the service, by source.')
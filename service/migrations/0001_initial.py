@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange', models.CharField(max_length=10)),
+                ('symboltoken', models.CharField(max_length=20)),
+                ('interval', models.CharField(max_length=20)),
+                ('timestamp', models.BigIntegerField()),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('volume', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exchange', 'symboltoken', 'interval', 'timestamp'), name='unique_candle')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CandleSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange', models.CharField(max_length=10)),
+                ('symboltoken', models.CharField(max_length=20)),
+                ('interval', models.CharField(max_length=20)),
+                ('fetched_from', models.DateTimeField(null=True)),
+                ('fetched_to', models.DateTimeField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exchange', 'symboltoken', 'interval'), name='unique_candle_series')],
+            },
+        ),
+    ]
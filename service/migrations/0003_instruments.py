@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_watchlists'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange', models.CharField(max_length=10)),
+                ('token', models.CharField(max_length=20)),
+                ('symbol', models.CharField(max_length=64)),
+                ('name', models.CharField(blank=True, max_length=128)),
+                ('instrumenttype', models.CharField(blank=True, max_length=20)),
+                ('expiry', models.CharField(blank=True, max_length=20)),
+                ('strike', models.FloatField(default=0)),
+                ('lotsize', models.IntegerField(default=1)),
+                ('tick_size', models.FloatField(default=0)),
+                ('yahoo', models.CharField(blank=True, max_length=64)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exchange', 'symbol'], name='instrument_symbol_idx'), models.Index(fields=['yahoo'], name='instrument_yahoo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('exchange', 'token'), name='unique_instrument')],
+            },
+        ),
+    ]
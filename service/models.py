@@ -1,3 +1,118 @@
 from django.db import models
 
-# Create your models here.
+
+class Candle(models.Model):
+    """
+    One OHLCV candle as returned by getCandleData. The timestamp is stored as
+    epoch seconds so range scans stay on the unique index.
+    """
+    exchange = models.CharField(max_length=10)
+    symboltoken = models.CharField(max_length=20)
+    interval = models.CharField(max_length=20)
+    timestamp = models.BigIntegerField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['exchange', 'symboltoken', 'interval', 'timestamp'],
+                name='unique_candle',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.exchange}:{self.symboltoken} {self.interval} @ {self.timestamp}"
+
+
+class CandleSeries(models.Model):
+    """
+    The date range that has already been fetched from upstream for one
+    (exchange, symboltoken, interval) series. Days without candles
+    (holidays, suspensions) inside this range are known to be empty.
+    """
+    exchange = models.CharField(max_length=10)
+    symboltoken = models.CharField(max_length=20)
+    interval = models.CharField(max_length=20)
+    fetched_from = models.DateTimeField(null=True)
+    fetched_to = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['exchange', 'symboltoken', 'interval'],
+                name='unique_candle_series',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.exchange}:{self.symboltoken} {self.interval}"
+
+
+class Watchlist(models.Model):
+    """
+    A named list of instruments served by /market-data/?watchlist=<name>.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    def exchange_tokens(self):
+        """
+        Tokens grouped by exchange, in the shape the quote API expects.
+        """
+        exchange_tokens = {}
+        for exchange, symboltoken in self.items.values_list('exchange', 'symboltoken'):
+            exchange_tokens.setdefault(exchange, []).append(symboltoken)
+        return exchange_tokens
+
+
+class WatchlistItem(models.Model):
+    watchlist = models.ForeignKey(Watchlist, related_name='items', on_delete=models.CASCADE)
+    exchange = models.CharField(max_length=10, default='NSE')
+    symboltoken = models.CharField(max_length=20)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['watchlist', 'exchange', 'symboltoken'],
+                name='unique_watchlist_item',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.exchange}:{self.symboltoken}"
+
+
+class Instrument(models.Model):
+    """
+    One row of Angel One's scrip master. ``yahoo`` is the matching Yahoo
+    Finance ticker for cash-segment equities, blank otherwise.
+    """
+    exchange = models.CharField(max_length=10)
+    token = models.CharField(max_length=20)
+    symbol = models.CharField(max_length=64)
+    name = models.CharField(max_length=128, blank=True)
+    instrumenttype = models.CharField(max_length=20, blank=True)
+    expiry = models.CharField(max_length=20, blank=True)
+    strike = models.FloatField(default=0)
+    lotsize = models.IntegerField(default=1)
+    tick_size = models.FloatField(default=0)
+    yahoo = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exchange', 'token'], name='unique_instrument'),
+        ]
+        indexes = [
+            models.Index(fields=['exchange', 'symbol'], name='instrument_symbol_idx'),
+            models.Index(fields=['yahoo'], name='instrument_yahoo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.exchange}:{self.symbol} ({self.token})"
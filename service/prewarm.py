@@ -0,0 +1,137 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .aggregation import resample_candles
+from .cache import cache
+from .candles import MARKET_TZ, get_candles, market_now, to_market_time
+from .executor import in_context
+from .fundamentals import fetch_financials, fetch_info
+from .governor import BATCH, priority
+from .instruments import index as instruments
+from .metrics import metrics
+from .models import Watchlist
+from .quotes import DEFAULT_EXCHANGE_TOKENS
+from .session import session
+
+logger = logging.getLogger(__name__)
+
+# Lookback served by /historical-data/ and precomputed here
+HISTORY_DAYS = 900
+
+metrics.describe('precomputed_bars_total', 'Historical requests by whether precomputed bars were found.')
+metrics.describe('prewarm_task_seconds', 'Time per pre-warm task (candles or fundamentals).')
+
+
+def bars_key(exchange, token, timeperiod, period):
+    return 'bars:{}:{}:{}:{}'.format(exchange, token, timeperiod, period)
+
+
+def precomputed_bars(exchange, token, timeperiod, period):
+    """
+    Bars stored by the last pre-warm run for this series and period, or None.
+    """
+    bars = cache.backend.get(bars_key(exchange, str(token), timeperiod, period))
+    metrics.inc('precomputed_bars_total', outcome='hit' if bars is not None else 'miss')
+    return bars
+
+
+def tracked_instruments():
+    """
+    {exchange: [tokens]} for the default quote list plus every watchlist.
+    """
+    tracked = {exchange: dict.fromkeys(tokens) for exchange, tokens in DEFAULT_EXCHANGE_TOKENS.items()}
+    for watchlist in Watchlist.objects.all():
+        for exchange, tokens in watchlist.exchange_tokens().items():
+            tracked.setdefault(exchange, {}).update(dict.fromkeys(tokens))
+    return {exchange: list(tokens) for exchange, tokens in tracked.items()}
+
+
+def prewarm_candles(exchange, token, timeperiods=None, periods=None, end=None):
+    """
+    Bring the candle store up to ``end`` for one instrument and store its
+    resampled bars for each period in the cache. Returns the number of bars
+    stored.
+    """
+    end = to_market_time(end) if end is not None else market_now()
+    start = end - timedelta(days=HISTORY_DAYS)
+    stored = 0
+    for timeperiod in timeperiods or settings.PREWARM_INTERVALS:
+        df = get_candles(exchange, token, start, end, timeperiod)
+        if df.empty:
+            continue
+        for period in periods or settings.PREWARM_PERIODS:
+            cache.backend.set(bars_key(exchange, str(token), timeperiod, period),
+                              resample_candles(df, period), settings.PREWARM_BARS_TTL)
+            stored += 1
+    return stored
+
+
+def prewarm_fundamentals(symbol):
+    """
+    Re-scrape Ticker.info for a Yahoo symbol; Ticker.financials is only
+    fetched when its cache entry has expired.
+    """
+    cache.refresh('fundamentals:info:{}'.format(symbol), lambda: fetch_info(symbol),
+                  ttl=settings.FUNDAMENTALS_INFO_TTL, stale_ttl=settings.FUNDAMENTALS_STALE_TTL)
+    cache.get('fundamentals:financials:{}'.format(symbol), lambda: fetch_financials(symbol),
+              ttl=settings.FUNDAMENTALS_FINANCIALS_TTL, stale_ttl=settings.FUNDAMENTALS_STALE_TTL)
+
+
+def prewarm(exchange_tokens=None, fundamentals=True, workers=None, end=None):
+    """
+    Pre-warm candles, precomputed bars and fundamentals for every tracked
+    instrument (or ``exchange_tokens``) on a bounded thread pool. Upstream
+    calls go through the governor at batch priority, so daytime requests
+    are served first. Returns a list of (task, error) for the tasks that
+    failed.
+    """
+    with priority(BATCH):
+        return _prewarm(exchange_tokens or tracked_instruments(), fundamentals, workers, end or market_now())
+
+
+def _prewarm(exchange_tokens, fundamentals, workers, end):
+    # Log in once up front so the workers share the session
+    session.tokens()
+
+    tasks = []
+    for exchange, tokens in exchange_tokens.items():
+        for token in tokens:
+            tasks.append(('candles {}:{}'.format(exchange, token), prewarm_candles, (exchange, token, None, None, end)))
+            row = instruments.by_token(exchange, token) if fundamentals else None
+            if row is not None and row.yahoo:
+                tasks.append(('fundamentals {}'.format(row.yahoo), prewarm_fundamentals, (row.yahoo,)))
+
+    def run(task):
+        name, fn, args = task
+        started = time.perf_counter()
+        try:
+            fn(*args)
+            return None
+        except Exception as e:
+            logger.warning("Pre-warm %s failed: %s", name, e)
+            return name, e
+        finally:
+            metrics.observe('prewarm_task_seconds', time.perf_counter() - started, task=name.split()[0])
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=workers or settings.PREWARM_WORKERS) as pool:
+        failed = [result for result in pool.map(in_context(run), tasks) if result is not None]
+    logger.info("Pre-warmed %d task(s), %d failed", len(tasks), len(failed))
+    return failed
+
+
+def next_run(now=None, at=None):
+    """
+    Next weekday at ``at`` ("HH:MM", exchange local time) after ``now``.
+    """
+    now = to_market_time(now) if now is not None else market_now()
+    hour, minute = map(int, (at or settings.PREWARM_AT).split(':'))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    while run <= now or run.weekday() >= 5:
+        run = (run + timedelta(days=1)).replace(hour=hour, minute=minute)
+    return run.tz_convert(MARKET_TZ)
@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .executor import in_context
+from .governor import UpstreamReplyError, UpstreamUnavailable, governor
+from .session import apikey
+
+QUOTE_URL = settings.SMARTAPI_ROOT.rstrip('/') + "/rest/secure/angelbroking/market/v1/quote/"
+
+# The quote endpoint accepts at most this many tokens per request
+QUOTE_BATCH_SIZE = 50
+
+DEFAULT_EXCHANGE_TOKENS = {
+    "NSE": ['526', '694', '3351', '10940', '2885', '3506', '7229', '910', '1363', '1232', '11630', '20374', '157', '16675', '236', '5258', '10999', '25', '467', '1594', '3499', '11536', '2031', '16669', '2475', '547', '3045', '3787', '881', '13538', '4306', '5900', '1660', '17818', '317', '21808', '3456', '11723', '17963', '1394', '3432', '11532', '15083', '1922', '11483', '1348', '4963', '1333', '10604', '14977']
+}
+
+# Keep-alive connections to the quote host, shared by all batches and requests
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=settings.QUOTE_WORKERS))
+
+# Last quote fetched per (exchange, token), served for batches the governor
+# refuses while the quote circuit is open
+last_quotes = {}
+
+
+class QuoteFetchError(UpstreamReplyError):
+    """
+    Raised when the quote endpoint replies without status, including its
+    HTTP 200 rate limit reply, so the governor sees the outcome.
+    """
+
+    def __init__(self, response):
+        super().__init__(response.get('message') or 'empty response', response.get('errorcode') or '')
+        self.response = response
+
+
+def split_batches(exchange_tokens, size=QUOTE_BATCH_SIZE):
+    """
+    Split {exchange: [tokens]} into request payloads of at most ``size``
+    tokens each, possibly mixing exchanges in one batch.
+    """
+    batches = []
+    batch, count = {}, 0
+    for exchange, tokens in exchange_tokens.items():
+        for token in tokens:
+            if count == size:
+                batches.append(batch)
+                batch, count = {}, 0
+            batch.setdefault(exchange, []).append(str(token))
+            count += 1
+    if count:
+        batches.append(batch)
+    return batches
+
+
+def _post_batch(auth_token, mode, batch):
+    headers = {
+        'X-PrivateKey': apikey,
+        'Accept': 'application/json',
+        'X-SourceID': 'WEB',
+        'X-UserType': 'USER',
+        'Authorization': auth_token,
+        'Content-Type': 'application/json'
+    }
+    with governor.call('quote'):
+        res = http.post(QUOTE_URL, json={"mode": mode, "exchangeTokens": batch}, headers=headers,
+                        timeout=settings.QUOTE_TIMEOUT)
+        res.raise_for_status()
+        response = res.json()
+        if not response or not response.get('status'):
+            raise QuoteFetchError(response or {})
+    return response
+
+
+def fetch_quotes(auth_token, exchange_tokens, mode="FULL"):
+    """
+    Fetch quotes for any number of tokens. The tokens are split into batches
+    the API accepts, sent concurrently over the pooled session, and merged
+    back into a single response of the same shape as one quote call.
+    Batches that fail are reported under 'unfetched'; batches refused by the
+    governor are served from the last quotes seen and listed under 'stale',
+    and their tokens never seen before are reported under 'unfetched'.
+    """
+    batches = split_batches(exchange_tokens)
+    if not batches:
+        return {'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': {'fetched': [], 'unfetched': [], 'stale': []}}
+
+    def run(batch):
+        try:
+            return batch, _post_batch(auth_token, mode, batch), None
+        except QuoteFetchError as e:
+            # Reported with the reply's own message and error code
+            return batch, e.response, None
+        except Exception as e:
+            return batch, None, e
+
+    with ThreadPoolExecutor(max_workers=min(settings.QUOTE_WORKERS, len(batches))) as pool:
+        results = list(pool.map(in_context(run), batches))
+
+    fetched, unfetched, stale, errors = [], [], [], []
+    for batch, response, error in results:
+        if response and response.get('status') and response.get('data'):
+            fresh = response['data'].get('fetched') or []
+            last_quotes.update(((q.get('exchange'), q.get('symbolToken')), q) for q in fresh)
+            fetched.extend(fresh)
+            unfetched.extend(response['data'].get('unfetched') or [])
+            continue
+        message = str(error) if error else (response or {}).get('message')
+        known = []
+        if isinstance(error, UpstreamUnavailable):
+            missing = {}
+            for exchange, tokens in batch.items():
+                for token in tokens:
+                    quote = last_quotes.get((exchange, token))
+                    if quote is None:
+                        missing.setdefault(exchange, []).append(token)
+                    else:
+                        known.append(quote)
+            fetched.extend(known)
+            stale.extend({'exchange': q['exchange'], 'symbolToken': q['symbolToken']} for q in known)
+        if known:
+            batch = missing  # served in part from last_quotes, the rest is unfetched
+        else:
+            errors.append(message)
+        unfetched.extend(
+            {'exchange': exchange, 'symbolToken': token, 'message': message, 'errorCode': (response or {}).get('errorcode', '')}
+            for exchange, tokens in batch.items() for token in tokens
+        )
+
+    if len(errors) == len(batches):
+        refused = next((error for _, _, error in results if isinstance(error, UpstreamUnavailable)), None)
+        if refused is not None:
+            raise refused
+        raise RuntimeError("All quote batches failed: {}".format(errors[0]))
+
+    return {
+        'status': True,
+        'message': 'SUCCESS',
+        'errorcode': '',
+        'data': {'fetched': fetched, 'unfetched': unfetched, 'stale': stale},
+    }
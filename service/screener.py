@@ -0,0 +1,240 @@
+import ast
+import operator
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .candles import MARKET_TZ
+from .feed import feed, quotes
+from .models import Candle
+
+# Snapshot column <- field of the FULL quote response
+QUOTE_FIELDS = {
+    'ltp': 'ltp',
+    'open': 'open',
+    'high': 'high',
+    'low': 'low',
+    'close': 'close',
+    'change': 'percentChange',
+    'net_change': 'netChange',
+    'volume': 'tradeVolume',
+    'avg_price': 'avgPrice',
+    'buy_qty': 'totBuyQuan',
+    'sell_qty': 'totSellQuan',
+}
+
+# Rolling statistics from stored daily candles
+STAT_FIELDS = ['avg_volume_20', 'sma_20', 'sma_50', 'sma_200', 'high_52w', 'low_52w']
+
+FIELDS = list(QUOTE_FIELDS) + STAT_FIELDS
+
+_COMPARE = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_ARITHMETIC = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+
+class FilterError(ValueError):
+    """
+    Raised for filter expressions that do not parse or use unknown fields.
+    """
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expression):
+    """
+    Compile a filter such as "change > 2 and volume > avg_volume_20" into a
+    function of {column: array} returning a boolean mask. Only field names,
+    numbers, + - * /, comparisons, and/or/not and parentheses are allowed;
+    and/or/not take conditions and everything else takes numbers.
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise FilterError("Invalid filter: {}".format(e.msg))
+
+    def build(node, boolean):
+        # ``boolean``: whether the node must give a mask (and/or/not operands
+        # and the whole filter) or a number (comparison and arithmetic operands)
+        condition = (isinstance(node, (ast.BoolOp, ast.Compare))
+                     or isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not))
+        if condition != boolean:
+            message = "Expected a comparison: {}" if boolean else "Expected a number, not a condition: {}"
+            raise FilterError(message.format(ast.unparse(node)))
+
+        if isinstance(node, ast.BoolOp):
+            parts = [build(value, True) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda cols: combine.reduce([part(cols) for part in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            inner = build(node.operand, True)
+            return lambda cols: ~inner(cols)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            inner = build(node.operand, False)
+            return lambda cols: -inner(cols)
+        if isinstance(node, ast.Compare):
+            operands = [build(node.left, False)] + [build(c, False) for c in node.comparators]
+            ops = [_COMPARE[type(op)] for op in node.ops if type(op) in _COMPARE]
+            if len(ops) != len(node.ops):
+                raise FilterError("Unsupported comparison")
+
+            def compare(cols):
+                values = [operand(cols) for operand in operands]
+                with np.errstate(invalid='ignore'):
+                    return np.logical_and.reduce([op(a, b) for op, a, b in zip(ops, values, values[1:])])
+            return compare
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            left, right, op = build(node.left, False), build(node.right, False), _ARITHMETIC[type(node.op)]
+
+            def arithmetic(cols):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return op(left(cols), right(cols))
+            return arithmetic
+        if isinstance(node, ast.Name):
+            if node.id not in FIELDS:
+                raise FilterError("Unknown field: {}. Fields: {}".format(node.id, ', '.join(FIELDS)))
+            return lambda cols: cols[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda cols: value
+        raise FilterError("Unsupported expression: {}".format(ast.unparse(node)))
+
+    fn = build(tree.body, True)
+    return lambda cols: np.broadcast_to(fn(cols), len(cols['ltp'])).astype(bool)
+
+def daily_stats(keys):
+    """
+    Rolling statistics from the stored ONE_DAY candles for every (exchange,
+    token) in ``keys``, computed in one query and one grouped pass.
+    """
+    since = pd.Timestamp.now(tz=MARKET_TZ) - pd.Timedelta(days=400)
+    tokens = {token for _, token in keys}
+    rows = Candle.objects.filter(
+        interval='ONE_DAY', symboltoken__in=tokens, timestamp__gte=int(since.timestamp()),
+    ).order_by('exchange', 'symboltoken', 'timestamp').values_list(
+        'exchange', 'symboltoken', 'high', 'low', 'close', 'volume',
+    )
+    df = pd.DataFrame(list(rows), columns=['exchange', 'token', 'high', 'low', 'close', 'volume'])
+    if df.empty:
+        return pd.DataFrame(index=pd.MultiIndex.from_tuples(keys), columns=STAT_FIELDS, dtype='float64')
+
+    grouped = df.groupby(['exchange', 'token'], sort=False)
+    stats = pd.DataFrame({
+        'avg_volume_20': grouped['volume'].rolling(20).mean().droplevel(-1),
+        'sma_20': grouped['close'].rolling(20).mean().droplevel(-1),
+        'sma_50': grouped['close'].rolling(50).mean().droplevel(-1),
+        'sma_200': grouped['close'].rolling(200).mean().droplevel(-1),
+        'high_52w': grouped['high'].rolling(252, min_periods=1).max().droplevel(-1),
+        'low_52w': grouped['low'].rolling(252, min_periods=1).min().droplevel(-1),
+    })
+    last = stats.groupby(level=[0, 1], sort=False).tail(1)
+    return last.reindex(pd.MultiIndex.from_tuples(keys))
+
+
+class Snapshot:
+    """
+    Columnar view of one universe: ``keys`` is the list of (exchange, token)
+    and ``columns`` maps each field to a float64 array in the same order.
+    """
+
+    def __init__(self, keys, symbols, columns, quotes_at, stats_at):
+        self.keys = keys
+        self.symbols = symbols
+        self.columns = columns
+        self.quotes_at = quotes_at
+        self.stats_at = stats_at
+
+    def __len__(self):
+        return len(self.keys)
+
+    def screen(self, expression, sort=None, descending=True, limit=None):
+        """
+        Rows matching ``expression`` as a DataFrame, optionally sorted and truncated.
+        """
+        mask = compile_filter(expression)(self.columns) if expression else np.ones(len(self), dtype=bool)
+        index = np.flatnonzero(mask)
+        if sort:
+            if sort not in self.columns:
+                raise FilterError("Unknown sort field: {}".format(sort))
+            values = self.columns[sort][index]
+            values = np.where(np.isnan(values), np.inf, -values if descending else values)
+            index = index[np.argsort(values, kind='stable')]
+        if limit:
+            index = index[:limit]
+        result = pd.DataFrame({field: self.columns[field][index] for field in FIELDS})
+        result.insert(0, 'symbol', [self.symbols[i] for i in index])
+        result.insert(0, 'token', [self.keys[i][1] for i in index])
+        result.insert(0, 'exchange', [self.keys[i][0] for i in index])
+        return result
+
+
+class Screener:
+    """
+    Keeps one Snapshot per universe (watchlist). Quotes are refreshed with
+    ``fetch`` (the market_data() path) when older than SCREENER_QUOTE_TTL,
+    overlaid with any fresher ticks from the live feed table, and rolling
+    stats are reloaded from the candle store when older than
+    SCREENER_STATS_TTL. One thread rebuilds a snapshot while concurrent
+    screens of the same universe wait for it.
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, universe, exchange_tokens, fetch):
+        with self._lock:
+            lock = self._locks.setdefault(universe, threading.Lock())
+        with lock:
+            current = self._snapshots.get(universe)
+            now = time.time()
+            if current is not None and now - current.quotes_at < settings.SCREENER_QUOTE_TTL:
+                return current
+            self._snapshots[universe] = self._build(exchange_tokens, fetch, current, now)
+            return self._snapshots[universe]
+
+    def _build(self, exchange_tokens, fetch, previous, now):
+        keys = [(exchange, str(token)) for exchange, tokens in exchange_tokens.items() for token in tokens]
+        response = fetch(exchange_tokens)
+        if not response:
+            raise RuntimeError("Quote fetch failed")
+        by_key = {(q['exchange'], str(q['symbolToken'])): q for q in response['data'].get('fetched') or []}
+        for key in keys if feed.connected else ():
+            live = quotes.get(*key)
+            if live is not None:
+                by_key[key] = dict(by_key.get(key, {}), **live)
+
+        columns = {}
+        for field, source in QUOTE_FIELDS.items():
+            columns[field] = np.array([_number(by_key.get(key, {}).get(source)) for key in keys], dtype='float64')
+        symbols = [by_key.get(key, {}).get('tradingSymbol') for key in keys]
+
+        if previous is not None and previous.keys == keys and now - previous.stats_at < settings.SCREENER_STATS_TTL:
+            stats_at = previous.stats_at
+            for field in STAT_FIELDS:
+                columns[field] = previous.columns[field]
+        else:
+            stats_at = now
+            stats = daily_stats(keys)
+            for field in STAT_FIELDS:
+                columns[field] = stats[field].to_numpy(dtype='float64')
+
+        return Snapshot(keys, symbols, columns, now, stats_at)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+screener = Screener()
@@ -0,0 +1,226 @@
+import base64
+import json
+import logging
+import threading
+import time
+
+import pyotp
+from django.conf import settings
+from SmartApi import SmartConnect
+
+from .governor import governor
+
+logger = logging.getLogger(__name__)
+
+
+class SessionError(Exception):
+    """
+    Raised when the broker refuses to open or renew a session.
+    """
+
+
+def _jwt_expiry(jwt_token):
+    """
+    Read the ``exp`` claim out of a JWT without verifying it.
+    Returns None if the token does not carry one.
+    """
+    try:
+        payload = jwt_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _strip_bearer(jwt_token):
+    if jwt_token and jwt_token.startswith('Bearer '):
+        return jwt_token[len('Bearer '):]
+    return jwt_token
+
+
+class SessionManager:
+    """
+    Process-wide holder for the SmartConnect session.
+
+    The jwt/feed tokens are cached until shortly before they expire. Once a
+    token enters the refresh window it is renewed with the refresh token
+    (falling back to a full TOTP login), and only one thread does the
+    renewal while the others keep using the still valid token; if the
+    renewal fails, that token keeps being served until it expires. When
+    there is no valid token at all, concurrent callers wait (at most
+    SMARTAPI_LOGIN_WAIT seconds) on the single in-flight login instead of
+    starting their own.
+    """
+
+    def __init__(self, client, ttl=None, refresh_margin=None):
+        self.client = client
+        self.ttl = ttl if ttl is not None else settings.SMARTAPI_SESSION_TTL
+        self.refresh_margin = refresh_margin if refresh_margin is not None else settings.SMARTAPI_REFRESH_MARGIN
+
+        self._lock = threading.Lock()          # guards the cached tokens and counters
+        self._renew_lock = threading.Lock()    # held by the one thread talking to the broker
+
+        self._jwt_token = None
+        self._feed_token = None
+        self._refresh_token = None
+        self._client_code = None
+        self._expires_at = 0.0
+
+        self._counters = {
+            'hits': 0,
+            'waits': 0,
+            'logins': 0,
+            'refreshes': 0,
+            'failures': 0,
+            'invalidations': 0,
+            'fallbacks': 0,
+        }
+        self._login_seconds_total = 0.0
+        self._login_seconds_max = 0.0
+        self._login_seconds_last = None
+
+        client.setSessionExpiryHook(self.invalidate)
+
+    def tokens(self):
+        """
+        Return ``(auth_token, feed_token)`` for the current session,
+        logging in or refreshing first if needed.
+        """
+        now = time.time()
+        with self._lock:
+            valid = self._jwt_token is not None and now < self._expires_at
+            fresh = valid and now < self._expires_at - self.refresh_margin
+            if fresh:
+                self._counters['hits'] += 1
+                return self._current()
+
+        if valid:
+            # Refresh ahead of expiry: whoever gets the lock renews, everybody
+            # else keeps serving the token that is still good.
+            if not self._renew_lock.acquire(blocking=False):
+                with self._lock:
+                    self._counters['hits'] += 1
+                    return self._current()
+        elif not self._renew_lock.acquire(timeout=settings.SMARTAPI_LOGIN_WAIT):
+            raise SessionError("Timed out waiting for the SmartAPI login")
+
+        try:
+            with self._lock:
+                now = time.time()
+                if self._jwt_token is not None and now < self._expires_at - self.refresh_margin:
+                    # Another thread finished the login while we were waiting
+                    self._counters['waits'] += 1
+                    return self._current()
+                refresh_token = self._refresh_token if now < self._expires_at else None
+
+            try:
+                if refresh_token:
+                    try:
+                        self._refresh(refresh_token)
+                    except Exception:
+                        with self._lock:
+                            self._counters['failures'] += 1
+                        self._login()
+                else:
+                    self._login()
+            except Exception as e:
+                with self._lock:
+                    if self._jwt_token is None or time.time() >= self._expires_at:
+                        raise
+                    # Still inside the refresh margin: the next caller tries again
+                    self._counters['fallbacks'] += 1
+                    logger.warning("Session renewal failed, serving the current token for %.0fs more: %s",
+                                   self._expires_at - time.time(), e)
+
+            with self._lock:
+                return self._current()
+        finally:
+            self._renew_lock.release()
+
+    def client_code(self):
+        """
+        Client code of the logged in account, logging in if needed.
+        """
+        self.tokens()
+        return self._client_code
+
+    def invalidate(self):
+        """
+        Drop the cached session so the next caller logs in again.
+        Registered as the SmartConnect session expiry hook.
+        """
+        with self._lock:
+            self._jwt_token = None
+            self._expires_at = 0.0
+            self._counters['invalidations'] += 1
+
+    def stats(self):
+        """
+        Snapshot of the cache/refresh/login counters.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            logins = stats['logins']
+            stats['login_seconds_total'] = self._login_seconds_total
+            stats['login_seconds_max'] = self._login_seconds_max
+            stats['login_seconds_last'] = self._login_seconds_last
+            stats['login_seconds_avg'] = self._login_seconds_total / logins if logins else None
+            stats['expires_in'] = max(self._expires_at - time.time(), 0.0) if self._jwt_token else None
+            return stats
+
+    def _current(self):
+        return 'Bearer ' + self._jwt_token, self._feed_token
+
+    def _login(self):
+        started = time.perf_counter()
+        try:
+            with governor.call('generateSession'):
+                data = self.client.generateSession(
+                    settings.USERNAME, settings.PWD, pyotp.TOTP(settings.TOKEN).now()
+                )
+                if not data or not data.get('status') or not data.get('data'):
+                    raise SessionError("Login failed: {}".format((data or {}).get('message')))
+        except Exception:
+            with self._lock:
+                self._counters['failures'] += 1
+            raise
+        elapsed = time.perf_counter() - started
+
+        session = data['data']
+        with self._lock:
+            self._store(session['jwtToken'], session['feedToken'], session['refreshToken'])
+            self._client_code = session.get('clientcode', self._client_code)
+            self._counters['logins'] += 1
+            self._login_seconds_total += elapsed
+            self._login_seconds_max = max(self._login_seconds_max, elapsed)
+            self._login_seconds_last = elapsed
+
+    def _refresh(self, refresh_token):
+        with governor.call('generateToken'):
+            data = self.client.generateToken(refresh_token)
+            if not data or not data.get('status') or not data.get('data'):
+                raise SessionError("Token refresh failed: {}".format((data or {}).get('message')))
+
+        session = data['data']
+        with self._lock:
+            self._store(session['jwtToken'], session['feedToken'],
+                        session.get('refreshToken') or refresh_token)
+            self._counters['refreshes'] += 1
+
+    def _store(self, jwt_token, feed_token, refresh_token):
+        # Called with self._lock held
+        jwt_token = _strip_bearer(jwt_token)
+        self.client.setAccessToken(jwt_token)
+        self.client.setFeedToken(feed_token)
+        self.client.setRefreshToken(refresh_token)
+        self._jwt_token = jwt_token
+        self._feed_token = feed_token
+        self._refresh_token = refresh_token
+        self._expires_at = _jwt_expiry(jwt_token) or time.time() + self.ttl
+
+
+# Create an object of SmartConnect
+apikey = settings.API_KEY
+obj = SmartConnect(api_key=apikey, root=settings.SMARTAPI_ROOT)
+
+session = SessionManager(obj)
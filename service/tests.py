@@ -1,3 +1,968 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import requests
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import formats, quotes
+from .aggregation import add_previous_close, resample_candles, summarize
+from .backfill import plan_windows
+from .backtest import get_strategy, simulate, sweep
+from .bars import BarBuilder
+from .cache import SWRCache
+from .candles import MARKET_TZ, CandleFetchError, get_candles, load_candles, missing_ranges
+from .feed import LiveFeed, QuoteTable, tick_to_quote
+from .fundamentals import FUNDAMENTAL_FIELDS, bulk_fundamental_data
+from .governor import BATCH, INTERACTIVE, Governor, UpstreamUnavailable, is_rejection
+from .indicators import INDICATORS, IndicatorMemo, compute, parse_params
+from .instruments import InstrumentIndex, iter_json_array, load_instruments
+from .metrics import Registry
+from .models import CandleSeries, Instrument
+from .prewarm import next_run
+from .screener import FilterError, compile_filter
+from .session import SessionError, SessionManager
+
+
+def market_time(value):
+    return pd.Timestamp(value, tz=MARKET_TZ)
+
+
+class FakeSmartConnect:
+    """
+    Stands in for SmartConnect: hands out numbered jwt tokens (without an
+    exp claim, so the manager's ttl applies) or fails on request.
+    """
+
+    def __init__(self):
+        self.calls = {'generateSession': 0, 'generateToken': 0}
+        self.failing = set()
+
+    def reply(self, endpoint):
+        self.calls[endpoint] += 1
+        if endpoint in self.failing:
+            return {'status': False, 'message': 'Something went wrong', 'data': None}
+        return {'status': True, 'data': {'jwtToken': 'Bearer jwt{}'.format(sum(self.calls.values())),
+                                         'feedToken': 'feed', 'refreshToken': 'refresh'}}
+
+    def generateSession(self, username, password, totp):
+        return self.reply('generateSession')
+
+    def generateToken(self, refresh_token):
+        return self.reply('generateToken')
+
+    def setSessionExpiryHook(self, hook):
+        pass
+
+    def setAccessToken(self, token):
+        pass
+
+    setFeedToken = setRefreshToken = setAccessToken
+
+
+class GovernedTestCase(SimpleTestCase):
+    """
+    Runs upstream calls through a throwaway governor database.
+    """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.governor = Governor(os.path.join(tmp.name, 'governor.sqlite3'))
+
+
+class NextRunTests(SimpleTestCase):
+    def test_later_today(self):
+        with mock.patch('service.prewarm.market_now', return_value=market_time('2026-10-14 09:30')):
+            self.assertEqual(next_run(at='15:45'), market_time('2026-10-14 15:45'))
+
+    def test_after_the_run_time_is_tomorrow(self):
+        with mock.patch('service.prewarm.market_now', return_value=market_time('2026-10-14 16:00')):
+            self.assertEqual(next_run(at='15:45'), market_time('2026-10-15 15:45'))
+
+    def test_skips_the_weekend(self):
+        # Friday evening -> Monday
+        with mock.patch('service.prewarm.market_now', return_value=market_time('2026-10-16 16:00')):
+            self.assertEqual(next_run(at='15:45'), market_time('2026-10-19 15:45'))
+
+    def test_aware_utc_now(self):
+        # 10:00 UTC is 15:30 IST, so the run is 15 minutes away, not a day
+        run = next_run(now=pd.Timestamp('2026-10-14 10:00', tz='UTC'), at='15:45')
+        self.assertEqual(run, market_time('2026-10-14 15:45'))
+        self.assertEqual(str(run.tz), MARKET_TZ)
+
+
+def quote_reply(batch, failing=()):
+    """
+    Mocked quote endpoint reply for ``batch``, leaving ``failing`` tokens unfetched.
+    """
+    reply = mock.Mock(status_code=200)
+    reply.json.return_value = {'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': {
+        'fetched': [{'exchange': exchange, 'symbolToken': token, 'ltp': float(token)}
+                    for exchange, tokens in batch.items() for token in tokens if token not in failing],
+        'unfetched': [{'exchange': exchange, 'symbolToken': token, 'message': 'Invalid token', 'errorCode': 'AB4002'}
+                      for exchange, tokens in batch.items() for token in tokens if token in failing],
+    }}
+    return reply
+
+
+class QuoteBatchTests(GovernedTestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (mock.patch.object(quotes, 'governor', self.governor),
+                        mock.patch.dict(quotes.last_quotes, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_split_batches(self):
+        batches = quotes.split_batches({'NSE': [1, 2, 3], 'BSE': ['4', '5']}, size=2)
+        self.assertEqual(batches, [{'NSE': ['1', '2']}, {'NSE': ['3'], 'BSE': ['4']}, {'BSE': ['5']}])
+        self.assertEqual(quotes.split_batches({'NSE': []}), [])
+
+    def test_batches_merge_into_one_response(self):
+        tokens = [str(token) for token in range(1, 121)]
+
+        def post(url, json, **kwargs):
+            return quote_reply(json['exchangeTokens'], failing={'7'})
+
+        with mock.patch.object(quotes.http, 'post', side_effect=post) as posted:
+            response = quotes.fetch_quotes('Bearer x', {'NSE': tokens})
+        self.assertEqual(posted.call_count, 3)
+        data = response['data']
+        self.assertEqual(len(data['fetched']), 119)
+        self.assertEqual({q['symbolToken'] for q in data['fetched']}, set(tokens) - {'7'})
+        self.assertEqual(data['unfetched'], [{'exchange': 'NSE', 'symbolToken': '7', 'message': 'Invalid token',
+                                              'errorCode': 'AB4002'}])
+        self.assertEqual(data['stale'], [])
+
+    def test_failed_batch_is_reported_unfetched(self):
+        def post(url, json, **kwargs):
+            if '51' in json['exchangeTokens']['NSE']:
+                raise ConnectionError('reset by peer')
+            return quote_reply(json['exchangeTokens'])
+
+        with mock.patch.object(quotes.http, 'post', side_effect=post):
+            data = quotes.fetch_quotes('Bearer x', {'NSE': [str(token) for token in range(1, 61)]})['data']
+        self.assertEqual(len(data['fetched']), 50)
+        self.assertEqual([q['symbolToken'] for q in data['unfetched']], [str(token) for token in range(51, 61)])
+        self.assertEqual(data['unfetched'][0]['message'], 'reset by peer')
+
+        with mock.patch.object(quotes.http, 'post', side_effect=ConnectionError('reset by peer')), \
+                self.assertRaisesMessage(RuntimeError, 'All quote batches failed: reset by peer'):
+            quotes.fetch_quotes('Bearer x', {'NSE': ['1']})
+
+
+    def test_refused_batch_served_stale(self):
+        with mock.patch.object(quotes.http, 'post', side_effect=lambda url, json, **kwargs:
+                               quote_reply(json['exchangeTokens'])):
+            quotes.fetch_quotes('Bearer x', {'NSE': ['1', '2']})
+
+        refused = UpstreamUnavailable('quote', 'circuit open', 30)
+        with mock.patch.object(quotes, '_post_batch', side_effect=refused):
+            data = quotes.fetch_quotes('Bearer x', {'NSE': ['1', '2', '3']})['data']
+        self.assertEqual([q['symbolToken'] for q in data['fetched']], ['1', '2'])
+        self.assertEqual(data['stale'], [{'exchange': 'NSE', 'symbolToken': '1'},
+                                         {'exchange': 'NSE', 'symbolToken': '2'}])
+        self.assertEqual(data['unfetched'], [{'exchange': 'NSE', 'symbolToken': '3', 'message': str(refused),
+                                              'errorCode': ''}])
+
+        with mock.patch.object(quotes, '_post_batch', side_effect=refused), self.assertRaises(UpstreamUnavailable):
+            quotes.fetch_quotes('Bearer x', {'NSE': ['3']})
+
+
+class QuoteThrottleTests(GovernedTestCase):
+    def test_rate_limit_reply_is_recorded_as_throttle(self):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = {'status': False, 'message': 'Access denied because of exceeding access rate',
+                                   'errorcode': 'AB1019', 'data': None}
+        with mock.patch.object(quotes, 'governor', self.governor), \
+                mock.patch.object(quotes.http, 'post', return_value=reply), \
+                self.settings(GOVERNOR_FAILURES=2):
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    quotes.fetch_quotes('Bearer x', {'NSE': ['1333']})
+        tokens, failures, open_for = self.governor.state()['quote']
+        self.assertEqual(failures, 2)
+        self.assertLess(tokens, 0)
+        self.assertGreater(open_for, 0)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SWRCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SWRCache(workers=1)
+        self.cache.backend.clear()
+        self.addCleanup(self.cache._executor.shutdown)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return self.fetches
+
+    def get_at(self, now):
+        with mock.patch('service.cache.time.time', return_value=now):
+            return self.cache.get('key', self.fetch, ttl=10, stale_ttl=20)
+
+    def test_fresh_stale_and_expired(self):
+        self.assertEqual(self.get_at(1000), 1)
+        self.assertEqual(self.get_at(1009), 1)
+        # Past the ttl: the old value now, the refreshed one once it lands
+        self.assertEqual(self.get_at(1015), 1)
+        self.cache._executor.shutdown(wait=True)
+        self.assertEqual(self.fetches, 2)
+        self.assertEqual(self.get_at(1016), 2)
+        # Past ttl + stale_ttl of the refresh: fetched in the foreground
+        self.assertEqual(self.get_at(1046), 3)
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'stale': 1, 'misses': 2, 'fetches': 3, 'errors': 0,
+                                              'inflight': 0})
+
+    def test_concurrent_misses_share_one_fetch(self):
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            return self.fetch()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = [pool.submit(self.cache.get, 'key', slow_fetch, ttl=10) for _ in range(8)]
+            while self.cache.stats()['misses'] < 8:
+                time.sleep(0.01)
+            release.set()
+            self.assertEqual({result.result() for result in results}, {1})
+        self.assertEqual(self.fetches, 1)
+
+    def test_failed_fetch_reaches_every_waiter_and_is_not_cached(self):
+        with self.assertRaisesMessage(ConnectionError, 'yahoo down'):
+            self.cache.get('key', mock.Mock(side_effect=ConnectionError('yahoo down')), ttl=10)
+        self.assertEqual(self.cache.get('key', self.fetch, ttl=10), 1)
+        self.assertEqual(self.cache.stats()['errors'], 1)
+
+
+class BulkFundamentalsTests(GovernedTestCase):
+    def test_errors_stay_with_their_symbol(self):
+        def fundamental_data(symbol):
+            if symbol == 'BAD.NS':
+                raise KeyError('previousClose')
+            return dict.fromkeys(FUNDAMENTAL_FIELDS, len(symbol))
+
+        with mock.patch('service.fundamentals.fundamental_data', side_effect=fundamental_data):
+            df = bulk_fundamental_data(['TCS.NS', 'BAD.NS', 'INFY.NS', 'TCS.NS'], workers=2)
+        self.assertEqual(list(df.index), ['TCS.NS', 'BAD.NS', 'INFY.NS'])
+        self.assertEqual(list(df.columns), FUNDAMENTAL_FIELDS + ['error'])
+        self.assertEqual(df.loc['TCS.NS', 'PE'], 6)
+        self.assertIsNone(df.loc['INFY.NS', 'error'])
+        self.assertEqual(df.loc['BAD.NS', 'error'], "KeyError: 'previousClose'")
+        self.assertTrue(df.loc['BAD.NS', FUNDAMENTAL_FIELDS].isna().all())
+
+    @override_settings(CACHES=LOCMEM_CACHES, YAHOO_REPLAY_URL='http://stub', YAHOO_RATE_PER_SECOND=20,
+                       GOVERNOR_MAX_WAIT=0, GOVERNOR_POLL=0.01)
+    def test_waits_for_the_rate_limit_instead_of_failing(self):
+        def replay(module, symbol):
+            return {'previousClose': 100.0} if module == 'info' else {'2026-03-31': {'Net Income': 1.0}}
+
+        # 30 Yahoo calls against a burst of 20: interactive callers would be refused
+        symbols = ['WAIT{}.NS'.format(i) for i in range(15)]
+        with mock.patch('service.fundamentals.governor', self.governor), \
+                mock.patch('service.fundamentals._replay', side_effect=replay):
+            df = bulk_fundamental_data(symbols)
+        self.assertEqual(df['error'].tolist(), [None] * 15)
+        self.assertEqual(df['LTP'].tolist(), [100.0] * 15)
+
+
+class BarBuilderTests(SimpleTestCase):
+    def tick(self, ts, price, volume):
+        return {'exchange': 'NSE', 'symbolToken': '1333', 'ltp': price, 'tradeVolume': volume,
+                'exchFeedTime': int(ts.timestamp() * 1000)}
+
+    def test_reconnect_gap_matches_resample(self):
+        rng = np.random.default_rng(7)
+        times = pd.date_range(market_time('2026-10-14 09:15'), market_time('2026-10-14 09:59:50'), freq='10s')
+        prices = 1500 + rng.normal(0, 1, len(times)).cumsum()
+        day_volume = rng.integers(100, 1000, len(times)).cumsum()
+        # The feed is down from 09:31 and back exactly at 09:35
+        reconnect = market_time('2026-10-14 09:35')
+        seen = (times < market_time('2026-10-14 09:31')) | (times >= reconnect)
+
+        bars = BarBuilder(capacity=100)
+        with mock.patch('service.bars.time.time', return_value=times[0].timestamp()):
+            bars.reconnected()
+        for ts, price, volume in zip(times, prices, day_volume):
+            if ts == reconnect:
+                with mock.patch('service.bars.time.time', return_value=reconnect.timestamp()):
+                    bars.reconnected()
+            if seen[times.get_loc(ts)]:
+                bars.add_quote(self.tick(ts, price, int(volume)))
+
+        ticks = pd.DataFrame({'price': prices, 'volume': np.diff(day_volume, prepend=day_volume[0])},
+                             index=times)[seen]
+        # Neither the day's first tick nor the first after the reconnect adds volume
+        ticks.loc[reconnect, 'volume'] = 0
+        for interval, rule in (('ONE_MINUTE', '1min'), ('FIVE_MINUTE', '5min')):
+            resampled = ticks.resample(rule)
+            expected = resampled['price'].ohlc().set_axis(['Open', 'High', 'Low', 'Close'], axis=1)
+            expected['Volume'] = resampled['volume'].sum()
+            expected = expected[expected.index >= reconnect].dropna()
+
+            live = bars.today('NSE', '1333', interval)
+            self.assertEqual(live.index[0], reconnect)
+            pd.testing.assert_frame_equal(live, expected, check_names=False, check_freq=False)
+
+
+class TickToQuoteTests(SimpleTestCase):
+    ltp_packet = {'subscription_mode': 1, 'exchange_type': 1, 'token': '1333', 'sequence_number': 7,
+                  'exchange_timestamp': 1760414400000, 'last_traded_price': 150050}
+
+    def test_ltp_packet(self):
+        self.assertEqual(tick_to_quote(self.ltp_packet), {'exchange': 'NSE', 'symbolToken': '1333', 'ltp': 1500.5,
+                                                          'exchFeedTime': 1760414400000})
+
+    def test_quote_packet(self):
+        tick = dict(self.ltp_packet, subscription_mode=2, exchange_type=3, last_traded_quantity=10,
+                    average_traded_price=149875, volume_trade_for_the_day=120000, total_buy_quantity=5000.0,
+                    total_sell_quantity=6000.0, open_price_of_the_day=149000, high_price_of_the_day=151000,
+                    low_price_of_the_day=148500, closed_price=148000)
+        quote = tick_to_quote(tick)
+        self.assertEqual(quote, {'exchange': 'BSE', 'symbolToken': '1333', 'ltp': 1500.5, 'exchFeedTime': 1760414400000,
+                                 'open': 1490.0, 'high': 1510.0, 'low': 1485.0, 'close': 1480.0, 'lastTradeQty': 10,
+                                 'avgPrice': 1498.75, 'tradeVolume': 120000, 'totBuyQuan': 5000.0,
+                                 'totSellQuan': 6000.0, 'netChange': 20.5, 'percentChange': 1.39})
+        # No previous close yet (a new listing) leaves the percentage out
+        self.assertIsNone(tick_to_quote(dict(tick, closed_price=0))['percentChange'])
+
+
+class LiveFeedTests(SimpleTestCase):
+    def test_track_subscribes_new_instruments(self):
+        defaults = {'NSE': ['1333']}
+        feed = LiveFeed(QuoteTable(), defaults)
+        feed._socket, feed.connected = mock.Mock(), True
+        with self.settings(FEED_MAX_TOKENS=2):
+            self.assertTrue(feed.track('NSE', 1333))
+            self.assertFalse(feed.track('XYZ', '1'))
+            self.assertTrue(feed.track('BSE', '500325'))
+            self.assertFalse(feed.track('NSE', '2885'))
+        feed._socket.subscribe.assert_called_once()
+        self.assertEqual(feed._token_list(), [{'exchangeType': 1, 'tokens': ['1333']},
+                                              {'exchangeType': 3, 'tokens': ['500325']}])
+        self.assertEqual(defaults, {'NSE': ['1333']})
+
+    def test_connected_once_subscribed(self):
+        bars = BarBuilder(capacity=10)
+        feed = LiveFeed(QuoteTable(), {'NSE': ['1333']}, bars)
+        sws = mock.Mock()
+        sws.subscribe.side_effect = lambda *args: self.assertFalse(feed.connected)
+        feed._on_open(sws)
+        self.assertTrue(feed.connected)
+        self.assertIsNotNone(bars.connected_at)
+
+        feed.connected = False
+        sws.subscribe.side_effect = ConnectionError('socket closed')
+        with self.assertRaises(ConnectionError):
+            feed._on_open(sws)
+        self.assertFalse(feed.connected)
+
+
+class SessionManagerTests(GovernedTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('service.session.governor', self.governor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        rates = self.settings(LOGIN_RATE_PER_SECOND=1000)
+        rates.enable()
+        self.addCleanup(rates.disable)
+        self.client = FakeSmartConnect()
+        self.session = SessionManager(self.client, ttl=600, refresh_margin=60)
+
+    def enter_refresh_margin(self):
+        self.session._expires_at = time.time() + 30
+
+    def test_reuses_the_session(self):
+        first = self.session.tokens()
+        self.assertEqual(self.session.tokens(), first)
+        self.assertEqual(self.client.calls, {'generateSession': 1, 'generateToken': 0})
+        self.assertEqual(self.session.stats()['hits'], 1)
+
+    def test_refreshes_inside_the_margin(self):
+        self.session.tokens()
+        self.enter_refresh_margin()
+        self.assertEqual(self.session.tokens()[0], 'Bearer jwt2')
+        self.assertEqual(self.client.calls, {'generateSession': 1, 'generateToken': 1})
+
+    def test_failed_refresh_falls_back_to_login(self):
+        self.session.tokens()
+        self.enter_refresh_margin()
+        self.client.failing.add('generateToken')
+        self.assertEqual(self.session.tokens()[0], 'Bearer jwt3')
+        self.assertEqual(self.client.calls, {'generateSession': 2, 'generateToken': 1})
+
+    def test_failed_renewal_serves_the_valid_token(self):
+        first = self.session.tokens()
+        self.enter_refresh_margin()
+        self.client.failing.update(('generateToken', 'generateSession'))
+        self.assertEqual(self.session.tokens(), first)
+        self.assertEqual(self.session.stats()['fallbacks'], 1)
+
+    def test_governor_refusal_serves_the_valid_token(self):
+        first = self.session.tokens()
+        self.enter_refresh_margin()
+        with mock.patch.object(self.governor, 'acquire', side_effect=UpstreamUnavailable('token', 'circuit open', 5)):
+            self.assertEqual(self.session.tokens(), first)
+
+    def test_failed_login_raises_once_expired(self):
+        self.session.tokens()
+        self.session._expires_at = time.time() - 1
+        self.client.failing.update(('generateToken', 'generateSession'))
+        with self.assertRaises(SessionError):
+            self.session.tokens()
+
+    def test_concurrent_callers_share_one_login(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            tokens = set(pool.map(lambda _: self.session.tokens(), range(16)))
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(self.client.calls['generateSession'], 1)
+
+
+class ColumnarEnvelopeTests(SimpleTestCase):
+    def test_matches_json_dumps(self):
+        df = pd.DataFrame({'exchange': ['NSE', 'BSE'], 'ltp': [1500.5, np.nan]})
+        body = formats.columnar_envelope({'count': 2}, df)
+        self.assertEqual(json.loads(body), {'count': 2, 'data': {'exchange': ['NSE', 'BSE'], 'ltp': [1500.5, None]}})
+        self.assertEqual(json.loads(formats.columnar_envelope({}, df.iloc[:0])), {'data': {'exchange': [], 'ltp': []}})
+
+
+class NegotiateTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def negotiate(self, query='', accept='*/*', **kwargs):
+        return formats.negotiate(self.factory.get('/candles/' + query, HTTP_ACCEPT=accept), **kwargs)
+
+    def test_query_then_accept_header(self):
+        self.assertEqual(self.negotiate(), 'records')
+        self.assertEqual(self.negotiate('?format=columnar'), 'columnar')
+        self.assertEqual(self.negotiate('?format=json', default='columnar'), 'columnar')
+        self.assertEqual(self.negotiate(accept='application/vnd.apache.arrow.stream, */*;q=0.1'), 'arrow')
+        # ?format= wins over the Accept header
+        self.assertEqual(self.negotiate('?format=records', accept='application/vnd.apache.arrow.stream'), 'records')
+
+    def test_unsupported(self):
+        with self.assertRaisesMessage(formats.FormatError, 'Unsupported format: csv'):
+            self.negotiate('?format=csv')
+        with self.assertRaises(formats.FormatError):
+            self.negotiate(accept='application/vnd.apache.parquet')
+
+
+class CompressTests(SimpleTestCase):
+    body = json.dumps([{'Open': 1500.5 + i, 'Close': 1501.0 + i} for i in range(100)]).encode()
+
+    def test_gzip(self):
+        with mock.patch.object(formats, 'brotli', None):
+            compressed, encoding = formats.compress(self.body, 'gzip, deflate, br')
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.decompress(compressed), self.body)
+
+    def test_brotli_when_installed(self):
+        brotli = mock.Mock()
+        brotli.compress.return_value = b'br'
+        with mock.patch.object(formats, 'brotli', brotli):
+            self.assertEqual(formats.compress(self.body, 'gzip;q=0.5, br;q=1.0'), (b'br', 'br'))
+            self.assertEqual(formats.compress(self.body, 'gzip')[1], 'gzip')
+
+    def test_left_alone(self):
+        self.assertEqual(formats.compress(self.body, ''), (self.body, None))
+        self.assertEqual(formats.compress(self.body, 'identity'), (self.body, None))
+        self.assertEqual(formats.compress(b'[]', 'gzip, br'), (b'[]', None))
+
+
+class CompileFilterTests(SimpleTestCase):
+    columns = {
+        'ltp': np.array([100.0, 50.0, np.nan]),
+        'change': np.array([3.0, -1.0, 2.5]),
+        'volume': np.array([5000.0, 20000.0, 100.0]),
+        'avg_volume_20': np.array([1000.0, 30000.0, np.nan]),
+    }
+
+    def mask(self, expression):
+        return compile_filter(expression)(self.columns).tolist()
+
+    def test_conditions(self):
+        self.assertEqual(self.mask('change > 2 and volume > avg_volume_20'), [True, False, False])
+        self.assertEqual(self.mask('not (change > 2) or volume / 2 >= 10000'), [False, True, False])
+        self.assertEqual(self.mask('0 < change < 3'), [False, False, True])
+        self.assertEqual(self.mask('-change > 0'), [False, True, False])
+
+    def test_rejections(self):
+        for expression in ('change >', 'unknown > 1', 'ltp.real > 1', '__import__("os")', 'change > "2"',
+                           'change is None', 'ltp', 'not close', 'change > 2 and 5', '5 or volume > 1',
+                           '(change > 2) + 1 > 0', '-(change > 2)', 'True'):
+            with self.subTest(expression=expression), self.assertRaises(FilterError):
+                compile_filter(expression)
+
+
+class ScreenerViewTests(SimpleTestCase):
+    def test_non_positive_limit_is_a_400(self):
+        for limit in ('0', '-1', 'all'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/screener/', {'q': 'change > 2', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json()['error'])
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    document = '[{"token": "1333", "strike": "-1.0"}, null, 12.5, -3e2, true, "a,]b", [1, [2]], {}]'
+
+    def test_every_chunk_boundary(self):
+        expected = json.loads(self.document)
+        for size in range(1, len(self.document) + 1):
+            chunks = [self.document[i:i + size] for i in range(0, len(self.document), size)]
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_array(chunks)), expected)
+
+    def test_split_numbers(self):
+        self.assertEqual(list(iter_json_array(['[12', '.5, 1', 'e3, 7', ']'])), [12.5, 1000.0, 7])
+
+    def test_truncated_and_invalid(self):
+        for chunks in (['[{"a": 1}, {"b"'], ['[1, 2'], ['{"a": 1}']):
+            with self.subTest(chunks=chunks), self.assertRaises(ValueError):
+                list(iter_json_array(chunks))
+
+
+class LoadInstrumentsTests(TransactionTestCase):
+    def test_download_happens_outside_the_transaction(self):
+        Instrument.objects.create(exchange='NSE', token='1', symbol='OLD-EQ')
+
+        def records():
+            for token, symbol in (('1333', 'HDFCBANK-EQ'), ('2885', 'RELIANCE-EQ'), ('99', 'NIFTY')):
+                # Still streaming: no write lock held and the old table intact
+                self.assertFalse(connection.in_atomic_block)
+                self.assertTrue(Instrument.objects.filter(token='1').exists())
+                yield {'exch_seg': 'NSE', 'token': token, 'symbol': symbol, 'lotsize': '1'}
+            yield {'exch_seg': 'MCX', 'token': '5', 'symbol': 'GOLD'}
+
+        self.assertEqual(load_instruments(records(), exchanges={'NSE'}, batch_size=2), 3)
+        self.assertEqual(dict(Instrument.objects.values_list('token', 'yahoo')),
+                         {'1333': 'HDFCBANK.NS', '2885': 'RELIANCE.NS', '99': ''})
+
+
+class InstrumentIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Instrument.objects.bulk_create([
+            Instrument(exchange='NSE', token='1333', symbol='HDFCBANK-EQ', name='HDFCBANK', yahoo='HDFCBANK.NS'),
+            Instrument(exchange='BSE', token='500180', symbol='HDFCBANK', name='HDFC BANK LTD', yahoo='HDFCBANK.BO'),
+            Instrument(exchange='NSE', token='1330', symbol='HDFC-EQ', name='HDFC', yahoo='HDFC.NS'),
+            Instrument(exchange='NSE', token='2885', symbol='RELIANCE-EQ', name='RELIANCE', yahoo='RELIANCE.NS'),
+            Instrument(exchange='NFO', token='35001', symbol='HDFCBANK26OCTFUT', name='HDFCBANK'),
+        ])
+
+    def setUp(self):
+        self.index = InstrumentIndex()
+
+    def test_resolve(self):
+        for value, exchange, token in (('1333', 'NSE', '1333'), ('HDFCBANK-EQ', 'NSE', '1333'),
+                                       ('hdfcbank', 'NSE', '1333'), (' RELIANCE.NS ', 'NSE', '2885'),
+                                       ('BSE:500180', 'BSE', '500180'), ('bse:hdfcbank', 'BSE', '500180'),
+                                       ('HDFCBANK.BO', 'BSE', '500180'), ('NFO:HDFCBANK26OCTFUT', 'NFO', '35001')):
+            with self.subTest(value=value):
+                row = self.index.resolve(value)
+                self.assertEqual((row.exchange, row.token), (exchange, token))
+        self.assertIsNone(self.index.resolve('99999'))
+        self.assertIsNone(self.index.resolve('BSE:HDFC-EQ'))
+
+    def test_search(self):
+        self.assertEqual([(row.exchange, row.token) for row in self.index.search('hdfc')],
+                         [('NSE', '1330'), ('BSE', '500180'), ('NFO', '35001'), ('NSE', '1333')])
+        self.assertEqual([row.token for row in self.index.search('HDFC', exchange='NSE', limit=1)], ['1330'])
+        self.assertEqual(self.index.search('  '), [])
+        self.assertEqual(self.index.search('TCS'), [])
+
+    def test_rebuilt_after_a_refresh(self):
+        self.assertIsNone(self.index.by_token('NSE', '11536'))
+        Instrument.objects.create(exchange='NSE', token='11536', symbol='TCS-EQ', yahoo='TCS.NS')
+        self.index.invalidate()
+        self.assertEqual(self.index.by_yahoo('tcs.ns').token, '11536')
+        self.assertEqual(len(self.index), 6)
+
+
+class PlanWindowsTests(SimpleTestCase):
+    def test_splits_at_the_api_limit(self):
+        start = market_time('2026-01-01')
+        windows = plan_windows(start, start + pd.Timedelta(days=65), 'ONE_MINUTE')
+        self.assertEqual([(a - start).days for a, _ in windows], [0, 30, 60])
+        self.assertEqual(windows[-1][1], start + pd.Timedelta(days=65))
+        self.assertTrue(all(a == b for (_, a), (b, _) in zip(windows, windows[1:])))
+        self.assertEqual(plan_windows(start, start, 'ONE_DAY'), [(start, start)])
+
+    def test_unsupported_interval(self):
+        with self.assertRaises(ValueError):
+            plan_windows(market_time('2026-01-01'), market_time('2026-02-01'), 'TWO_MINUTE')
+
+
+def daily_candles(window_from, window_to, interval=None):
+    index = pd.date_range(window_from, window_to, freq='D', name='DateTime')
+    close = np.arange(len(index), dtype='float64') + 100
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                         'Volume': np.full(len(index), 1000)}, index=index)
+
+
+class PartialBackfillTests(TestCase):
+    start = market_time('2026-04-01')
+    end = start + pd.Timedelta(days=90)
+
+    def setUp(self):
+        self.calls, self.failing = [], set()
+        patcher = mock.patch('service.candles.fetch_candles', side_effect=self.fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, exchange, token, window_from, window_to, interval):
+        self.calls.append((window_from, window_to))
+        if (window_from, window_to) in self.failing:
+            raise CandleFetchError('Something went wrong')
+        return daily_candles(window_from, window_to)
+
+    def test_retry_only_fetches_the_failed_window(self):
+        windows = plan_windows(self.start, self.end, 'ONE_MINUTE')
+        self.failing.add(windows[0])
+        with self.settings(BACKFILL_RETRIES=0), self.assertRaises(CandleFetchError):
+            get_candles('NSE', '1333', self.start, self.end, 'ONE_MINUTE')
+        self.assertEqual(len(load_candles('NSE', '1333', 'ONE_MINUTE')), 61)
+
+        self.failing.clear()
+        self.calls.clear()
+        df = get_candles('NSE', '1333', self.start, self.end, 'ONE_MINUTE')
+        self.assertEqual(self.calls, [windows[0]])
+        self.assertEqual(len(df), 91)
+
+    def test_all_windows_failing_raises_the_error(self):
+        self.failing.update(plan_windows(self.start, self.end, 'ONE_MINUTE'))
+        with self.settings(BACKFILL_RETRIES=0), self.assertRaises(CandleFetchError):
+            get_candles('NSE', '1333', self.start, self.end, 'ONE_MINUTE')
+        self.assertIsNone(CandleSeries.objects.get(symboltoken='1333').fetched_from)
+
+
+class RejectedCandleRequestTests(TestCase):
+    """
+    A refused getCandleData request is neither retried nor held against
+    the candles circuit.
+    """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.governor = Governor(os.path.join(tmp.name, 'governor.sqlite3'))
+        self.replies = {'999999': {'status': False, 'message': 'Invalid symbol token', 'errorcode': 'AB1018',
+                                   'data': None},
+                        '1333': {'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': []}}
+        self.calls = []
+        for patcher in (mock.patch('service.candles.governor', self.governor),
+                        mock.patch('service.candles.obj.getCandleData', side_effect=self.reply)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reply(self, params):
+        self.calls.append(params['symboltoken'])
+        return self.replies[params['symboltoken']]
+
+    def test_invalid_token_does_not_open_the_circuit(self):
+        start = market_time('2026-04-01')
+        with self.settings(GOVERNOR_FAILURES=1, BACKFILL_RETRIES=3, BACKFILL_BACKOFF=0):
+            with self.assertRaisesMessage(CandleFetchError, 'Invalid symbol token'):
+                get_candles('NSE', '999999', start, start + pd.Timedelta(days=90), 'ONE_MINUTE')
+            # One call per window, no retries
+            self.assertEqual(len(self.calls), 3)
+            self.assertEqual(self.governor.state()['candles'][1:], (0, 0.0))
+            get_candles('NSE', '1333', start, start + pd.Timedelta(days=1), 'ONE_MINUTE')
+        self.assertEqual(self.calls[-1], '1333')
+
+    def test_server_errors_still_count(self):
+        self.replies['999999'] = {'status': False, 'message': 'Internal Error', 'errorcode': 'AB2001', 'data': None}
+        with self.settings(GOVERNOR_FAILURES=1, BACKFILL_RETRIES=0):
+            with self.assertRaises(CandleFetchError):
+                get_candles('NSE', '999999', market_time('2026-04-01'), market_time('2026-04-02'), 'ONE_MINUTE')
+            with self.assertRaisesMessage(UpstreamUnavailable, 'circuit open'):
+                get_candles('NSE', '1333', market_time('2026-04-01'), market_time('2026-04-02'), 'ONE_MINUTE')
+
+
+class TimeperiodValidationTests(TestCase):
+    def test_unsupported_timeperiod_is_a_400(self):
+        for path in ('/historical-data/', '/indicators/', '/backtest/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, {'token': '1333', 'timeperiod': 'TWO_MINUTE'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ONE_MINUTE', response.json()['error'])
+
+
+class IndicatorViewTests(TestCase):
+    def setUp(self):
+        candles = daily_candles(market_time('2026-01-01'), market_time('2026-03-01'))
+        for patcher in (mock.patch('service.views.login', return_value=('Bearer x', 'feed')),
+                        mock.patch('service.views.historical_data', return_value=candles)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        return self.client.get('/indicators/', {'token': '1333', 'indicator': 'sma', 'period': '5', **params})
+
+    def test_window(self):
+        rows = self.get(**{'from': '2026-02-01', 'to': '2026-02-10'}).json()
+        self.assertEqual(len(rows), 10)
+        self.assertEqual((rows[0]['DateTime'][:10], rows[-1]['DateTime'][:10]), ('2026-02-01', '2026-02-10'))
+        self.assertEqual(len(self.get(limit='3').json()), 3)
+
+    def test_invalid_window(self):
+        for params in ({'from': 'garbage'}, {'to': '2026-13-01'}, {'limit': '-3'}, {'limit': '0'},
+                       {'limit': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+
+class LoginFailureTests(TestCase):
+    def test_refused_login_is_a_503(self):
+        with mock.patch('service.views.session.tokens', side_effect=SessionError("Login failed: Invalid totp")):
+            for path in ('/historical-data/', '/market-data/', '/backtest/'):
+                with self.subTest(path=path):
+                    response = self.client.get(path, {'token': '1333'})
+                    self.assertEqual(response.status_code, 503)
+                    self.assertIn('Invalid totp', response.json()['error'])
+                    self.assertEqual(response['Retry-After'], '30')
+
+
+class MissingRangesTests(SimpleTestCase):
+    start = market_time('2026-01-01 09:15')
+    end = market_time('2026-03-01 15:30')
+
+    def series(self, fetched_from=None, fetched_to=None):
+        return CandleSeries(exchange='NSE', symboltoken='1333', interval='ONE_DAY',
+                            fetched_from=fetched_from, fetched_to=fetched_to)
+
+    def test_new_series_fetches_everything(self):
+        self.assertEqual(missing_ranges(self.series(), self.start, self.end, None), [(self.start, self.end)])
+
+    def test_covered_range_needs_nothing(self):
+        series = self.series(self.start - pd.Timedelta(days=1), self.end - pd.Timedelta(seconds=30))
+        self.assertEqual(missing_ranges(series, self.start, self.end, None), [])
+
+    def test_head_and_tail(self):
+        fetched_from, fetched_to = market_time('2026-02-01'), market_time('2026-02-20 15:30')
+        last_candle = market_time('2026-02-20 09:15')
+        self.assertEqual(missing_ranges(self.series(fetched_from, fetched_to), self.start, self.end, last_candle),
+                         [(self.start, fetched_from), (last_candle, self.end)])
+
+    def test_tail_without_stored_candles(self):
+        fetched_to = market_time('2026-02-20 15:30')
+        self.assertEqual(missing_ranges(self.series(self.start, fetched_to), self.start, self.end, None),
+                         [(fetched_to, self.end)])
+
+
+def minute_candles(start, periods, seed=1):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(market_time(start), periods=periods, freq='min', name='DateTime')
+    close = 1000 + rng.normal(0, 1, periods).cumsum()
+    spread = rng.uniform(0, 1, periods)
+    return pd.DataFrame({'Open': close - spread / 2, 'High': close + spread, 'Low': close - spread,
+                         'Close': close, 'Volume': rng.integers(1, 1000, periods)}, index=index)
+
+
+class AggregationTests(SimpleTestCase):
+    def test_intraday_bars_anchor_at_the_open(self):
+        df = minute_candles('2026-10-14 09:15', 375)
+        bars = resample_candles(df, '15min')
+        self.assertEqual(bars.index[0], market_time('2026-10-14 09:15'))
+        self.assertEqual(len(bars), 25)
+        first = df.iloc[:15]
+        self.assertEqual(tuple(bars.iloc[0]), (first['Open'].iloc[0], first['High'].max(), first['Low'].min(),
+                                               first['Close'].iloc[-1], first['Volume'].sum()))
+
+    def test_weeks_months_and_gaps(self):
+        index = pd.DatetimeIndex([market_time(day) for day in ('2026-09-30', '2026-10-01', '2026-10-02',
+                                                               '2026-10-05', '2026-10-07')], name='DateTime')
+        df = pd.DataFrame({'Open': [1.0, 2, 3, 4, 5], 'High': [2.0, 3, 4, 5, 6], 'Low': [0.5, 1, 2, 3, 4],
+                           'Close': [1.5, 2.5, 3.5, 4.5, 5.5], 'Volume': [10, 20, 30, 40, 50]}, index=index)
+        weeks = resample_candles(df, 'week')
+        self.assertEqual(list(weeks.index), [market_time('2026-09-28'), market_time('2026-10-05')])
+        self.assertEqual(list(weeks['Volume']), [60, 90])
+        months = resample_candles(df, 'month')
+        self.assertEqual(list(months['Open']), [1.0, 2.0])
+        # No bars for the weekend or the missing 6th
+        self.assertEqual(len(resample_candles(df, 'day')), 5)
+        with self.assertRaises(ValueError):
+            resample_candles(df, 'fortnight')
+
+    def test_previous_close_and_change(self):
+        bars = add_previous_close(pd.DataFrame({'Close': [100.0, 110.0, 99.0, 0.0, 10.0]}))
+        self.assertTrue(np.isnan(bars['Change'].iloc[0]))
+        np.testing.assert_allclose(bars['Change'].iloc[1:3], [10.0, -10.0])
+        self.assertTrue(np.isnan(bars['Change'].iloc[4]))
+
+    def test_summary_from_history_matches_full(self):
+        df = minute_candles('2026-10-12 09:15', 3 * 24 * 60)
+        history = resample_candles(df[df.index < market_time('2026-10-14 12:00')], 'day')
+        stitched = summarize(df[df.index >= history.index[-1]], 'day', history=history)
+        pd.testing.assert_frame_equal(stitched, summarize(df, 'day'))
+
+
+class IndicatorMemoTests(SimpleTestCase):
+    def test_incremental_matches_full(self):
+        candles = minute_candles('2026-10-14 09:15', 300)
+        # The last memoized candle was still forming when first computed
+        forming = candles.iloc[:250].copy()
+        forming.iloc[-1, forming.columns.get_loc('Close')] += 5
+        for name in INDICATORS:
+            with self.subTest(indicator=name):
+                params = parse_params(name, {})
+                memo = IndicatorMemo(size=4)
+                memo.get('key', name, forming, params)
+                result = memo.get('key', name, candles, params)
+                self.assertEqual(memo.counters, {'hits': 0, 'partial': 1, 'full': 1})
+                pd.testing.assert_frame_equal(result, compute(name, candles, params), check_freq=False)
+                pd.testing.assert_frame_equal(memo.get('key', name, candles, params), result)
+                self.assertEqual(memo.counters['hits'], 1)
+
+    def test_earlier_start_recomputes(self):
+        candles = minute_candles('2026-10-14 09:15', 100)
+        params = parse_params('ema', {})
+        memo = IndicatorMemo(size=4)
+        memo.get('key', 'ema', candles.iloc[50:], params)
+        pd.testing.assert_frame_equal(memo.get('key', 'ema', candles, params), compute('ema', candles, params))
+        self.assertEqual(memo.counters['full'], 2)
+
+
+class SimulateTests(SimpleTestCase):
+    def test_fills_at_next_open_with_costs(self):
+        data = {'open': np.array([100.0, 102, 104, 103]), 'close': np.array([101.0, 103, 102, 105])}
+        returns, equity, held, turnover = simulate(data, np.array([1.0, 1, 0, 0]), slippage_bps=6, brokerage_bps=4)
+        np.testing.assert_array_equal(held, [0, 1, 1, 0])
+        np.testing.assert_array_equal(turnover, [0, 1, 0, 1])
+        expected = [
+            0.0,
+            103 / 102 - 1 - 0.001,                      # bought at the open
+            (104 / 103) * (102 / 104) - 1,              # overnight gap, then the day
+            103 / 102 - 1 - 0.001,                      # gap earned by the old position, sold at the open
+        ]
+        np.testing.assert_allclose(returns, expected)
+        np.testing.assert_allclose(equity, 100000 * np.cumprod(1 + np.array(expected)))
+
+    def test_short_positions(self):
+        data = {'open': np.array([100.0, 100, 90]), 'close': np.array([100.0, 90, 90])}
+        returns, _, _, _ = simulate(data, np.array([-1.0, -1, -1]))
+        np.testing.assert_allclose(returns, [0.0, 0.1, 0.0])
+
+
+class StrategyParamsTests(SimpleTestCase):
+    def test_casts_overrides(self):
+        self.assertEqual(get_strategy('sma_crossover').params(fast='5', short='1'), {'fast': 5, 'slow': 30, 'short': 1})
+
+    def test_rejects_bad_values(self):
+        for name, overrides in (('sma_crossover', {'fast': '-1'}), ('sma_crossover', {'short': '2'}),
+                                ('breakout', {'period': '0'}), ('rsi_reversion', {'lower': '80'}),
+                                ('rsi_reversion', {'upper': '120'}), ('sma_crossover', {'fast': 'ten'})):
+            with self.subTest(name=name, overrides=overrides):
+                with self.assertRaises(ValueError):
+                    get_strategy(name).params(**overrides)
+
+    def test_sweep_fails_fast(self):
+        with self.assertRaises(ValueError):
+            sweep({}, 'breakout', {'period': [10, 0]})
+
+    def test_backtest_view_rejects_bad_params(self):
+        for params in ({'fast': '-1'}, {'strategy': 'breakout', 'period': '0'}):
+            with self.subTest(params=params):
+                response = self.client.get('/backtest/', {'token': '1333', **params})
+                self.assertEqual(response.status_code, 400)
+
+
+class RegistryRenderTests(SimpleTestCase):
+    def test_gauges_grouped_by_name(self):
+        gauges = [('governor_tokens', {'bucket': 'candles'}, 3), ('circuit_failures', {'bucket': 'candles'}, 0),
+                  ('governor_tokens', {'bucket': 'quote'}, 10), ('circuit_failures', {'bucket': 'quote'}, 2)]
+        lines = Registry().render(gauges).splitlines()
+        self.assertEqual(lines, [
+            '# TYPE governor_tokens gauge',
+            'governor_tokens{bucket="candles"} 3',
+            'governor_tokens{bucket="quote"} 10',
+            '# TYPE circuit_failures gauge',
+            'circuit_failures{bucket="candles"} 0',
+            'circuit_failures{bucket="quote"} 2',
+        ])
+
+
+class GovernorTests(GovernedTestCase):
+    def rates(self, **overrides):
+        return self.settings(**{'LOGIN_RATE_PER_SECOND': 2, 'GOVERNOR_MAX_WAIT': 0, 'GOVERNOR_POLL': 0.01,
+                                'GOVERNOR_FAILURES': 2, 'GOVERNOR_COOLDOWN': 60, **overrides})
+
+    def test_bucket_allows_the_burst_then_waits(self):
+        with self.rates():
+            self.assertEqual(self.governor._take('login', INTERACTIVE), 0)
+            self.assertEqual(self.governor._take('login', INTERACTIVE), 0)
+            self.assertAlmostEqual(self.governor._take('login', INTERACTIVE), 0.5, delta=0.05)
+            with self.assertRaises(UpstreamUnavailable) as refused:
+                self.governor.acquire('login', INTERACTIVE)
+        self.assertEqual(refused.exception.reason, 'rate limited')
+
+    def test_batch_keeps_only_its_reserve_while_interactive_waits(self):
+        # A long poll keeps the waiting interactive caller's claim for the whole test
+        with self.rates(LOGIN_RATE_PER_SECOND=10, GOVERNOR_BATCH_RESERVE=0.2, GOVERNOR_POLL=5):
+            for _ in range(10):
+                self.governor._take('login', INTERACTIVE)
+            # An interactive caller now waits, which marks the bucket contended
+            self.assertGreater(self.governor._take('login', INTERACTIVE), 0)
+            time.sleep(0.4)
+            # Four tokens came back: batch gets its reserve (20% of the burst),
+            # the rest is kept for interactive callers
+            self.assertEqual(self.governor._take('login', BATCH), 0)
+            self.assertEqual(self.governor._take('login', BATCH), 0)
+            self.assertGreater(self.governor._take('login', BATCH), 0)
+            self.assertEqual(self.governor._take('login', INTERACTIVE), 0)
+
+    def test_breaker_opens_probes_and_closes(self):
+        with self.rates(LOGIN_RATE_PER_SECOND=100):
+            for _ in range(2):
+                with self.assertRaises(SessionError), self.governor.call('generateSession'):
+                    raise SessionError('Login failed')
+            with self.assertRaises(UpstreamUnavailable) as refused:
+                self.governor.acquire('login', INTERACTIVE)
+            self.assertEqual(refused.exception.reason, 'circuit open')
+
+            # Cool-down over: one probe goes through, the next caller is held back
+            self.governor._db().execute('UPDATE breakers SET open_until = ?', (time.time() - 1,))
+            self.governor.acquire('login', INTERACTIVE)
+            with self.assertRaises(UpstreamUnavailable):
+                self.governor.acquire('login', INTERACTIVE)
+            self.governor.record('login', ok=True)
+            self.governor.acquire('login', INTERACTIVE)
+        self.assertEqual(self.governor.state()['login'][1:], (0, 0.0))
+
+    def test_throttle_reply_empties_the_bucket(self):
+        with self.rates(LOGIN_RATE_PER_SECOND=100, GOVERNOR_FAILURES=5):
+            with self.assertRaises(SessionError), self.governor.call('generateSession'):
+                raise SessionError('Access denied because of exceeding access rate')
+            tokens, failures, open_for = self.governor.state()['login']
+            self.assertLess(tokens, 0)
+            self.assertEqual((failures, open_for), (1, 0.0))
+            with self.assertRaises(UpstreamUnavailable):
+                self.governor.acquire('login', INTERACTIVE)
+
+    def test_only_broker_failures_count(self):
+        def http_error(status):
+            return requests.HTTPError('{} Error'.format(status), response=mock.Mock(status_code=status))
+
+        for error in (CandleFetchError('Invalid symbol token', 'AB1018'), http_error(403), http_error(404)):
+            with self.subTest(error=error):
+                self.assertTrue(is_rejection(error))
+        for error in (CandleFetchError('Internal Error', 'AB2001'), CandleFetchError('empty response'),
+                      CandleFetchError('Access denied because of exceeding access rate', 'AB1019'),
+                      http_error(429), http_error(502), requests.ConnectionError('reset by peer')):
+            with self.subTest(error=error):
+                self.assertFalse(is_rejection(error))
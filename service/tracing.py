@@ -0,0 +1,135 @@
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import metrics
+
+logger = logging.getLogger('service.requests')
+
+# Spans recorded while serving the current request, as [(name, seconds)].
+# The list is shared with executor threads through a copied context.
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+@contextmanager
+def span(name, **labels):
+    """
+    Time a processing stage: feeds span_duration_seconds, counts
+    span_errors_total when the block raises, and adds the stage to the
+    current request's log line.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc('span_errors_total', span=name, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('span_duration_seconds', elapsed, span=name, **labels)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name if not labels else '{}:{}'.format(name, ','.join(map(str, labels.values()))), elapsed))
+
+
+@contextmanager
+def upstream(endpoint):
+    """
+    Span around one call to SmartAPI or Yahoo, also counted in
+    upstream_calls_total by outcome.
+    """
+    outcome = 'error'
+    try:
+        with span('upstream', endpoint=endpoint):
+            yield
+        outcome = 'ok'
+    finally:
+        metrics.inc('upstream_calls_total', endpoint=endpoint, outcome=outcome)
+
+
+class TimingMiddleware:
+    """
+    Records every request in http_request_duration_seconds and
+    http_requests_total (labelled by URL name, method and status) and writes
+    one structured log line with the time spent in each span.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        token, started = _request_spans.set([]), time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started, token)
+
+    async def _acall(self, request):
+        token, started = _request_spans.set([]), time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started, token)
+
+    def _finish(self, request, response, started, token):
+        elapsed = time.perf_counter() - started
+        spans = _request_spans.get() or []
+        _request_spans.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        status = response.status_code if response is not None else 500
+        metrics.observe('http_request_duration_seconds', elapsed, view=view, method=request.method, status=status)
+        metrics.inc('http_requests_total', view=view, method=request.method, status=status)
+
+        breakdown = {}
+        for name, seconds in spans:
+            breakdown[name] = round(breakdown.get(name, 0.0) + seconds * 1000, 3)
+        logger.info('%s %s %s', request.method, request.get_full_path(), status, extra={
+            'view': view, 'status': status, 'duration_ms': round(elapsed * 1000, 3), 'spans': breakdown,
+        })
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, any ``extra``
+    fields and the traceback if there is one.
+    """
+    _reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S%z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update({key: value for key, value in vars(record).items() if key not in self._reserved})
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class ErrorCountHandler(logging.Handler):
+    """
+    Counts warnings and errors logged anywhere in the service into
+    errors_total{source, level}.
+    """
+
+    def emit(self, record):
+        metrics.inc('errors_total', source=record.name, level=record.levelname.lower())
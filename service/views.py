@@ -1,236 +1,573 @@
-from django.http import JsonResponse
+import asyncio
+import logging
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
 from django.views import View
-from SmartApi import SmartConnect
-import pyotp
+from django.views.decorators.csrf import csrf_exempt
 import pandas as pd
 from datetime import datetime, timedelta
 import json
-import yfinance as yf
-import http.client
-from django.conf import settings
+import time
+from .aggregation import summarize
+from .backfill import MAX_DAYS_PER_REQUEST
+from .backtest import bars_per_year, get_strategy, run_backtest, to_arrays
+from .cache import cache
+from .candles import DATE_FORMAT, get_candles, market_now
+from .executor import run_blocking
+from .metrics import metrics, ratio
+from .formats import FormatError, bytes_response, columnar_envelope, frame_response, negotiate
+from .feed import bars as live_bars, feed, quotes
+from .fundamentals import bulk_fundamental_data, fundamental_data
+from .governor import UpstreamUnavailable, governor
+from .indicators import indicator_frame, memo, parse_params
+from .instruments import index as instruments
+from .models import Watchlist
+from .prewarm import HISTORY_DAYS, precomputed_bars
+from .quotes import DEFAULT_EXCHANGE_TOKENS, fetch_quotes
+from .screener import FIELDS, FilterError, screener
+from .session import SessionError, session
+from .tracing import span
 
-# Create an object of SmartConnect
-apikey = settings.API_KEY
-obj = SmartConnect(api_key=apikey)
+logger = logging.getLogger(__name__)
 
 def login():
     """
-    Function to login and return AUTH and FEED tokens.
+    Function to return AUTH and FEED tokens, reusing the cached session.
+    A refused login (or timing out behind another one) is raised as UpstreamUnavailable, so views answer 503.
     """
-    username = settings.USERNAME
-    pwd = settings.PWD
-    token = settings.TOKEN
-    data = obj.generateSession(username, pwd, pyotp.TOTP(token).now())
-    refreshToken = data['data']['refreshToken']
-    auth_token = data['data']['jwtToken']
-    feed_token = obj.getfeedToken()
-    return auth_token, feed_token
+    try:
+        with span('login'):
+            return session.tokens()
+    except SessionError as e:
+        raise UpstreamUnavailable('login', e, settings.SMARTAPI_LOGIN_WAIT) from e
 
 def historical_data(exchange, token, from_date, to_date, timeperiod):
     """
-    Function to fetch historical data and return it as a JSON string.
+    Function to fetch historical data and return it as a DataFrame indexed by DateTime.
+    Candles already in the local store are reused, only the missing range is
+    requested from getCandleData.
     """
     try:
-        historicParam = {
-            "exchange": exchange,
-            "symboltoken": token,
-            "interval": timeperiod,
-            "fromdate": from_date, 
-            "todate": to_date
-        }
-        api_response = obj.getCandleData(historicParam)
-        data = api_response['data']
-        columns = ['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume']
-        df = pd.DataFrame(data, columns=columns)
-        
-        # Convert DateTime to a datetime object and set it as index
-        df['DateTime'] = pd.to_datetime(df['DateTime'])
-        df.set_index('DateTime', inplace=True)
-
-        # Convert DataFrame to JSON
-        return df.reset_index().to_json(orient='records', date_format='iso')  # ISO format for date
+        with span('candles'):
+            return get_candles(exchange, token, from_date, to_date, timeperiod)
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
-        print("Historic API failed: {}".format(e))
+        logger.exception("Historic API failed: %s", e)
         return None  # Return None if there is an error
     
-def market_data(token):
+def market_data(token, exchange_tokens=None):
     """
-    Function to fetch historical data and return it as a JSON string.
+    Function to fetch quotes for the given tokens (default list if None) and return the merged response.
     """
     try:
-        conn = http.client.HTTPSConnection("apiconnect.angelone.in")
+        with span('quotes'):
+            return fetch_quotes(token, exchange_tokens or DEFAULT_EXCHANGE_TOKENS)
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        logger.exception("Market API failed: %s", e)
+        return None  # Return None if there is an error
+    
+def watchlist_tokens(name):
+    """
+    Function to return {exchange: [tokens]} for a watchlist, or None if it does not exist.
+    """
+    watchlist = Watchlist.objects.filter(name=name).first()
+    return None if watchlist is None else watchlist.exchange_tokens()
 
-        payload = {
-            "mode": "FULL",
-            "exchangeTokens": {
-                "NSE": ['526', '694', '3351', '10940', '2885', '3506', '7229', '910', '1363', '1232', '11630', '20374', '157', '16675', '236', '5258', '10999', '25', '467', '1594', '3499', '11536', '2031', '16669', '2475', '547', '3045', '3787', '881', '13538', '4306', '5900', '1660', '17818', '317', '21808', '3456', '11723', '17963', '1394', '3432', '11532', '15083', '1922', '11483', '1348', '4963', '1333', '10604', '14977']
-            }
-        }
+def instrument_params(request):
+    """
+    Function to return (exchange, token) from ?symbol= (resolved through the instrument index)
+    or from ?exchange=&token=. Returns None if the symbol is unknown.
+    """
+    exchange = request.GET.get('exchange', 'NSE')
+    symbol = request.GET.get('symbol')
+    if not symbol:
+        return exchange, request.GET.get('token', 1333)
+    row = instruments.resolve(symbol, exchange)
+    return None if row is None else (row.exchange, row.token)
 
-        json_payload = json.dumps(payload)
+def symbol_tokens(symbols, exchange='NSE'):
+    """
+    Function to resolve symbols/tokens into ({exchange: [tokens]}, [unknown symbols]).
+    """
+    exchange_tokens, unknown = {}, []
+    for symbol in symbols:
+        row = instruments.resolve(symbol, exchange)
+        if row is None:
+            unknown.append(symbol)
+        else:
+            exchange_tokens.setdefault(row.exchange, []).append(row.token)
+    return exchange_tokens, unknown
 
-        headers = {
-            'X-PrivateKey': apikey,  # Replace with your actual API key
-            'Accept': 'application/json',
-            'X-SourceID': 'WEB',
-            'X-UserType': 'USER',
-            'Authorization': f'{token}',  # Replace with your actual authorization token
-            'Content-Type': 'application/json'
-        }
+def yahoo_symbol(symbol):
+    """
+    Function to map an Angel symbol or token to its Yahoo ticker; anything not in the index is passed through.
+    """
+    row = instruments.resolve(symbol)
+    return row.yahoo if row is not None and row.yahoo else symbol
 
-        # Make the POST request
-        conn.request("POST", "/rest/secure/angelbroking/market/v1/quote/", json_payload, headers)
+def unknown_symbol(symbol):
+    return JsonResponse({'error': 'Unknown symbol: {}'.format(symbol)}, status=404)
 
-        # Get the response
-        res = conn.getresponse()
-        data = res.read()
+def unsupported_timeperiod(timeperiod):
+    return JsonResponse({'error': 'Unsupported timeperiod: {}. Choose from {}'.format(
+        timeperiod, ', '.join(MAX_DAYS_PER_REQUEST))}, status=400)
 
-        # Print the response data
-        
+def quotes_frame(data):
+    """
+    Function to flatten the fetched quotes of a market_data() response into a DataFrame (market depth dropped).
+    """
+    df = pd.DataFrame(data['data'].get('fetched') or [])
+    return df.drop(columns=['depth'], errors='ignore')
 
-        # Close the connection
-        conn.close()
-        return(data.decode("utf-8"))
-     
-    except Exception as e:
-        print("Market API failed: {}".format(e))
-        return None  # Return None if there is an error
-    
-class HistoricalDataView(View):
-    def get(self, request):
-        # Authenticate and get tokens
-        auth_token, feed_token = login()
+def upstream_timeout():
+    return JsonResponse({'error': 'Upstream request timed out'}, status=504)
+
+def upstream_unavailable(e):
+    """
+    Function to turn a call refused by the upstream governor into a 503 with Retry-After.
+    """
+    response = JsonResponse({'error': str(e)}, status=503)
+    response['Retry-After'] = str(max(int(e.retry_after + 0.999), 1))
+    return response
+
+def lookback_range(days=HISTORY_DAYS):
+    """
+    Function to return the (from_date, to_date) strings covering the last ``days`` days.
+    """
+    now = market_now()
+    from_date = (now - timedelta(days=days)).strftime(DATE_FORMAT)
+    to_date = now.strftime(DATE_FORMAT)
+    return from_date, to_date
 
+class HistoricalDataView(View):
+    async def get(self, request):
         # Calculate date range
-        thirty_days_ago = datetime.now() - timedelta(days=900)
-        from_date = thirty_days_ago.strftime("%Y-%m-%d %H:%M")
-        to_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+        from_date, to_date = lookback_range()
 
-        # Get parameters from request
-        exchange = request.GET.get('exchange', 'NSE')  # Default is NSE
-        token = request.GET.get('token', 1333)         # Default is 1333
+        # Get parameters from request; ?symbol= is resolved through the instrument index
+        instrument = await run_blocking(instrument_params, request)
+        if instrument is None:
+            return unknown_symbol(request.GET['symbol'])
+        exchange, token = instrument  # Default is NSE 1333
         timeperiod = request.GET.get('timeperiod', 'ONE_DAY')  # Default is ONE_MINUTE
+        if timeperiod not in MAX_DAYS_PER_REQUEST:
+            return unsupported_timeperiod(timeperiod)
+        period = request.GET.get('period', 'day')  # day, week, month or N minutes e.g. 15min
+        try:
+            output = negotiate(request)  # records (default), columnar or arrow
+        except FormatError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
-        # Fetch historical data
-        json_output = historical_data(exchange, token, from_date, to_date, timeperiod)
+        # Bars precomputed at the last close (manage.py prewarm): only candles from
+        # the last of those bars onwards are needed
+        history = await run_blocking(precomputed_bars, exchange, token, timeperiod, period)
+        if history is not None:
+            from_date = history.index[-1]
 
-        if not json_output:
+        # Today's bars built from live feed ticks: the store is only read (and
+        # topped up from upstream) up to the first of them. The feed is started
+        # and the instrument subscribed here, so its bars are served from its
+        # first tick on (market_feed_tokens, live_bars_total in /metrics)
+        live = None
+        if settings.LIVE_BARS:
+            feed.ensure_started()
+            if feed.track(exchange, token) and feed.connected:
+                live = live_bars.today(exchange, token, timeperiod)
+            metrics.inc('live_bars_total', outcome='hit' if live is not None else 'miss')
+        if live is not None:
+            to_date = live.index[0]
+
+        try:
+            # Authenticate and get tokens
+            auth_token, feed_token = await run_blocking(login)
+
+            # Fetch historical data
+            df = await run_blocking(historical_data, exchange, token, from_date, to_date, timeperiod)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
+        if df is None:
             return JsonResponse({'error': 'Failed to fetch historical data'}, status=500)
+        if live is not None:
+            df = pd.concat([df[df.index < live.index[0]], live])
 
-        # Parse JSON output
-        data = json.loads(json_output)
-
-        # Process data to get day-wise high, low, close, and calculate change %
-        daily_data = {}
-        for entry in data:
-            date = entry['DateTime'].split('T')[0]  # Extract date
-            open_price = entry['Open']
-            high_price = entry['High']
-            low_price = entry['Low']
-            close_price = entry['Close']
-            volume = entry['Volume']
-
-            if date not in daily_data:
-                daily_data[date] = {
-                    'Date': date,
-                    'Open': open_price,
-                    'High': high_price,
-                    'Low': low_price,
-                    'Close': close_price,
-                    'Volume': volume,
-                    'PTD_Close': None,
-                    'Change': None  # Initialize Change% to None
-                }
-            else:
-                daily_data[date]['High'] = max(daily_data[date]['High'], high_price)
-                daily_data[date]['Low'] = min(daily_data[date]['Low'], low_price)
-                daily_data[date]['Close'] = close_price
-                daily_data[date]['Volume'] += volume
-
-        # Calculate PTD (Previous Day Close) and Change %
-        previous_day_close = None
-        for date in sorted(daily_data.keys()):
-            if previous_day_close is not None:
-                daily_data[date]['PTD_Close'] = previous_day_close
-                
-                # Calculate Change % and update the entry
-                if previous_day_close > 0:  # Avoid division by zero
-                    daily_data[date]['Change'] = ((daily_data[date]['Close'] - previous_day_close) / previous_day_close) * 100
-                else:
-                    daily_data[date]['Change'] = None  # or set to 0 if appropriate
-
-            previous_day_close = daily_data[date]['Close']
-
-        # Convert daily_data back to list
-        result = list(daily_data.values())
-
-        return JsonResponse(result, safe=False)
+        # Roll candles up into day-wise (or week/month/N-minute) bars with previous close and change %
+        try:
+            with span('summarize'):
+                result = await run_blocking(summarize, df, period, history)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return frame_response(request, result, output)
 
 class MarketDataView(View):
-     def get(self, request):
-        # Authenticate and get tokens
-        auth_token, feed_token = login()
+    async def get(self, request):
+        try:
+            output = negotiate(request)  # records is the upstream JSON, columnar/arrow one row per quote
+        except FormatError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        try:
+            # Resolve the requested watchlist or symbols, if any
+            exchange_tokens = None
+            name = request.GET.get('watchlist')
+            symbols = [s.strip() for s in request.GET.get('symbols', '').split(',') if s.strip()]
+            if name:
+                exchange_tokens = await run_blocking(watchlist_tokens, name)
+                if exchange_tokens is None:
+                    return JsonResponse({'error': 'Unknown watchlist: {}'.format(name)}, status=404)
+                if not exchange_tokens:
+                    return JsonResponse({'error': 'Watchlist {} is empty'.format(name)}, status=400)
+            elif symbols:
+                exchange_tokens, unknown = await run_blocking(symbol_tokens, symbols, request.GET.get('exchange', 'NSE'))
+                if unknown:
+                    return unknown_symbol(', '.join(unknown))
+
+            # Authenticate and get tokens
+            auth_token, feed_token = await run_blocking(login)
+
+            # Fetch market data
+            data = await run_blocking(market_data, auth_token, exchange_tokens)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
+        if not data:
+            return JsonResponse({'error': 'Failed to fetch market data'}, status=500)
+
+        # The upstream response as is, or the fetched quotes as a table
+        if output == 'records':
+            return bytes_response(request, json.dumps(data).encode(), 'application/json')
+        return frame_response(request, quotes_frame(data), output)
+
+class IndicatorView(View):
+    """
+    Technical indicator values computed server side over the stored candles.
+    ?indicator=sma|ema|rsi|macd|bollinger|atr|vwap plus its parameters (e.g. period=14),
+    and optionally from/to (YYYY-MM-DD[ HH:MM]) or limit=N to narrow the window returned.
+    """
+    async def get(self, request):
+        instrument = await run_blocking(instrument_params, request)
+        if instrument is None:
+            return unknown_symbol(request.GET['symbol'])
+        exchange, token = instrument
+        timeperiod = request.GET.get('timeperiod', 'ONE_DAY')
+        if timeperiod not in MAX_DAYS_PER_REQUEST:
+            return unsupported_timeperiod(timeperiod)
+        name = request.GET.get('indicator', 'sma')
+        try:
+            params = parse_params(name, request.GET)
+            limit = int(request.GET['limit']) if 'limit' in request.GET else None
+            if limit is not None and limit <= 0:
+                raise ValueError('limit must be a positive integer')
+            output = negotiate(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        window = slice(request.GET.get('from') or None, request.GET.get('to') or None)
+        try:
+            for bound in (window.start, window.stop):
+                if bound is not None:
+                    pd.Timestamp(bound)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid from/to'}, status=400)
+
+        from_date, to_date = lookback_range()
+        try:
+            auth_token, feed_token = await run_blocking(login)
+            df = await run_blocking(historical_data, exchange, token, from_date, to_date, timeperiod)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
+        if df is None:
+            return JsonResponse({'error': 'Failed to fetch historical data'}, status=500)
+
+        with span('indicator'):
+            values = await run_blocking(indicator_frame, exchange, token, timeperiod, name, df, params)
 
-       
-        # Fetch historical data
-        json_output = market_data(auth_token)
+        # Only send the window the client asked for
+        try:
+            values = values.loc[window]
+        except (KeyError, ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid from/to'}, status=400)
+        if limit:
+            values = values.iloc[-limit:]
 
-        if not json_output:
+        values = values.copy()
+        values.insert(0, 'DateTime', values.index.strftime('%Y-%m-%dT%H:%M:%S%z'))
+        return frame_response(request, values, output)
+
+class BacktestView(View):
+    """
+    Run one strategy over the stored candle history.
+    ?strategy=sma_crossover|rsi_reversion|breakout, the strategy's parameters (e.g. fast=10&slow=30),
+    and optionally slippage_bps, brokerage_bps and capital.
+    """
+    async def get(self, request):
+        instrument = await run_blocking(instrument_params, request)
+        if instrument is None:
+            return unknown_symbol(request.GET['symbol'])
+        exchange, token = instrument
+        timeperiod = request.GET.get('timeperiod', 'ONE_DAY')
+        if timeperiod not in MAX_DAYS_PER_REQUEST:
+            return unsupported_timeperiod(timeperiod)
+        try:
+            strategy = get_strategy(request.GET.get('strategy', 'sma_crossover'))
+            params = strategy.params(**{key: request.GET[key] for key in strategy.defaults if key in request.GET})
+            options = {
+                'slippage_bps': float(request.GET.get('slippage_bps', 5.0)),
+                'brokerage_bps': float(request.GET.get('brokerage_bps', 3.0)),
+                'capital': float(request.GET.get('capital', 100000.0)),
+            }
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        from_date, to_date = lookback_range()
+        try:
+            auth_token, feed_token = await run_blocking(login)
+            df = await run_blocking(historical_data, exchange, token, from_date, to_date, timeperiod)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
+        if df is None or df.empty:
             return JsonResponse({'error': 'Failed to fetch historical data'}, status=500)
 
-        # Parse JSON output
-        data = json.loads(json_output)
-        return JsonResponse(data, safe=False)
+        with span('backtest'):
+            summary, equity, drawdown = await run_blocking(
+                run_backtest, to_arrays(df), strategy, params, periods_per_year=bars_per_year(timeperiod), **options
+            )
+        return JsonResponse({
+            'strategy': strategy.name,
+            'params': params,
+            'metrics': summary,
+            'equity': {
+                'DateTime': list(df.index.strftime('%Y-%m-%dT%H:%M:%S%z')),
+                'equity': equity.tolist(),
+                'drawdown': drawdown.tolist(),
+            },
+        })
+
+class ScreenerView(View):
+    """
+    Filter the market snapshot, e.g.
+    ?q=change > 2 and volume > avg_volume_20&sort=change&limit=50&watchlist=nifty
+    """
+    async def get(self, request):
+        expression = request.GET.get('q', '').strip()
+        sort = request.GET.get('sort')
+        order = request.GET.get('order', 'desc')
+        name = request.GET.get('watchlist')
+        try:
+            limit = int(request.GET.get('limit', 100))
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+        if limit <= 0:
+            return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+
+        try:
+            # Resolve the universe: a watchlist or the default tokens
+            exchange_tokens = DEFAULT_EXCHANGE_TOKENS
+            if name:
+                exchange_tokens = await run_blocking(watchlist_tokens, name)
+                if exchange_tokens is None:
+                    return JsonResponse({'error': 'Unknown watchlist: {}'.format(name)}, status=404)
+                if not exchange_tokens:
+                    return JsonResponse({'error': 'Watchlist {} is empty'.format(name)}, status=400)
+
+            # Authenticate and get (or refresh) the snapshot
+            auth_token, feed_token = await run_blocking(login)
+            with span('snapshot'):
+                snapshot = await run_blocking(
+                    screener.snapshot, name, exchange_tokens, lambda tokens: market_data(auth_token, tokens),
+                )
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+        except RuntimeError:
+            return JsonResponse({'error': 'Failed to fetch market data'}, status=500)
+
+        # Screening runs on the event loop, it is a few array operations
+        started = time.perf_counter()
+        try:
+            with span('screen'):
+                result = snapshot.screen(expression, sort=sort, descending=order != 'asc', limit=limit)
+        except FilterError as e:
+            return JsonResponse({'error': str(e), 'fields': FIELDS}, status=400)
+        elapsed = time.perf_counter() - started
+
+        body = columnar_envelope({
+            'count': len(result),
+            'universe': len(snapshot),
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'quotes_at': datetime.fromtimestamp(snapshot.quotes_at).isoformat(),
+        }, result)
+        return bytes_response(request, body.encode(), 'application/json')
+
+def sse_event(event, data):
+    return "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
+async def quote_events(tokens=None):
+    """
+    Server-Sent Events stream: the current quote table first, then only the
+    quotes that changed, pushed as soon as the feed thread writes them.
+    """
+    loop = asyncio.get_running_loop()
+    changed_event = asyncio.Event()
+    quotes.subscribe(loop, changed_event)
+    try:
+        version, snapshot = quotes.snapshot()
+        yield sse_event('snapshot', [q for q in snapshot if not tokens or q['symbolToken'] in tokens])
+        while True:
+            try:
+                await asyncio.wait_for(changed_event.wait(), timeout=settings.FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            changed_event.clear()
+            version, changed = quotes.changes_since(version)
+            if tokens:
+                changed = [q for q in changed if q['symbolToken'] in tokens]
+            if changed:
+                yield sse_event('quotes', changed)
+    finally:
+        quotes.unsubscribe(loop, changed_event)
+
+class MarketStreamView(View):
+    async def get(self, request):
+        # Start the background WebSocket feed on first use
+        feed.ensure_started()
+
+        tokens = request.GET.get('tokens')
+        tokens = set(tokens.split(',')) if tokens else None
+
+        response = StreamingHttpResponse(quote_events(tokens), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 class FundamentalView(View):
-    def get(self, request):
+    async def get(self, request):
         ticker = request.GET.get('symbol')
-        stock = yf.Ticker(ticker)
-        
-        # Fetch general info
-        info = stock.info
-        
-        # Fetch financials (income statement)
-        financials = stock.financials
-        # Fetch balance sheet
-        balance_sheet = stock.balance_sheet
-
-
-        
-        # Extract data and store in a dictionary
-        stock_data = {}
-        
-        # Last Traded Price (LTP)
-        stock_data['LTP'] = info.get('previousClose')
-        
-        # PE ratio
-        stock_data['PE'] = info.get('trailingPE')  # Trailing PE
-        
-        # Debt to Equity ratio
-        # total_debt = balance_sheet.loc['Total Debt'][0] if 'Total Debt' in balance_sheet.index else None
-        # total_equity = balance_sheet.loc['Stockholders Equity'][0] if 'Stockholders Equity' in balance_sheet.index else None
-        # stock_data['Debt to Equity'] = total_debt / total_equity if total_debt and total_equity else None
-        stock_data['Debt to Equity']=info.get("debtToEquity")
-        
-        # Earnings Per Share (EPS)
-        stock_data['EPS'] = info.get('trailingEps')  # Trailing EPS
-        
-        # Book Value Per Share (BVPS)
-        stock_data['BVPS'] = info.get('bookValue')  # Book Value per share
-        
-        # Net Profit (most recent)
-        net_income = financials.loc['Net Income'][0] if 'Net Income' in financials.index else None
-        stock_data['Net Profit'] = net_income
-        
-        # Dividend Per Share (DPS)
-        stock_data['DPS'] = info.get('dividendRate')  # DPS based on annual dividend
-        
-        # Net Profit Margin (NPM)
-        total_revenue = financials.loc['Total Revenue'][0] if 'Total Revenue' in financials.index else None
-        stock_data['NPM'] = (net_income / total_revenue) * 100 if net_income and total_revenue else None
-        
-        # Return on Equity (ROE)
-        # stock_data['ROE'] = info.get('returnOnEquity') * 100 if info.get('returnOnEquity') else None
-        
+        if not ticker:
+            return JsonResponse({'error': 'symbol is required'}, status=400)
+
+        # Angel symbols and tokens are mapped to their Yahoo ticker; served from the
+        # fundamentals cache, refreshed from yfinance when stale
+        try:
+            ticker = await run_blocking(yahoo_symbol, ticker)
+            with span('fundamentals'):
+                stock_data = await run_blocking(fundamental_data, ticker)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
         return JsonResponse(stock_data, safe=False)
 
+class InstrumentSearchView(View):
+    """
+    Autocomplete over the instrument master: ?q=RELI&exchange=NSE&limit=20.
+    """
+    async def get(self, request):
+        prefix = request.GET.get('q', '')
+        try:
+            limit = min(int(request.GET.get('limit', 20)), 100)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        rows = await run_blocking(instruments.search, prefix, limit, request.GET.get('exchange'))
+        return JsonResponse([row._asdict() for row in rows], safe=False)
+
+def service_gauges():
+    """
+    Function to yield (name, labels, value) for the session, caches, governor and feed, read at scrape time.
+    """
+    stats = session.stats()
+    for key in ('hits', 'waits', 'logins', 'refreshes', 'failures', 'invalidations', 'fallbacks'):
+        yield 'smartapi_session_{}'.format(key), {}, stats[key]
+    yield 'smartapi_login_seconds_avg', {}, stats['login_seconds_avg']
+    yield 'smartapi_login_seconds_max', {}, stats['login_seconds_max']
+    yield 'smartapi_session_expires_in_seconds', {}, stats['expires_in']
+
+    stats = cache.stats()
+    for key in ('hits', 'stale', 'misses'):
+        yield 'fundamentals_cache_requests', {'result': key}, stats[key]
+    yield 'fundamentals_cache_fetches', {}, stats['fetches']
+    yield 'fundamentals_cache_errors', {}, stats['errors']
+    yield 'fundamentals_cache_inflight', {}, stats['inflight']
+    served = stats['hits'] + stats['stale']
+    yield 'fundamentals_cache_hit_ratio', {}, ratio(served, served + stats['misses'])
+
+    counters = dict(memo.counters)
+    for key, value in counters.items():
+        yield 'indicator_memo_requests', {'result': key}, value
+    reused = counters['hits'] + counters['partial']
+    yield 'indicator_memo_hit_ratio', {}, ratio(reused, reused + counters['full'])
+
+    for bucket, (tokens, failures, open_for) in sorted(governor.state().items()):
+        yield 'governor_tokens', {'bucket': bucket}, tokens
+        yield 'circuit_failures', {'bucket': bucket}, failures
+        yield 'circuit_open_seconds', {'bucket': bucket}, open_for
+
+    yield 'market_feed_connected', {}, int(feed.connected)
+    yield 'market_feed_tokens', {}, len(feed)
+    yield 'market_feed_quotes_version', {}, quotes.version
+    yield 'live_bar_instruments', {}, len(live_bars)
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint.
+    """
+    async def get(self, request):
+        body = metrics.render(service_gauges())
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BulkFundamentalView(View):
+    """
+    Fundamentals for many symbols in one columnar response.
+    GET ?symbols=A.NS,B.NS or POST {"symbols": [...]}; ?format=json (columnar)|records|arrow|parquet.
+    """
+    async def get(self, request):
+        symbols = [s.strip() for s in request.GET.get('symbols', '').split(',') if s.strip()]
+        return await self.respond(request, symbols)
+
+    async def post(self, request):
+        try:
+            symbols = json.loads(request.body or b'{}').get('symbols') or []
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Body must be JSON like {"symbols": [...]}'}, status=400)
+        return await self.respond(request, [str(s).strip() for s in symbols if str(s).strip()])
+
+    async def respond(self, request, symbols):
+        if not symbols:
+            return JsonResponse({'error': 'symbols is required'}, status=400)
+        if len(symbols) > settings.FUNDAMENTALS_BULK_MAX:
+            return JsonResponse({'error': 'At most {} symbols per request'.format(settings.FUNDAMENTALS_BULK_MAX)}, status=400)
+
+        try:
+            output = negotiate(request, default='columnar', allowed=('columnar', 'records', 'arrow', 'parquet'))
+        except FormatError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        try:
+            symbols = await run_blocking(list, map(yahoo_symbol, symbols))
+            with span('fundamentals'):
+                df = await run_blocking(bulk_fundamental_data, symbols, timeout=settings.FUNDAMENTALS_BULK_TIMEOUT)
+        except asyncio.TimeoutError:
+            return upstream_timeout()
+        except UpstreamUnavailable as e:
+            return upstream_unavailable(e)
+
+        return frame_response(request, df.reset_index(), output)
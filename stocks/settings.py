@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 
 # SECURITY WARNING: keep the secret key used in production secret!
@@ -20,6 +20,112 @@ USERNAME = config('USERNAME')
 PWD=config('PWD')
 TOKEN=config('TOKEN')
 
+# SmartAPI host, and where Yahoo fundamentals come from when not from yfinance
+# (point both at benchmarks/stub.py to run without the network)
+SMARTAPI_ROOT = config('SMARTAPI_ROOT', default='https://apiconnect.angelone.in')
+YAHOO_REPLAY_URL = config('YAHOO_REPLAY_URL', default='')
+
+# SmartAPI session reuse: fallback lifetime when the jwt has no exp claim,
+# how long before expiry the token gets refreshed and how long callers wait
+# on another thread's login (seconds)
+SMARTAPI_SESSION_TTL = config('SMARTAPI_SESSION_TTL', default=6 * 60 * 60, cast=int)
+SMARTAPI_REFRESH_MARGIN = config('SMARTAPI_REFRESH_MARGIN', default=10 * 60, cast=int)
+SMARTAPI_LOGIN_WAIT = config('SMARTAPI_LOGIN_WAIT', default=30, cast=float)
+
+# Candle store: a series is not re-fetched from upstream more often than this (seconds)
+CANDLE_REFRESH_SECONDS = config('CANDLE_REFRESH_SECONDS', default=60, cast=int)
+
+# Historical backfill: concurrent windows per range and retry policy for
+# failed windows
+BACKFILL_WORKERS = config('BACKFILL_WORKERS', default=3, cast=int)
+BACKFILL_RETRIES = config('BACKFILL_RETRIES', default=3, cast=int)
+BACKFILL_BACKOFF = config('BACKFILL_BACKOFF', default=1.0, cast=float)
+
+# Upstream governor shared by every worker process through a SQLite file
+# (default governor.sqlite3 next to db.sqlite3): calls allowed per endpoint
+# (Angel One's published limits; Yahoo publishes none, so its bucket only
+# keeps bursts polite and bulk fundamentals wait for it at batch priority),
+# share of each limit batch work keeps while interactive requests wait, the
+# longest an interactive call waits for a token (seconds) and how often
+# waiters re-check, and the circuit breaker (consecutive failures to open it,
+# seconds it stays open before a probe call)
+GOVERNOR_DB = config('GOVERNOR_DB', default='')
+LOGIN_RATE_PER_SECOND = config('LOGIN_RATE_PER_SECOND', default=1, cast=float)
+CANDLE_RATE_PER_SECOND = config('CANDLE_RATE_PER_SECOND', default=3, cast=float)
+CANDLE_RATE_PER_MINUTE = config('CANDLE_RATE_PER_MINUTE', default=180, cast=float)
+QUOTE_RATE_PER_SECOND = config('QUOTE_RATE_PER_SECOND', default=10, cast=float)
+QUOTE_RATE_PER_MINUTE = config('QUOTE_RATE_PER_MINUTE', default=500, cast=float)
+YAHOO_RATE_PER_SECOND = config('YAHOO_RATE_PER_SECOND', default=10, cast=float)
+GOVERNOR_BATCH_RESERVE = config('GOVERNOR_BATCH_RESERVE', default=0.2, cast=float)
+GOVERNOR_MAX_WAIT = config('GOVERNOR_MAX_WAIT', default=10, cast=float)
+GOVERNOR_POLL = config('GOVERNOR_POLL', default=0.1, cast=float)
+GOVERNOR_FAILURES = config('GOVERNOR_FAILURES', default=5, cast=int)
+GOVERNOR_COOLDOWN = config('GOVERNOR_COOLDOWN', default=30, cast=float)
+
+# Live market feed (SmartAPI WebSocket): keepalive comment interval on the
+# /market-data/stream/ SSE endpoint and the cap on reconnect backoff (seconds)
+FEED_HEARTBEAT_SECONDS = config('FEED_HEARTBEAT_SECONDS', default=15, cast=int)
+FEED_MAX_BACKOFF = config('FEED_MAX_BACKOFF', default=60, cast=int)
+
+# Intraday bars built from feed ticks: whether /historical-data/ starts the
+# feed and subscribes the requested instrument, bars kept per instrument and
+# timeframe (a session is 375 one-minute bars) and the cap on subscribed tokens
+LIVE_BARS = config('LIVE_BARS', default=True, cast=bool)
+BAR_CAPACITY = config('BAR_CAPACITY', default=400, cast=int)
+FEED_MAX_TOKENS = config('FEED_MAX_TOKENS', default=1000, cast=int)
+
+# Quote fetching: concurrent batches (and pooled keep-alive connections) and
+# per-call timeout
+QUOTE_WORKERS = config('QUOTE_WORKERS', default=10, cast=int)
+QUOTE_TIMEOUT = config('QUOTE_TIMEOUT', default=7, cast=float)
+
+# Fundamentals cache (seconds): Ticker.info and Ticker.financials are kept
+# separately, and stale entries are served for up to FUNDAMENTALS_STALE_TTL
+# more while a background refresh runs
+FUNDAMENTALS_INFO_TTL = config('FUNDAMENTALS_INFO_TTL', default=6 * 60 * 60, cast=int)
+FUNDAMENTALS_FINANCIALS_TTL = config('FUNDAMENTALS_FINANCIALS_TTL', default=7 * 24 * 60 * 60, cast=int)
+FUNDAMENTALS_STALE_TTL = config('FUNDAMENTALS_STALE_TTL', default=30 * 24 * 60 * 60, cast=int)
+CACHE_REFRESH_WORKERS = config('CACHE_REFRESH_WORKERS', default=4, cast=int)
+
+# Bulk fundamentals: concurrent yfinance fetches and symbols per request
+FUNDAMENTALS_BULK_WORKERS = config('FUNDAMENTALS_BULK_WORKERS', default=16, cast=int)
+FUNDAMENTALS_BULK_MAX = config('FUNDAMENTALS_BULK_MAX', default=1000, cast=int)
+FUNDAMENTALS_BULK_TIMEOUT = config('FUNDAMENTALS_BULK_TIMEOUT', default=300, cast=float)
+
+# Async views: threads for blocking upstream calls (SmartAPI SDK, requests,
+# yfinance) and the default per-call timeout in seconds. The threads cap the
+# upstream calls in progress per process; size them to the concurrency wanted,
+# e.g. 64 workers at 1 s of upstream time per request is at most ~64 req/s
+# (benchmarks/loadtest_async.py measures it). Calls past the cap queue, and the
+# queue time counts toward the timeout.
+UPSTREAM_WORKERS = config('UPSTREAM_WORKERS', default=64, cast=int)
+UPSTREAM_TIMEOUT = config('UPSTREAM_TIMEOUT', default=60, cast=float)
+
+# Indicator results memoized per (token, interval, indicator, params)
+INDICATOR_MEMO_SIZE = config('INDICATOR_MEMO_SIZE', default=512, cast=int)
+
+# End-of-day pre-warm (manage.py prewarm): weekday run time in exchange local
+# time, intervals fetched and periods precomputed for /historical-data/,
+# instruments pre-warmed at once, and how long precomputed bars are served
+# (seconds, long enough to cover a weekend)
+PREWARM_AT = config('PREWARM_AT', default='15:45')
+PREWARM_INTERVALS = config('PREWARM_INTERVALS', default='ONE_DAY', cast=Csv())
+PREWARM_PERIODS = config('PREWARM_PERIODS', default='day,week,month', cast=Csv())
+PREWARM_WORKERS = config('PREWARM_WORKERS', default=4, cast=int)
+PREWARM_BARS_TTL = config('PREWARM_BARS_TTL', default=4 * 24 * 60 * 60, cast=int)
+
+# Instrument master: scrip master source (URL or path), exchanges kept,
+# download timeout, and how often a process checks for a newer refresh
+INSTRUMENTS_URL = config('INSTRUMENTS_URL', default='https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json')
+INSTRUMENTS_EXCHANGES = config('INSTRUMENTS_EXCHANGES', default='NSE,BSE,NFO', cast=Csv())
+INSTRUMENTS_TIMEOUT = config('INSTRUMENTS_TIMEOUT', default=120, cast=int)
+INSTRUMENTS_CHECK_SECONDS = config('INSTRUMENTS_CHECK_SECONDS', default=60, cast=int)
+
+# Screener snapshot: seconds before quotes are refetched and before the
+# rolling daily stats are recomputed from stored candles
+SCREENER_QUOTE_TTL = config('SCREENER_QUOTE_TTL', default=5, cast=float)
+SCREENER_STATS_TTL = config('SCREENER_STATS_TTL', default=6 * 60 * 60, cast=int)
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +156,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'service.tracing.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -80,6 +187,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'stocks.wsgi.application'
+ASGI_APPLICATION = 'stocks.asgi.application'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -97,10 +205,79 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent backfills write from several executor threads: wait for
+        # the lock instead of failing, and take it up front so two readers
+        # never deadlock upgrading to writers
+        'OPTIONS': {
+            'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
 
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+# JSON lines in logs/service.log, rotated by size; warnings also go to the
+# console and every warning/error is counted in /metrics
+
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'service.tracing.JsonFormatter'},
+    },
+    'handlers': {
+        'file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'logs' / 'service.log',
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+        'console': {
+            'class': 'logging.StreamHandler',
+            'level': 'WARNING',
+        },
+        'metrics': {
+            'class': 'service.tracing.ErrorCountHandler',
+            'level': 'WARNING',
+        },
+    },
+    'loggers': {
+        'service': {
+            'handlers': ['file', 'console', 'metrics'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'django.request': {
+            'handlers': ['file', 'metrics'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -16,13 +16,23 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from service.views import HistoricalDataView, MarketDataView, FundamentalView
+from service.views import (
+    HistoricalDataView, MarketDataView, MarketStreamView, FundamentalView, BulkFundamentalView, IndicatorView,
+    BacktestView, ScreenerView, InstrumentSearchView, MetricsView,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('historical-data/', HistoricalDataView.as_view(), name='historical-data'),
+    path('indicators/', IndicatorView.as_view(), name='indicators'),
+    path('backtest/', BacktestView.as_view(), name='backtest'),
+    path('instruments/', InstrumentSearchView.as_view(), name='instruments'),
+    path('screener/', ScreenerView.as_view(), name='screener'),
     path('market-data/', MarketDataView.as_view(), name="market-data"),
-    path('fundamental-data/', FundamentalView.as_view(), name="fundamental-data")
+    path('market-data/stream/', MarketStreamView.as_view(), name="market-data-stream"),
+    path('fundamental-data/', FundamentalView.as_view(), name="fundamental-data"),
+    path('fundamental-data/bulk/', BulkFundamentalView.as_view(), name="fundamental-data-bulk"),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 